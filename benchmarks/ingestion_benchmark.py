@@ -0,0 +1,123 @@
+"""
+Нагрузочный тест конвейера загрузки на автономном бэкенде Telegram
+
+Примеры:
+    python benchmarks/ingestion_benchmark.py --messages 5000 --latency 0.05
+    python benchmarks/ingestion_benchmark.py --mode backfill --concurrency 8 --flood-rate 0.01
+    python benchmarks/ingestion_benchmark.py --dataset data/telegram_recording.json --channel @my_channel
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from ingestion import IngestionPipeline
+from rate_limiter import RateLimiter, DEFAULT_RATES
+from telegram_backend import FakeDataset, RateLimitedFakeBackend
+from telegram_client import TelegramClient
+
+def parse_args():
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Нагрузочный тест загрузки данных на автономном бэкенде')
+    parser.add_argument('--mode', choices=['ingest', 'backfill', 'refresh'], default='ingest',
+                        help='Сценарий: обычная загрузка, параллельная загрузка шардами или обновление счетчиков')
+    parser.add_argument('--dataset', help='JSON-файл записанного набора данных (по умолчанию синтетический)')
+    parser.add_argument('--channel', default='fake_channel_1', help='Username канала в наборе данных')
+    parser.add_argument('--messages', type=int, default=2000, help='Количество постов синтетического канала')
+    parser.add_argument('--max-replies', type=int, default=30, help='Максимум комментариев к посту')
+    parser.add_argument('--days', type=int, default=180, help='Период загрузки в днях')
+    parser.add_argument('--latency', type=float, default=0.05, help='Задержка одного запроса в секундах')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Случайная добавка к задержке в секундах')
+    parser.add_argument('--flood-rate', type=float, default=0.0, help='Вероятность FloodWaitError на запрос')
+    parser.add_argument('--flood-seconds', type=int, default=1, help='Длительность внедряемых FloodWait')
+    parser.add_argument('--rate-scale', type=float, default=1.0,
+                        help='Множитель стандартных лимитов ограничителя частоты')
+    parser.add_argument('--concurrency', type=int, default=None, help='Параллельность шардов и комментариев')
+    parser.add_argument('--seed', type=int, default=0, help='Зерно генератора для воспроизводимости')
+    parser.add_argument('--verbose', action='store_true', help='Подробный лог конвейера')
+    return parser.parse_args()
+
+def main():
+    """Запуск сценария и вывод результатов"""
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='[%(levelname)s] %(message)s'
+    )
+    
+    if args.dataset:
+        dataset = FakeDataset.load(args.dataset)
+    else:
+        dataset = FakeDataset.synthetic(messages=args.messages, days=args.days,
+                                        max_replies=args.max_replies, seed=args.seed)
+    
+    limiter = RateLimiter(rates={name: rate * args.rate_scale for name, rate in DEFAULT_RATES.items()})
+    backends = []
+    
+    def backend():
+        client = RateLimitedFakeBackend(
+            dataset,
+            latency=args.latency,
+            jitter=args.jitter,
+            flood_wait_rate=args.flood_rate,
+            flood_wait_seconds=args.flood_seconds,
+            seed=args.seed,
+            limiter=limiter
+        )
+        backends.append(client)
+        return client
+    
+    workdir = tempfile.mkdtemp(prefix='ingestion_benchmark_')
+    db_path = os.path.join(workdir, 'benchmark.db')
+    db = Database(db_path)
+    db.init_db()
+    telegram_client = TelegramClient(
+        comments_concurrency=args.concurrency,
+        entity_cache=db,
+        backend=backend
+    )
+    pipeline = IngestionPipeline(telegram_client, db)
+    
+    started = time.perf_counter()
+    try:
+        if args.mode == 'backfill':
+            result = pipeline.backfill_channel(args.channel, args.days, concurrency=args.concurrency)
+        elif args.mode == 'refresh':
+            result = pipeline.ingest_channel(args.channel, args.days)
+            started = time.perf_counter()
+            result.update(pipeline.refresh_metrics(result['channel_id'], limit=args.messages))
+        else:
+            result = pipeline.ingest_channel(args.channel, args.days)
+        duration = time.perf_counter() - started
+    finally:
+        telegram_client.close()
+        db.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    requests = sum(client.stats['requests'] for client in backends)
+    flood_waits = sum(client.stats['flood_waits'] for client in backends)
+    
+    print(f"Сценарий:            {args.mode}")
+    print(f"Время:               {duration:.2f} сек.")
+    if args.mode == 'refresh':
+        print(f"Обновлено счетчиков: {result['updated_count']} ({result['updated_count'] / duration:.1f}/с)")
+    else:
+        print(f"Постов:              {result['posts_count']} ({result['posts_count'] / duration:.1f}/с)")
+        print(f"Комментариев:        {result['comments_count']} ({result['comments_count'] / duration:.1f}/с)")
+    print(f"Запросов к API:      {requests}")
+    print(f"FloodWait:           {flood_waits}")
+    for name, stats in limiter.get_stats().items():
+        print(f"  {name:10} скорость {stats['rate']}/{stats['base_rate']} в сек., FloodWait: {stats['flood_waits']}")
+    
+    if args.mode == 'backfill':
+        for shard in result['shards']:
+            print(f"  шард {shard['shard']}: ID {shard['min_id']}-{shard['max_id']}, постов {shard['posts_count']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Планы и время основных выборок до и после миграций схемы
+
+Пример:
+    python benchmarks/query_plan_benchmark.py --channels 10 --posts 5000 --comments 10
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, MIGRATIONS, to_epoch
+
+# Выборки Database и их SQL для EXPLAIN QUERY PLAN
+QUERIES = [
+    ('get_posts', "SELECT * FROM posts WHERE channel_id = ? ORDER BY date_ts DESC"),
+    ('get_comments_for_posts', "SELECT * FROM comments WHERE post_id IN ({placeholders}) ORDER BY date_ts ASC"),
+    ('get_all_reports', "SELECT r.id, r.channel_id, r.date, r.file_path, c.name as channel_name FROM reports r "
+                        "JOIN channels c ON r.channel_id = c.id ORDER BY r.date DESC"),
+    ('find_channel_id', "SELECT id FROM channels WHERE telegram_id = ?")
+]
+
+def populate(db: Database, channels: int, posts: int, comments: int, reports: int, seed: int):
+    """Заполнение базы синтетическими данными напрямую через SQL (схема версии 0 без индексов)"""
+    rnd = random.Random(seed)
+    conn = db._get_connection()
+    
+    conn.executemany(
+        "INSERT INTO channels (id, telegram_id, name, username) VALUES (?, ?, ?, ?)",
+        [(i, 1000000000 + i, f"Канал {i}", f"channel_{i}") for i in range(1, channels + 1)]
+    )
+    
+    post_rows = []
+    comment_rows = []
+    post_id = 0
+    for channel_id in range(1, channels + 1):
+        for telegram_id in range(1, posts + 1):
+            post_id += 1
+            date = f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} {rnd.randint(0, 23):02d}:00:00"
+            date_ts = to_epoch(date)
+            post_rows.append((post_id, telegram_id, channel_id, date, date_ts, 'x' * 100,
+                              rnd.randint(100, 10000), 0, comments))
+            for k in range(comments):
+                comment_rows.append((telegram_id * 1000 + k, post_id, 1000000000 + channel_id, k,
+                                     date, date_ts + k, 'комментарий'))
+    
+    conn.executemany(
+        "INSERT INTO posts (id, telegram_id, channel_id, date, date_ts, text, views, forwards, replies) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        post_rows
+    )
+    conn.executemany(
+        "INSERT INTO comments (telegram_id, post_id, channel_id, user_id, date, date_ts, text) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        comment_rows
+    )
+    conn.executemany(
+        "INSERT INTO reports (channel_id, date, file_path) VALUES (?, ?, ?)",
+        [(rnd.randint(1, channels), f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} 12:00:00",
+          f"reports/report_{i}.md") for i in range(reports)]
+    )
+    conn.commit()
+
+def measure(db: Database, channels: int, posts: int, repeats: int):
+    """
+    Планы и среднее время выборок
+    
+    Returns:
+        Словарь {имя выборки: (план, время в миллисекундах)}
+    """
+    conn = db._get_connection()
+    channel_id = channels // 2 + 1
+    post_ids = list(range((channel_id - 1) * posts + 1, (channel_id - 1) * posts + 201))
+    
+    calls = {
+        'get_posts': (lambda: db.get_posts(channel_id), (channel_id,)),
+        'get_comments_for_posts': (lambda: db.get_comments_for_posts(post_ids), tuple(post_ids)),
+        'get_all_reports': (lambda: db.get_all_reports(), ()),
+        'find_channel_id': (lambda: db.find_channel_id(1000000000 + channel_id), (1000000000 + channel_id,))
+    }
+    
+    results = {}
+    for name, sql in QUERIES:
+        call, params = calls[name]
+        sql = sql.format(placeholders=', '.join('?' * len(post_ids)))
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        
+        started = time.perf_counter()
+        for _ in range(repeats):
+            call()
+        results[name] = (plan, (time.perf_counter() - started) / repeats * 1000)
+    
+    return results
+
+def main():
+    """Запуск сравнения и вывод результатов"""
+    parser = argparse.ArgumentParser(description='Планы выборок до и после миграций схемы')
+    parser.add_argument('--channels', type=int, default=10, help='Количество каналов')
+    parser.add_argument('--posts', type=int, default=5000, help='Количество постов в канале')
+    parser.add_argument('--comments', type=int, default=10, help='Количество комментариев к посту')
+    parser.add_argument('--reports', type=int, default=2000, help='Количество отчетов')
+    parser.add_argument('--repeats', type=int, default=5, help='Количество повторов каждой выборки')
+    parser.add_argument('--seed', type=int, default=0, help='Зерно генератора')
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix='query_plan_benchmark_')
+    try:
+        db = Database(os.path.join(workdir, 'benchmark.db'))
+        db.init_db(schema_version=0)
+        populate(db, args.channels, args.posts, args.comments, args.reports, args.seed)
+        
+        before = measure(db, args.channels, args.posts, args.repeats)
+        version = db.migrate()
+        after = measure(db, args.channels, args.posts, args.repeats)
+        
+        print(f"Каналов: {args.channels}, постов: {args.channels * args.posts}, "
+              f"комментариев: {args.channels * args.posts * args.comments}, отчетов: {args.reports}")
+        print(f"Миграции: 0 -> {version} ({len(MIGRATIONS)} всего)")
+        
+        for name, _ in QUERIES:
+            plan_before, time_before = before[name]
+            plan_after, time_after = after[name]
+            print(f"\n{name}: {time_before:.2f} мс -> {time_after:.2f} мс")
+            print("  до:    " + "; ".join(plan_before))
+            print("  после: " + "; ".join(plan_after))
+        
+        db._close_connection()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
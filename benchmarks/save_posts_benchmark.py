@@ -0,0 +1,123 @@
+"""
+Сравнение скорости записи постов: построчный SELECT + UPDATE/INSERT и пакетный upsert
+
+Пример:
+    python benchmarks/save_posts_benchmark.py --posts 10000 --batch-size 200
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+def legacy_save_posts(db: Database, posts, channel_id: int):
+    """Прежняя реализация Database.save_posts: два запроса на каждый пост"""
+    conn = db._get_connection()
+    cursor = conn.cursor()
+    
+    for post in posts:
+        cursor.execute(
+            "SELECT id FROM posts WHERE telegram_id = ? AND channel_id = ?",
+            (post.get('id'), channel_id)
+        )
+        existing = cursor.fetchone()
+        
+        if existing:
+            cursor.execute('''
+            UPDATE posts
+            SET date = ?, text = ?, views = ?, forwards = ?, replies = ?,
+                has_media = ?, media_type = ?, is_pinned = ?
+            WHERE telegram_id = ? AND channel_id = ?
+            ''', (
+                post.get('date'), post.get('text'), post.get('views'), post.get('forwards'),
+                post.get('replies'), post.get('has_media', False), post.get('media_type'),
+                post.get('is_pinned', False), post.get('id'), channel_id
+            ))
+        else:
+            cursor.execute('''
+            INSERT INTO posts
+            (telegram_id, channel_id, date, text, views, forwards, replies, has_media, media_type, is_pinned)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                post.get('id'), channel_id, post.get('date'), post.get('text'), post.get('views'),
+                post.get('forwards'), post.get('replies'), post.get('has_media', False),
+                post.get('media_type'), post.get('is_pinned', False)
+            ))
+    
+    db._save_metric_snapshots(cursor, channel_id, posts)
+    conn.commit()
+
+def make_posts(count: int, views_offset: int = 0):
+    """Синтетические посты"""
+    return [{
+        'id': i,
+        'date': '2024-01-01 00:00:00',
+        'text': f"Пост {i} " + 'x' * 200,
+        'views': 1000 + i + views_offset,
+        'forwards': i % 50,
+        'replies': i % 20,
+        'has_media': i % 3 == 0,
+        'media_type': 'photo' if i % 3 == 0 else None,
+        'is_pinned': False
+    } for i in range(1, count + 1)]
+
+def run(save, workdir: str, name: str, posts_count: int, batch_size: int, unique_key: bool = True):
+    """
+    Запись постов пакетами: сначала вставка, затем повторная запись (обновление)
+    
+    Args:
+        unique_key: Оставить уникальный индекс (channel_id, telegram_id); без него
+            воспроизводится прежняя схема, в которой каждый SELECT просматривал таблицу
+    
+    Returns:
+        Кортеж (время вставки, время обновления) в секундах
+    """
+    db = Database(os.path.join(workdir, f'{name}.db'))
+    db.init_db()
+    if not unique_key:
+        db._get_connection().execute("DROP INDEX idx_posts_channel_telegram")
+    channel_id = db.save_channel_info({'id': 1, 'name': 'Benchmark', 'username': 'benchmark'})
+    timings = []
+    
+    for views_offset in (0, 1):
+        posts = make_posts(posts_count, views_offset)
+        started = time.perf_counter()
+        for start in range(0, len(posts), batch_size):
+            save(db, posts[start:start + batch_size], channel_id)
+        timings.append(time.perf_counter() - started)
+    
+    db._close_connection()
+    return timings
+
+def main():
+    """Запуск сравнения и вывод результатов"""
+    parser = argparse.ArgumentParser(description='Сравнение скорости записи постов')
+    parser.add_argument('--posts', type=int, default=10000, help='Количество постов')
+    parser.add_argument('--batch-size', type=int, default=200, help='Размер пакета (как INGEST_BATCH_SIZE)')
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix='save_posts_benchmark_')
+    try:
+        implementations = [
+            ('построчно, прежняя схема без индекса', legacy_save_posts, False),
+            ('построчно с индексом', legacy_save_posts, True),
+            ('upsert', lambda db, posts, channel_id: db.save_posts(posts, channel_id), True)
+        ]
+        
+        print(f"Постов: {args.posts}, размер пакета: {args.batch_size}")
+        for index, (name, save, unique_key) in enumerate(implementations):
+            insert_time, update_time = run(save, workdir, f'run{index}', args.posts, args.batch_size, unique_key)
+            print(
+                f"  {name:38} вставка {insert_time:.2f} сек. ({args.posts / insert_time:.0f} постов/с), "
+                f"обновление {update_time:.2f} сек. ({args.posts / update_time:.0f} постов/с)"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
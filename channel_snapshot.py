@@ -0,0 +1,328 @@
+"""
+Снимки данных каналов в формате Parquet
+
+Посты, комментарии и снимки счетчиков канала выгружаются в наборы Parquet, разбитые
+по месяцам (каталоги month=YYYY-MM), вместе с файлом channel.json с информацией о канале.
+Снимок читается с отображением файлов в память и передается в DataProcessor.process_data
+без обращения к рабочей базе данных.
+
+Примеры:
+    python channel_snapshot.py export @channel_one @channel_two
+    python channel_snapshot.py import data/snapshots/channel_one/20240601_120000
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+import numpy as np
+import pandas as pd
+from database import Database, FRAME_DTYPES
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Наборы снимка и столбец Unix time, по месяцу которого разбиваются файлы
+DATASETS = {
+    'posts': 'date_ts',
+    'comments': 'date_ts',
+    'metric_snapshots': 'captured_at'
+}
+
+MANIFEST_FILE = 'channel.json'
+FORMAT_VERSION = 1
+
+class ChannelSnapshotStore:
+    """Выгрузка данных каналов в Parquet, чтение и импорт снимков"""
+    
+    def __init__(self, db: Database, base_dir: Optional[str] = None, import_batch_size: Optional[int] = None):
+        """
+        Инициализация хранилища снимков
+        
+        Args:
+            db: База данных
+            base_dir: Каталог снимков (CHANNEL_SNAPSHOT_DIR, по умолчанию data/snapshots)
+            import_batch_size: Количество записей, сохраняемых в БД одним пакетом при импорте
+        """
+        self.db = db
+        self.base_dir = base_dir or os.getenv('CHANNEL_SNAPSHOT_DIR', 'data/snapshots')
+        self.import_batch_size = max(1, import_batch_size or int(os.getenv('INGEST_BATCH_SIZE', 200)))
+    
+    def export_channel(self, channel_id: int) -> str:
+        """
+        Выгрузка постов, комментариев и снимков счетчиков канала в Parquet
+        
+        Args:
+            channel_id: ID канала в базе данных
+        
+        Returns:
+            Путь к каталогу снимка
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            
+            channel_info = self.db.get_channel_info(channel_id)
+            if not channel_info:
+                raise ValueError(f"Канал с ID {channel_id} не найден")
+            
+            posts_df = self.db.get_posts_frame(channel_id)
+            comments_df = self.db.get_comments_frame(channel_id)
+            if not comments_df.empty:
+                # Telegram ID поста нужен для импорта снимка в другую базу
+                post_telegram_ids = posts_df.set_index('id')['telegram_id']
+                comments_df['post_telegram_id'] = comments_df['post_id'].map(post_telegram_ids).astype('Int64')
+            frames = {
+                'posts': posts_df,
+                'comments': comments_df,
+                'metric_snapshots': self.db.get_metric_snapshots_frame(channel_id)
+            }
+            
+            name = channel_info.get('username') or f"channel_{channel_info.get('telegram_id')}"
+            exported_at = datetime.now(timezone.utc)
+            path = os.path.join(self.base_dir, name, exported_at.strftime('%Y%m%d_%H%M%S'))
+            os.makedirs(path)
+            
+            counts = {}
+            for dataset, ts_column in DATASETS.items():
+                df = frames[dataset]
+                counts[dataset] = len(df)
+                if df.empty:
+                    continue
+                
+                # Столбец datetime не сохраняется: он восстанавливается по date_ts при чтении
+                month = pd.to_datetime(df[ts_column], unit='s').dt.strftime('%Y-%m')
+                df = df.drop(columns=['datetime'], errors='ignore').assign(month=month)
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                pq.write_to_dataset(table, os.path.join(path, dataset), partition_cols=['month'])
+            
+            with open(os.path.join(path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'format_version': FORMAT_VERSION,
+                    'exported_at': exported_at.strftime('%Y-%m-%d %H:%M:%S'),
+                    'schema_version': self.db.get_schema_version(),
+                    'channel': channel_info,
+                    'counts': counts
+                }, f, ensure_ascii=False, indent=2, default=str)
+            
+            logger.info(
+                f"Снимок канала {name} сохранен в {path}: {counts['posts']} постов, "
+                f"{counts['comments']} комментариев, {counts['metric_snapshots']} снимков счетчиков"
+            )
+            return path
+        
+        except ImportError:
+            logger.error("Ошибка: библиотека pyarrow не установлена")
+            return ""
+        
+        except Exception as e:
+            logger.error(f"Ошибка при выгрузке снимка канала: {str(e)}")
+            return ""
+    
+    def load(self, path: str, since: Optional[int] = None, until: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Чтение снимка канала с отображением файлов Parquet в память
+        
+        Файлы за месяцы вне периода не читаются. Комментарии и снимки счетчиков
+        возвращаются только для постов периода, как в Database.get_comments_frame.
+        
+        Args:
+            path: Каталог снимка
+            since: Начало периода публикации постов в Unix time (включительно)
+            until: Конец периода публикации постов в Unix time (не включительно)
+        
+        Returns:
+            Словарь с полями channel_info, posts, comments, metric_snapshots (DataFrame
+            с теми же столбцами и типами, что у Database.get_*_frame)
+        """
+        try:
+            with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            
+            snapshot = {'channel_info': manifest['channel']}
+            snapshot['posts'] = self._read_dataset(path, 'posts', since, until)
+            
+            # Комментарии и снимки счетчиков не бывают раньше публикации поста
+            for dataset in ('comments', 'metric_snapshots'):
+                df = self._read_dataset(path, dataset, since, None)
+                if not df.empty and (since is not None or until is not None):
+                    df = df[df['post_id'].isin(snapshot['posts']['id'])].reset_index(drop=True)
+                snapshot[dataset] = df
+            
+            return snapshot
+        
+        except ImportError:
+            logger.error("Ошибка: библиотека pyarrow не установлена")
+            return {}
+        
+        except Exception as e:
+            logger.error(f"Ошибка при чтении снимка канала: {str(e)}")
+            return {}
+    
+    def _read_dataset(self, path: str, dataset: str, since: Optional[int],
+                      until: Optional[int]) -> pd.DataFrame:
+        """
+        Чтение одного набора снимка с отбором по столбцу Unix time
+        
+        Returns:
+            DataFrame набора или пустой DataFrame, если набор не выгружался
+        """
+        import pyarrow.parquet as pq
+        
+        dataset_path = os.path.join(path, dataset)
+        if not os.path.isdir(dataset_path):
+            return pd.DataFrame()
+        
+        ts_column = DATASETS[dataset]
+        filters = []
+        if since is not None:
+            filters.append(('month', '>=', datetime.fromtimestamp(since, timezone.utc).strftime('%Y-%m')))
+            filters.append((ts_column, '>=', since))
+        if until is not None:
+            filters.append(('month', '<=', datetime.fromtimestamp(until, timezone.utc).strftime('%Y-%m')))
+            filters.append((ts_column, '<', until))
+        
+        table = pq.read_table(
+            dataset_path,
+            memory_map=True,
+            partitioning='hive',
+            filters=filters or None
+        )
+        df = table.drop_columns(['month']).to_pandas(split_blocks=True)
+        
+        # Столбцы, в которых все значения NULL, читаются без типа
+        df = df.astype({
+            column: FRAME_DTYPES[column] for column in df.columns
+            if column in FRAME_DTYPES and str(df[column].dtype) != FRAME_DTYPES[column]
+        })
+        if ts_column == 'date_ts':
+            df['datetime'] = pd.to_datetime(df['date_ts'].to_numpy(dtype=float, na_value=np.nan), unit='s')
+        
+        # Файлы месяцев читаются по порядку имен, порядок строк восстанавливается как в БД
+        if dataset == 'posts':
+            return df.sort_values(ts_column, ascending=False, kind='stable', ignore_index=True)
+        if dataset == 'comments':
+            return df.sort_values(ts_column, kind='stable', ignore_index=True)
+        return df.sort_values(['post_id', ts_column], kind='stable', ignore_index=True)
+    
+    def import_snapshot(self, path: str) -> int:
+        """
+        Загрузка снимка канала в базу данных
+        
+        Посты и комментарии сопоставляются с уже сохраненными по Telegram ID, поэтому
+        повторный импорт обновляет записи, а не дублирует их. Снимки счетчиков
+        сохраняются с исходным временем.
+        
+        Args:
+            path: Каталог снимка
+        
+        Returns:
+            ID канала в базе данных
+        """
+        snapshot = self.load(path)
+        if not snapshot:
+            raise ValueError(f"Не удалось прочитать снимок канала: {path}")
+        
+        try:
+            channel_info = dict(snapshot['channel_info'], id=snapshot['channel_info'].get('telegram_id'))
+            channel_id = self.db.save_channel_info(channel_info)
+            
+            posts = self._records(snapshot['posts'], {'telegram_id': 'id'}, ['id', 'channel_id', 'datetime'])
+            for start in range(0, len(posts), self.import_batch_size):
+                self.db.save_posts(posts[start:start + self.import_batch_size], channel_id, save_snapshots=False)
+            
+            comments = self._records(
+                snapshot['comments'],
+                {'telegram_id': 'id', 'post_telegram_id': 'post_id'},
+                ['id', 'post_id', 'datetime']
+            )
+            for comment in comments:
+                comment['channel_id'] = channel_info['id']
+            for start in range(0, len(comments), self.import_batch_size):
+                self.db.save_comments(comments[start:start + self.import_batch_size])
+            
+            metric_snapshots = self._records(snapshot['metric_snapshots'], {'post_telegram_id': 'id'}, ['post_id'])
+            for start in range(0, len(metric_snapshots), self.import_batch_size):
+                self.db.save_metric_snapshots(channel_id, metric_snapshots[start:start + self.import_batch_size])
+            
+            logger.info(
+                f"Снимок {path} загружен в канал с ID {channel_id}: {len(posts)} постов, "
+                f"{len(comments)} комментариев, {len(metric_snapshots)} снимков счетчиков"
+            )
+            return channel_id
+        
+        except Exception as e:
+            logger.error(f"Ошибка при импорте снимка канала: {str(e)}")
+            raise
+    
+    @staticmethod
+    def _records(df: pd.DataFrame, rename: Dict[str, str], drop: List[str]) -> List[Dict[str, Any]]:
+        """
+        Записи DataFrame снимка в формате методов сохранения Database
+        
+        Args:
+            df: DataFrame набора снимка
+            rename: Переименование столбцов (Telegram ID вместо ID исходной базы)
+            drop: Столбцы, удаляемые до переименования
+        
+        Returns:
+            Список словарей со значениями встроенных типов Python и None вместо пропусков
+        """
+        if df.empty:
+            return []
+        
+        df = df.drop(columns=[column for column in drop if column in df.columns]).rename(columns=rename)
+        df = df.astype(object)
+        return df.where(df.notna(), None).to_dict('records')
+
+def main():
+    """Выгрузка и импорт снимков каналов из командной строки"""
+    from dotenv import load_dotenv
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(levelname)s] %(message)s'
+    )
+    load_dotenv()
+    
+    parser = argparse.ArgumentParser(description='Снимки данных Telegram-каналов в Parquet')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    export_parser = subparsers.add_parser('export', help='Выгрузить каналы из базы данных')
+    export_parser.add_argument('channels', nargs='+', help='Username или ID каналов')
+    export_parser.add_argument('--output-dir', default=None, help='Каталог снимков')
+    
+    import_parser = subparsers.add_parser('import', help='Загрузить снимки в базу данных')
+    import_parser.add_argument('paths', nargs='+', help='Каталоги снимков')
+    args = parser.parse_args()
+    
+    db = Database()
+    db.init_db()
+    store = ChannelSnapshotStore(db, base_dir=getattr(args, 'output_dir', None))
+    failed = False
+    
+    try:
+        if args.command == 'export':
+            for channel in args.channels:
+                channel_id = db.find_channel_id(channel)
+                if not channel_id:
+                    logger.error(f"{channel}: канал не найден в базе данных")
+                    failed = True
+                elif not store.export_channel(channel_id):
+                    failed = True
+        else:
+            for path in args.paths:
+                try:
+                    store.import_snapshot(path)
+                except Exception:
+                    failed = True
+    finally:
+        db.close()
+    
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
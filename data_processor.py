@@ -2,7 +2,7 @@ import logging
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Optional, Union
 from collections import Counter
 import re
 from nltk.tokenize import word_tokenize
@@ -12,6 +12,12 @@ import nltk
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
+# Возраст поста в часах, для которого строится кривая набора просмотров
+DECAY_HORIZONS = (1, 24, 72)
+
+# Дни недели в порядке номеров агрегатов (0 - понедельник)
+DAYS_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
 # Загрузка необходимых ресурсов для NLTK
 try:
     nltk.data.find('tokenizers/punkt')
@@ -32,15 +38,23 @@ class DataProcessor:
         self.english_stopwords = set(stopwords.words('english'))
         self.all_stopwords = self.russian_stopwords.union(self.english_stopwords)
     
-    def process_data(self, channel_info: Dict[str, Any], posts: List[Dict[str, Any]], 
-                    comments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def process_data(self, channel_info: Dict[str, Any],
+                    posts: Union[List[Dict[str, Any]], pd.DataFrame],
+                    comments: Union[List[Dict[str, Any]], pd.DataFrame],
+                    snapshots: Optional[Union[List[Dict[str, Any]], pd.DataFrame]] = None,
+                    rollups: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, Any]:
         """
         Обработка данных канала и вычисление метрик
         
         Args:
             channel_info: Информация о канале
-            posts: Список постов
-            comments: Список комментариев
+            posts: Список постов или DataFrame (Database.get_posts_frame)
+            comments: Список комментариев или DataFrame (Database.get_comments_frame)
+            snapshots: Снимки счетчиков постов для анализа динамики просмотров (список
+                или DataFrame, например из ChannelSnapshotStore.load)
+            rollups: Агрегаты канала из БД (Database.get_channel_rollups). Распределение
+                публикаций по времени и комментариев по дням берется из них, а не
+                вычисляется по всем постам и комментариям
             
         Returns:
             Словарь с обработанными данными и рассчитанными метриками
@@ -48,23 +62,35 @@ class DataProcessor:
         logger.info("Вычисление базовых метрик...")
         
         # Преобразование в DataFrame для удобства анализа
-        posts_df = pd.DataFrame(posts)
-        comments_df = pd.DataFrame(comments) if comments else pd.DataFrame()
+        posts_df = self._to_frame(posts)
+        comments_df = self._to_frame(comments)
+        
+        # Агрегаты по дню недели и часу и комментарии по дням
+        if rollups:
+            weekday_hour = pd.DataFrame(rollups.get('weekday_hour', []))
+            comments_by_date = {row['date']: row['comments'] for row in rollups.get('daily', []) if row['comments']}
+        else:
+            weekday_hour = self._weekday_hour_rollup(posts_df)
+            comments_by_date = None
         
         # Расчет базовых метрик канала
         channel_metrics = self._calculate_channel_metrics(channel_info, posts_df)
         
         # Расчет метрик постов
-        post_metrics = self._calculate_post_metrics(posts_df, comments_df)
+        post_metrics = self._calculate_post_metrics(posts_df, comments_df, weekday_hour)
         
         # Анализ комментариев
-        comment_analysis = self._analyze_comments(comments_df)
+        comment_analysis = self._analyze_comments(comments_df, comments_by_date)
         
         # Тематический анализ контента
         content_analysis = self._analyze_content(posts_df)
         
         # Анализ времени публикации
-        time_analysis = self._analyze_posting_time(posts_df)
+        time_analysis = self._analyze_posting_time(weekday_hour)
+        
+        # Скорость набора просмотров по снимкам счетчиков
+        snapshots_df = snapshots if isinstance(snapshots, pd.DataFrame) else pd.DataFrame(snapshots or [])
+        view_dynamics = self._analyze_view_dynamics(posts_df, snapshots_df)
         
         # Агрегация всех данных в один словарь
         processed_data = {
@@ -74,6 +100,7 @@ class DataProcessor:
             'comment_analysis': comment_analysis,
             'content_analysis': content_analysis,
             'time_analysis': time_analysis,
+            'view_dynamics': view_dynamics,
             'raw_data': {
                 'posts_count': len(posts),
                 'comments_count': len(comments)
@@ -83,6 +110,55 @@ class DataProcessor:
         logger.info("Предобработка данных завершена")
         return processed_data
     
+    def _to_frame(self, records: Union[List[Dict[str, Any]], pd.DataFrame]) -> pd.DataFrame:
+        """
+        DataFrame постов или комментариев со столбцом datetime (UTC)
+        
+        DataFrame из Database используется без копирования данных: столбец datetime в нем
+        уже есть, а изменения столбцов при анализе не затрагивают исходный DataFrame.
+        Для списков записей datetime вычисляется по Unix time в date_ts; строковые даты
+        разбираются только для записей без date_ts.
+        """
+        if isinstance(records, pd.DataFrame):
+            df = records.copy(deep=False)
+        else:
+            df = pd.DataFrame(records)
+        
+        if df.empty or 'datetime' in df.columns:
+            return df
+        
+        if 'date_ts' in df.columns:
+            df['datetime'] = pd.to_datetime(df['date_ts'], unit='s', errors='coerce')
+        elif 'date' in df.columns:
+            df['datetime'] = pd.to_datetime(df['date'].astype(str).str.replace(',', '').str.strip(), errors='coerce')
+        
+        return df
+    
+    def _weekday_hour_rollup(self, posts_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Агрегаты постов по дню недели и часу публикации в формате таблицы channel_hourly_stats
+        (для данных, для которых нет агрегатов в БД)
+        """
+        columns = ['weekday', 'hour', 'posts', 'views', 'forwards', 'replies', 'er_sum']
+        if posts_df.empty or 'datetime' not in posts_df.columns:
+            return pd.DataFrame(columns=columns)
+        
+        df = posts_df.dropna(subset=['datetime'])
+        views = df['views'].fillna(0)
+        forwards = df['forwards'].fillna(0)
+        replies = df['replies'].fillna(0)
+        
+        rows = pd.DataFrame({
+            'weekday': df['datetime'].dt.weekday,
+            'hour': df['datetime'].dt.hour,
+            'posts': 1,
+            'views': views,
+            'forwards': forwards,
+            'replies': replies,
+            'er_sum': ((forwards + replies) * 100 / views).where(views > 0, 0)
+        })
+        return rows.groupby(['weekday', 'hour'], as_index=False)[columns[2:]].sum()
+    
     def _calculate_channel_metrics(self, channel_info: Dict[str, Any], 
                                   posts_df: pd.DataFrame) -> Dict[str, Any]:
         """Расчет общих метрик канала"""
@@ -94,13 +170,6 @@ class DataProcessor:
         metrics['days_active'] = self._calculate_days_active(channel_info)
         
         if not posts_df.empty:
-            # Очистка дат от потенциальных проблем
-            posts_df['date'] = posts_df['date'].astype(str).str.replace(',', '')
-            posts_df['date'] = posts_df['date'].str.strip()
-            
-            # Конвертация строковых дат в datetime
-            posts_df['datetime'] = pd.to_datetime(posts_df['date'], errors='coerce')
-            
             # Обрабатываем числовые поля, заменяя NaN на 0
             num_columns = ['views', 'forwards', 'replies']
             for col in num_columns:
@@ -182,7 +251,7 @@ class DataProcessor:
         return round(growth, 2)
     
     def _calculate_post_metrics(self, posts_df: pd.DataFrame, 
-                               comments_df: pd.DataFrame) -> Dict[str, Any]:
+                               comments_df: pd.DataFrame, weekday_hour: pd.DataFrame) -> Dict[str, Any]:
         """Расчет метрик для постов"""
         if posts_df.empty:
             return {}
@@ -190,19 +259,12 @@ class DataProcessor:
         # Создаем копию DataFrame с преобразованными датами
         df = posts_df.copy()
         
-        # Очистка дат от потенциальных проблем
-        df['date'] = df['date'].astype(str).str.replace(',', '')
-        df['date'] = df['date'].str.strip()
-        
         # Обрабатываем числовые поля, заменяя NaN на 0
         num_columns = ['views', 'forwards', 'replies']
         for col in num_columns:
             if col in df.columns:
                 df[col] = df[col].fillna(0)
         
-        # Конвертация строковых дат в datetime
-        df['datetime'] = pd.to_datetime(df['date'], errors='coerce')
-        
         # Удаляем строки с неправильной датой
         df = df.dropna(subset=['datetime'])
         
@@ -230,7 +292,7 @@ class DataProcessor:
             metrics.update({'length_impact': [], 'optimal_length': 'Не определено'})
         
         # Динамика публикаций по времени
-        metrics['posting_frequency'] = self._analyze_posting_frequency(df)
+        metrics['posting_frequency'] = self._analyze_posting_frequency(weekday_hour)
         
         return metrics
     
@@ -321,33 +383,23 @@ class DataProcessor:
         
         return {'length_impact': [], 'optimal_length': 'Не определено'}
     
-    def _analyze_posting_frequency(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Анализ частоты публикаций"""
-        if df.empty:
+    def _analyze_posting_frequency(self, weekday_hour: pd.DataFrame) -> Dict[str, Any]:
+        """Анализ частоты публикаций по агрегатам постов по дню недели и часу"""
+        if weekday_hour.empty:
             return {}
             
-        # Добавляем день недели и час публикации
         try:
-            df['day_of_week'] = df['datetime'].dt.day_name()
-            df['hour'] = df['datetime'].dt.hour
-            
-            # Количество постов по дням недели
-            days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            day_counts = df['day_of_week'].value_counts().reindex(days_order).fillna(0).to_dict()
+            # Количество постов и средний ER по дням недели и по часам
+            by_day = weekday_hour.groupby('weekday')[['posts', 'er_sum']].sum()
+            by_day.index = [DAYS_ORDER[weekday] for weekday in by_day.index]
+            by_hour = weekday_hour.groupby('hour')[['posts', 'er_sum']].sum()
             
-            # Количество постов по часам
-            hour_counts = df['hour'].value_counts().sort_index().to_dict()
+            day_counts = by_day['posts'].reindex(DAYS_ORDER).fillna(0).to_dict()
+            hour_counts = by_hour['posts'].sort_index().to_dict()
             
-            # Заполняем пропущенные значения ER
-            if 'er' in df.columns:
-                df['er'] = df['er'].fillna(0)
-                
-                # Определение лучшего времени для публикации по ER
-                best_days = df.groupby('day_of_week')['er'].mean().sort_values(ascending=False).to_dict()
-                best_hours = df.groupby('hour')['er'].mean().sort_values(ascending=False).to_dict()
-            else:
-                best_days = {}
-                best_hours = {}
+            # Определение лучшего времени для публикации по ER
+            best_days = (by_day['er_sum'] / by_day['posts']).sort_values(ascending=False).to_dict()
+            best_hours = (by_hour['er_sum'] / by_hour['posts']).sort_values(ascending=False).to_dict()
             
             return {
                 'posts_by_day': day_counts,
@@ -359,23 +411,17 @@ class DataProcessor:
             logger.error(f"Ошибка при анализе частоты публикаций: {str(e)}")
             return {}
     
-    def _analyze_comments(self, comments_df: pd.DataFrame) -> Dict[str, Any]:
-        """Анализ комментариев"""
+    def _analyze_comments(self, comments_df: pd.DataFrame,
+                          comments_by_date: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """Анализ комментариев (comments_by_date - количество комментариев по дням из агрегатов БД)"""
         if comments_df.empty:
             return {'comments_count': 0}
             
         # Создаем копию DataFrame
         df = comments_df.copy()
         
-        # Очистка дат от потенциальных проблем
-        if 'date' in df.columns:
-            df['date'] = df['date'].astype(str).str.replace(',', '')
-            df['date'] = df['date'].str.strip()
-            
-            # Преобразование дат
-            df['datetime'] = pd.to_datetime(df['date'], errors='coerce')
-            
-            # Удаляем строки с неправильной датой
+        # Удаляем строки с неправильной датой
+        if 'datetime' in df.columns:
             df = df.dropna(subset=['datetime'])
         
         # Основные метрики комментариев
@@ -414,7 +460,9 @@ class DataProcessor:
             metrics['comment_keywords'] = keywords
         
         # Динамика комментариев по времени
-        if 'datetime' in df.columns and not df.empty:
+        if comments_by_date is not None:
+            metrics['comments_by_date'] = comments_by_date
+        elif 'datetime' in df.columns and not df.empty:
             comments_by_date = df.groupby(df['datetime'].dt.date).size().to_dict()
             metrics['comments_by_date'] = {str(k): v for k, v in comments_by_date.items()}
         else:
@@ -563,75 +611,111 @@ class DataProcessor:
         
         return topics
     
-    def _analyze_posting_time(self, posts_df: pd.DataFrame) -> Dict[str, Any]:
-        """Анализ времени публикации"""
-        if posts_df.empty:
-            return {}
-            
-        # Преобразование дат
-        df = posts_df.copy()
-        
-        # Очистка дат от потенциальных проблем
-        df['date'] = df['date'].astype(str).str.replace(',', '')
-        df['date'] = df['date'].str.strip()
-        
-        # Конвертация строковых дат в datetime
-        df['datetime'] = pd.to_datetime(df['date'], errors='coerce')
-        
-        # Удаляем строки с неправильной датой
-        df = df.dropna(subset=['datetime'])
-        
-        # Заполняем пропущенные числовые значения
-        if 'views' in df.columns:
-            df['views'] = df['views'].fillna(0)
-        
-        if df.empty:  # Если все строки были удалены из-за неправильных дат
+    def _analyze_posting_time(self, weekday_hour: pd.DataFrame) -> Dict[str, Any]:
+        """Анализ времени публикации по агрегатам постов по дню недели и часу"""
+        if weekday_hour.empty:
             return {'heatmap': {}, 'best_posting_times': []}
         
-        # Добавление колонок с днем недели и часом
-        df['day_of_week'] = df['datetime'].dt.day_name()
-        df['hour'] = df['datetime'].dt.hour
+        df = weekday_hour[weekday_hour['posts'] > 0].copy()
+        df['avg_views'] = (df['views'] / df['posts']).astype(int)
+        cells = {(row.weekday, row.hour): row for row in df.itertuples()}
         
         # Тепловая карта активности по дням недели и часам
         heatmap_data = {}
-        days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        
-        for day in days_order:
+        for weekday, day in enumerate(DAYS_ORDER):
             day_data = {}
-            day_posts = df[df['day_of_week'] == day]
             
             for hour in range(24):
-                hour_posts = day_posts[day_posts['hour'] == hour]
-                count = len(hour_posts)
-                avg_views = int(hour_posts['views'].mean()) if not hour_posts.empty else 0
-                
+                cell = cells.get((weekday, hour))
                 day_data[hour] = {
-                    'count': count,
-                    'avg_views': avg_views
+                    'count': int(cell.posts) if cell else 0,
+                    'avg_views': int(cell.avg_views) if cell else 0
                 }
             
             heatmap_data[day] = day_data
         
-        # Рекомендуемое время публикации
-        if 'views' in df.columns:
-            # Группировка по дню и часу, вычисление среднего количества просмотров
-            time_performance = df.groupby(['day_of_week', 'hour'])['views'].mean().reset_index()
-            
-            # Сортировка по просмотрам
-            best_times = time_performance.sort_values('views', ascending=False).head(5)
-            
-            # Преобразование в список рекомендаций
-            recommendations = []
-            for _, row in best_times.iterrows():
-                recommendations.append({
-                    'day': row['day_of_week'],
-                    'hour': int(row['hour']),
-                    'avg_views': int(row['views'])
-                })
+        # Рекомендуемое время публикации: часы с наибольшим средним количеством просмотров
+        best_times = df.sort_values('avg_views', ascending=False).head(5)
+        recommendations = [{
+            'day': DAYS_ORDER[int(row.weekday)],
+            'hour': int(row.hour),
+            'avg_views': int(row.avg_views)
+        } for row in best_times.itertuples()]
+        
+        return {
+            'heatmap': heatmap_data,
+            'best_posting_times': recommendations
+        }
+    
+    def _analyze_view_dynamics(self, posts_df: pd.DataFrame, snapshots_df: pd.DataFrame) -> Dict[str, Any]:
+        """Анализ скорости набора просмотров и кривой затухания по снимкам счетчиков"""
+        if posts_df.empty or snapshots_df.empty:
+            return {}
+        
+        # Время публикации в Unix time для сопоставления со снимками
+        posts = posts_df[['id', 'datetime', 'views']].dropna(subset=['datetime'])
+        posts['published_at'] = (posts['datetime'] - pd.Timestamp('1970-01-01')) // pd.Timedelta(seconds=1)
+        
+        # В DataFrame снимков (Database.get_metric_snapshots_frame) post_id имеет тип Int64,
+        # а merge_asof требует совпадения типов ключей с ID постов
+        snaps = snapshots_df.astype({'post_id': 'int64'})
+        snaps = snaps.merge(posts[['id', 'published_at']], left_on='post_id', right_on='id')
+        snaps = snaps[snaps['captured_at'] >= snaps['published_at']].sort_values(['post_id', 'captured_at'])
+        if snaps.empty:
+            return {}
+        
+        snaps['age_hours'] = (snaps['captured_at'] - snaps['published_at']) / 3600
+        
+        # Скорость между соседними снимками поста; для первого снимка - от момента публикации
+        grouped = snaps.groupby('post_id')
+        delta_views = grouped['views'].diff()
+        delta_hours = grouped['age_hours'].diff()
+        snaps['velocity'] = (delta_views / delta_hours).where(delta_hours > 0)
+        first_velocity = (snaps['views'] / snaps['age_hours']).where(snaps['age_hours'] > 0)
+        snaps['velocity'] = snaps['velocity'].fillna(first_velocity)
+        
+        # Кривая затухания: просмотры на заданном возрасте поста по ближайшему снимку
+        snaps_by_time = snaps[['post_id', 'captured_at', 'views']].sort_values('captured_at')
+        final_views = posts.set_index('id')['views']
+        decay_curve = []
+        for hours in DECAY_HORIZONS:
+            targets = posts[['id', 'published_at']].copy()
+            targets['target_at'] = targets['published_at'] + hours * 3600
+            matched = pd.merge_asof(
+                targets.sort_values('target_at'), snaps_by_time,
+                left_on='target_at', right_on='captured_at',
+                left_by='id', right_by='post_id',
+                direction='nearest', tolerance=max(1800, hours * 900)
+            ).dropna(subset=['views'])
+            
+            if matched.empty:
+                decay_curve.append({'hours': hours, 'posts': 0, 'median_views': 0, 'share_of_final': 0})
+                continue
             
-            return {
-                'heatmap': heatmap_data,
-                'best_posting_times': recommendations
-            }
+            final = final_views.reindex(matched['id']).to_numpy()
+            share = np.where(final > 0, matched['views'].to_numpy() / np.where(final > 0, final, 1) * 100, np.nan)
+            decay_curve.append({
+                'hours': hours,
+                'posts': len(matched),
+                'median_views': int(matched['views'].median()),
+                'share_of_final': round(float(np.nanmedian(share)), 2) if not np.isnan(share).all() else 0
+            })
+        
+        # Текущая скорость - по последнему снимку каждого поста
+        latest = snaps.groupby('post_id').tail(1).dropna(subset=['velocity'])
+        fastest = latest.sort_values('velocity', ascending=False).head(5)
+        texts = posts_df.set_index('id')['text'].fillna('') if 'text' in posts_df.columns else pd.Series(dtype=str)
         
-        return {'heatmap': heatmap_data, 'best_posting_times': []}
\ No newline at end of file
+        return {
+            'decay_curve': decay_curve,
+            'median_velocity': round(float(latest['velocity'].median()), 2) if not latest.empty else 0,
+            'fastest_posts': [
+                {
+                    'id': int(row['post_id']),
+                    'velocity': round(float(row['velocity']), 2),
+                    'age_hours': round(float(row['age_hours']), 1),
+                    'text_preview': str(texts.get(row['post_id'], ''))[:100]
+                }
+                for _, row in fastest.iterrows()
+            ]
+        }
@@ -1,50 +1,296 @@
 import os
+import re
 import logging
 import sqlite3
 import json
-from datetime import datetime
+import base64
+import zlib
+import time
+import threading
+from datetime import datetime, timezone
 from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+import pandas as pd
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
+# Миграции схемы: (версия, описание, метод Database). Версия хранится в PRAGMA user_version
+MIGRATIONS = [
+    (1, "Уникальный ключ постов (channel_id, telegram_id)", '_migrate_posts_unique_key'),
+    (2, "Уникальный ключ комментариев (post_id, telegram_id)", '_migrate_comments_unique_key'),
+    (3, "Индексы для выборок постов, комментариев, отчетов и каналов", '_migrate_analytical_indexes'),
+    (4, "Даты постов и комментариев в Unix time (date_ts)", '_migrate_epoch_dates'),
+    (5, "Агрегаты каналов по дням и по дням недели и часам", '_migrate_channel_rollups'),
+    (6, "Полнотекстовый индекс FTS5 по текстам постов и комментариев", '_migrate_full_text_search'),
+    (7, "Столбец ER постов и индексы для сортировки списка постов", '_migrate_post_sort_indexes'),
+    (8, "Сжатые промпты и ответы отчетов в таблице report_bodies", '_migrate_report_bodies')
+]
+
+# Вовлеченность поста (ER, %) - как в DataProcessor; вычисляемый столбец posts.er
+POST_ER_SQL = "CASE WHEN views > 0 THEN (COALESCE(forwards, 0) + COALESCE(replies, 0)) * 100.0 / views ELSE 0 END"
+
+# Поля сортировки списка постов и столбцы posts, по которым построены индексы (channel_id, столбец)
+POST_SORT_COLUMNS = {
+    'date': 'date_ts',
+    'views': 'views',
+    'er': 'er'
+}
+
+# Окончания русских слов, отбрасываемые при поиске: запрос "каналы" находит "канал", "канала", "каналов"
+RUSSIAN_ENDINGS = sorted([
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'иях', 'ах', 'ях', 'ам', 'ям', 'ов', 'ев',
+    'ой', 'ей', 'ый', 'ий', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ом', 'ем', 'ую', 'юю', 'ия',
+    'а', 'я', 'ы', 'и', 'у', 'ю', 'е', 'о', 'ь'
+], key=len, reverse=True)
+
+# Типы столбцов DataFrame, возвращаемых get_posts_frame и get_comments_frame:
+# счетчики - int64 (NULL -> 0), идентификаторы с возможным NULL - Int64, флаги - bool,
+# тип медиа - category, datetime - datetime64 (UTC) по столбцу date_ts
+FRAME_DTYPES = {
+    'id': 'int64',
+    'telegram_id': 'Int64',
+    'channel_id': 'Int64',
+    'post_id': 'Int64',
+    'post_telegram_id': 'Int64',
+    'user_id': 'Int64',
+    'date_ts': 'Int64',
+    'views': 'int64',
+    'forwards': 'int64',
+    'replies': 'int64',
+    'likes': 'int64',
+    'captured_at': 'int64',
+    'er': 'float64',
+    'has_media': 'bool',
+    'is_pinned': 'bool',
+    'is_reply': 'bool',
+    'media_type': 'category'
+}
+
+def fts_query(text: str) -> Optional[str]:
+    """
+    Преобразование пользовательского запроса в запрос FTS5
+    
+    Слова запроса объединяются через AND. Для русских слов отбрасывается окончание
+    и используется поиск по префиксу, английские слова приводятся к основе
+    токенизатором porter.
+    
+    Args:
+        text: Строка запроса
+        
+    Returns:
+        Запрос для MATCH или None, если в строке нет слов
+    """
+    terms = []
+    for word in re.findall(r'\w+', text.lower()):
+        if re.search('[а-яё]', word):
+            for ending in RUSSIAN_ENDINGS:
+                if word.endswith(ending) and len(word) - len(ending) >= 4:
+                    word = word[:-len(ending)]
+                    break
+            terms.append(f'"{word}"*')
+        else:
+            terms.append(f'"{word}"')
+    
+    return ' AND '.join(terms) if terms else None
+
+def encode_cursor(value, post_id: int) -> str:
+    """
+    Курсор страницы списка постов: значение сортировки и ID последнего поста страницы
+    
+    Returns:
+        Строка для передачи в URL
+    """
+    return base64.urlsafe_b64encode(json.dumps([value, post_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Optional[Tuple[Any, int]]:
+    """
+    Разбор курсора, созданного encode_cursor
+    
+    Returns:
+        Кортеж (значение сортировки, ID поста) или None, если курсор поврежден
+    """
+    try:
+        value, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    
+    if not isinstance(post_id, int) or not (value is None or isinstance(value, (int, float))):
+        return None
+    return value, post_id
+
+def compress_text(text: Optional[str], codec: str) -> Optional[bytes]:
+    """
+    Сжатие текста для хранения в BLOB
+    
+    Args:
+        text: Текст (None сохраняется как NULL)
+        codec: 'zlib' или 'zstd' (требуется библиотека zstandard)
+        
+    Returns:
+        Сжатые байты UTF-8 или None
+    """
+    if text is None:
+        return None
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=9).compress(text.encode('utf-8'))
+    return zlib.compress(text.encode('utf-8'), 9)
+
+def decompress_text(data: Optional[bytes], codec: str) -> Optional[str]:
+    """
+    Распаковка текста, сжатого compress_text
+    
+    Args:
+        data: Сжатые байты или None
+        codec: Кодек, которым был сжат текст
+        
+    Returns:
+        Исходный текст или None
+    """
+    if data is None:
+        return None
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return zlib.decompress(data).decode('utf-8')
+
+def to_epoch(value) -> Optional[int]:
+    """
+    Преобразование даты в Unix time (UTC)
+    
+    Args:
+        value: Unix time, datetime (без часового пояса считается UTC) или строка ISO 8601
+        
+    Returns:
+        Количество секунд с начала эпохи или None, если дату не удалось разобрать
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    
+    try:
+        return to_epoch(datetime.fromisoformat(str(value).replace(',', '').strip()))
+    except ValueError:
+        return None
+
 class Database:
     """Класс для работы с базой данных SQLite"""
     
-    def __init__(self, db_path: str = 'data/telegram_analytics.db'):
+    def __init__(self, db_path: str = 'data/telegram_analytics.db', pool_size: Optional[int] = None,
+                 busy_timeout: Optional[float] = None):
         """
         Инициализация подключения к базе данных
         
+        Каждый поток получает собственное подключение: оно создается при первом обращении
+        или берется из пула свободных подключений и возвращается в пул release_connection().
+        Поэтому один экземпляр Database можно использовать из потоков веб-сервера и загрузки.
+        
         Args:
             db_path: Путь к файлу базы данных
+            pool_size: Максимальное количество свободных подключений в пуле (DB_POOL_SIZE, по умолчанию 8)
+            busy_timeout: Время ожидания блокировки базы другим подключением в секундах
+                (DB_BUSY_TIMEOUT, по умолчанию 30)
         """
         # Создание директории для БД, если не существует
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
         self.db_path = db_path
-        self.conn = None
+        self.pool_size = pool_size if pool_size is not None else int(os.getenv('DB_POOL_SIZE', 8))
+        self.busy_timeout = busy_timeout if busy_timeout is not None else float(os.getenv('DB_BUSY_TIMEOUT', 30))
+        self.cache_size_kb = int(os.getenv('DB_CACHE_SIZE_KB', 16384))
+        self.mmap_size = int(os.getenv('DB_MMAP_SIZE', 256 * 1024 * 1024))
+        self.report_codec = self._report_codec(os.getenv('REPORT_COMPRESSION', 'zlib'))
+        
+        self._local = threading.local()
+        self._idle = []
+        self._pool_lock = threading.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Открытие нового подключения с настройками производительности
+        
+        WAL позволяет читать базу во время записи, synchronous=NORMAL в режиме WAL
+        не рискует целостностью базы, а только последними транзакциями при сбое питания.
+        
+        Returns:
+            Объект подключения к базе данных
+        """
+        # Пул передает подключения между потоками, но одновременно подключение использует один поток
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Для получения результатов в виде словарей
+        
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Не удалось включить режим WAL: {str(e)}")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{self.cache_size_kb}")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        
+        return conn
     
     def _get_connection(self) -> sqlite3.Connection:
         """
-        Получение подключения к базе данных
+        Получение подключения текущего потока
         
         Returns:
             Объект подключения к базе данных
         """
-        if self.conn is None:
-            self.conn = sqlite3.connect(self.db_path)
-            self.conn.row_factory = sqlite3.Row  # Для получения результатов в виде словарей
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._pool_lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+            self._local.conn = conn
+        
+        return conn
+    
+    def release_connection(self):
+        """Возврат подключения текущего потока в пул (например, по окончании HTTP-запроса)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
         
-        return self.conn
+        self._local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        
+        with self._pool_lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
     
     def _close_connection(self):
-        """Закрытие подключения к базе данных"""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        """Закрытие подключения текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn:
+            conn.close()
+            self._local.conn = None
+    
+    def close(self):
+        """Закрытие подключения текущего потока и всех свободных подключений пула"""
+        self._close_connection()
+        with self._pool_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
     
-    def init_db(self):
-        """Инициализация структуры базы данных"""
+    def init_db(self, schema_version: Optional[int] = None):
+        """
+        Инициализация структуры базы данных
+        
+        Args:
+            schema_version: Версия схемы, до которой применяются миграции (по умолчанию последняя)
+        """
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
@@ -72,6 +318,7 @@ class Database:
                 telegram_id INTEGER,
                 channel_id INTEGER,
                 date TEXT,
+                date_ts INTEGER,
                 text TEXT,
                 views INTEGER,
                 forwards INTEGER,
@@ -79,9 +326,10 @@ class Database:
                 has_media BOOLEAN,
                 media_type TEXT,
                 is_pinned BOOLEAN,
+                er REAL GENERATED ALWAYS AS ({POST_ER_SQL}) VIRTUAL,
                 FOREIGN KEY (channel_id) REFERENCES channels (id)
             )
-            ''')
+            '''.format(POST_ER_SQL=POST_ER_SQL))
             
             # Таблица для комментариев
             cursor.execute('''
@@ -92,6 +340,7 @@ class Database:
                 channel_id INTEGER,
                 user_id INTEGER,
                 date TEXT,
+                date_ts INTEGER,
                 text TEXT,
                 likes INTEGER,
                 is_reply BOOLEAN,
@@ -107,13 +356,65 @@ class Database:
                 channel_id INTEGER,
                 date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 file_path TEXT,
-                prompt TEXT,
-                response TEXT,
                 metrics TEXT,
                 FOREIGN KEY (channel_id) REFERENCES channels (id)
             )
             ''')
             
+            # Таблица для состояния синхронизации каналов (курсор последнего загруженного поста)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS channel_sync_state (
+                channel_id INTEGER PRIMARY KEY,
+                last_message_id INTEGER,
+                last_sync_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (channel_id) REFERENCES channels (id)
+            )
+            ''')
+            
+            # Кэш сущностей Telegram для разрешения каналов без сетевых запросов
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS entity_cache (
+                cache_key TEXT PRIMARY KEY,
+                telegram_id INTEGER NOT NULL,
+                access_hash INTEGER NOT NULL,
+                username TEXT,
+                updated_at INTEGER NOT NULL
+            )
+            ''')
+            
+            # Задания загрузки с контрольными точками для возобновления после сбоя
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel_id INTEGER NOT NULL,
+                params TEXT,
+                status TEXT NOT NULL DEFAULT 'running',
+                phase TEXT NOT NULL DEFAULT 'posts',
+                last_message_id INTEGER,
+                batch_first_id INTEGER,
+                batch_last_id INTEGER,
+                posts_count INTEGER DEFAULT 0,
+                comments_count INTEGER DEFAULT 0,
+                error TEXT,
+                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (channel_id) REFERENCES channels (id)
+            )
+            ''')
+            
+            # Снимки счетчиков постов для анализа динамики просмотров (только добавление)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS post_metric_snapshots (
+                post_id INTEGER NOT NULL,
+                captured_at INTEGER NOT NULL,
+                views INTEGER,
+                forwards INTEGER,
+                replies INTEGER,
+                PRIMARY KEY (post_id, captured_at),
+                FOREIGN KEY (post_id) REFERENCES posts (id)
+            ) WITHOUT ROWID
+            ''')
+            
             # Таблица для шаблонов промптов
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS prompt_templates (
@@ -128,6 +429,9 @@ class Database:
             ''')
             
             conn.commit()
+            
+            # Индексы и изменения существующих таблиц применяются версионированными миграциями
+            self.migrate(schema_version)
             logger.info("База данных инициализирована успешно")
             
             # Добавление стандартных шаблонов промптов, если их нет
@@ -140,6 +444,473 @@ class Database:
         finally:
             self._close_connection()
     
+    def get_schema_version(self) -> int:
+        """
+        Получение текущей версии схемы
+        
+        Returns:
+            Номер последней примененной миграции
+        """
+        conn = self._get_connection()
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    def migrate(self, target_version: Optional[int] = None) -> int:
+        """
+        Применение миграций схемы
+        
+        Каждая миграция выполняется в отдельной транзакции вместе с записью новой версии,
+        поэтому при ошибке схема остается в предыдущей версии.
+        
+        Args:
+            target_version: Версия, до которой применяются миграции (по умолчанию последняя)
+            
+        Returns:
+            Версия схемы после применения миграций
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        current = self.get_schema_version()
+        
+        for version, description, method in MIGRATIONS:
+            if version <= current or (target_version is not None and version > target_version):
+                continue
+            
+            try:
+                if conn.in_transaction:
+                    conn.commit()
+                cursor.execute("BEGIN")
+                getattr(self, method)(cursor)
+                cursor.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Ошибка при применении миграции {version} ({description}): {str(e)}")
+                raise
+            
+            current = version
+            logger.info(f"Применена миграция {version}: {description}")
+        
+        return current
+    
+    def _migrate_posts_unique_key(self, cursor: sqlite3.Cursor):
+        """
+        Создание уникального индекса posts (channel_id, telegram_id)
+        
+        Дубликаты постов удаляются, остается последняя запись; комментарии и снимки
+        счетчиков дубликатов переносятся на нее.
+        
+        Args:
+            cursor: Курсор открытой транзакции
+        """
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_posts_channel_telegram'"
+        )
+        if cursor.fetchone():
+            return
+        
+        cursor.execute('''
+        CREATE TEMP TABLE post_duplicates AS
+        SELECT p.id AS duplicate_id, k.keep_id
+        FROM posts p
+        JOIN (
+            SELECT channel_id, telegram_id, MAX(id) AS keep_id
+            FROM posts
+            WHERE telegram_id IS NOT NULL
+            GROUP BY channel_id, telegram_id
+            HAVING COUNT(*) > 1
+        ) k ON p.channel_id = k.channel_id AND p.telegram_id = k.telegram_id
+        WHERE p.id <> k.keep_id
+        ''')
+        
+        cursor.execute("SELECT COUNT(*) FROM post_duplicates")
+        duplicates = cursor.fetchone()[0]
+        
+        if duplicates:
+            for table in ('comments', 'post_metric_snapshots'):
+                cursor.execute(f'''
+                UPDATE OR IGNORE {table}
+                SET post_id = (SELECT keep_id FROM post_duplicates WHERE duplicate_id = {table}.post_id)
+                WHERE post_id IN (SELECT duplicate_id FROM post_duplicates)
+                ''')
+            
+            # Снимки, совпавшие по времени со снимками сохраненной записи
+            cursor.execute(
+                "DELETE FROM post_metric_snapshots WHERE post_id IN (SELECT duplicate_id FROM post_duplicates)"
+            )
+            cursor.execute("DELETE FROM posts WHERE id IN (SELECT duplicate_id FROM post_duplicates)")
+            logger.info(f"Удалено дубликатов постов: {duplicates}")
+        
+        cursor.execute("DROP TABLE post_duplicates")
+        cursor.execute("CREATE UNIQUE INDEX idx_posts_channel_telegram ON posts (channel_id, telegram_id)")
+    
+    def _migrate_comments_unique_key(self, cursor: sqlite3.Cursor):
+        """
+        Создание уникального индекса comments (post_id, telegram_id)
+        
+        Дубликаты комментариев удаляются, остается последняя запись.
+        
+        Args:
+            cursor: Курсор открытой транзакции
+        """
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_comments_post_telegram'"
+        )
+        if cursor.fetchone():
+            return
+        
+        cursor.execute('''
+        DELETE FROM comments
+        WHERE telegram_id IS NOT NULL
+        AND id NOT IN (
+            SELECT MAX(id) FROM comments
+            WHERE telegram_id IS NOT NULL
+            GROUP BY post_id, telegram_id
+        )
+        ''')
+        if cursor.rowcount:
+            logger.info(f"Удалено дубликатов комментариев: {cursor.rowcount}")
+        
+        cursor.execute("CREATE UNIQUE INDEX idx_comments_post_telegram ON comments (post_id, telegram_id)")
+    
+    def _migrate_analytical_indexes(self, cursor: sqlite3.Cursor):
+        """
+        Индексы для основных выборок
+        
+        - posts (channel_id, date): get_posts без полного просмотра и сортировки;
+        - comments (post_id, date): get_comments_for_posts по списку постов;
+        - reports (date): get_all_reports в порядке даты без сортировки;
+        - channels (telegram_id): поиск канала по Telegram ID при сохранении данных;
+        - ingestion_jobs (channel_id, status): поиск незавершенного задания.
+        
+        Args:
+            cursor: Курсор открытой транзакции
+        """
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_channel_date ON posts (channel_id, date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_post_date ON comments (post_id, date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_date ON reports (date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_channels_telegram ON channels (telegram_id)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_channel ON ingestion_jobs (channel_id, status)"
+        )
+        cursor.execute("ANALYZE")
+    
+    def _migrate_epoch_dates(self, cursor: sqlite3.Cursor):
+        """
+        Столбцы date_ts (Unix time, UTC) для постов и комментариев
+        
+        Существующие даты переводятся из текста. В прежнем формате '%Y-%m-%d %H:%m:%С'
+        вместо минут записывался месяц, а секунды не записывались, поэтому такие даты
+        сохраняются с точностью до часа. Текстовый столбец date переписывается
+        в формате '%Y-%m-%d %H:%M:%S', индексы по дате заменяются индексами по date_ts.
+        
+        Args:
+            cursor: Курсор открытой транзакции
+        """
+        for table in ('posts', 'comments'):
+            cursor.execute(f"PRAGMA table_info({table})")
+            if 'date_ts' not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN date_ts INTEGER")
+            
+            cursor.execute(f'''
+            UPDATE {table}
+            SET date_ts = COALESCE(
+                CAST(strftime('%s', trim(replace(date, ',', ''))) AS INTEGER),
+                CAST(strftime('%s', substr(trim(replace(date, ',', '')), 1, 13) || ':00:00') AS INTEGER)
+            )
+            WHERE date_ts IS NULL AND date IS NOT NULL
+            ''')
+            cursor.execute(f'''
+            UPDATE {table}
+            SET date = strftime('%Y-%m-%d %H:%M:%S', date_ts, 'unixepoch')
+            WHERE date_ts IS NOT NULL
+            ''')
+        
+        cursor.execute("DROP INDEX IF EXISTS idx_posts_channel_date")
+        cursor.execute("DROP INDEX IF EXISTS idx_comments_post_date")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_channel_date_ts ON posts (channel_id, date_ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_post_date_ts ON comments (post_id, date_ts)")
+        cursor.execute("ANALYZE")
+    
+    def _migrate_channel_rollups(self, cursor: sqlite3.Cursor):
+        """
+        Агрегаты каналов, которые поддерживаются триггерами при записи постов и комментариев
+        
+        - channel_daily_stats: посты, суммы счетчиков и комментарии канала за день (UTC);
+        - channel_hourly_stats: посты, суммы счетчиков и сумма ER постов канала
+          по дню недели и часу публикации (UTC).
+        
+        Args:
+            cursor: Курсор открытой транзакции
+        """
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS channel_daily_stats (
+            channel_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            posts INTEGER NOT NULL DEFAULT 0,
+            views INTEGER NOT NULL DEFAULT 0,
+            forwards INTEGER NOT NULL DEFAULT 0,
+            replies INTEGER NOT NULL DEFAULT 0,
+            comments INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (channel_id, day)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS channel_hourly_stats (
+            channel_id INTEGER NOT NULL,
+            weekday INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            posts INTEGER NOT NULL DEFAULT 0,
+            views INTEGER NOT NULL DEFAULT 0,
+            forwards INTEGER NOT NULL DEFAULT 0,
+            replies INTEGER NOT NULL DEFAULT 0,
+            er_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (channel_id, weekday, hour)
+        ) WITHOUT ROWID
+        ''')
+        
+        # Изменение строки учитывается вычитанием старых значений и прибавлением новых
+        counters_changed = (
+            "OLD.channel_id IS NOT NEW.channel_id OR OLD.date_ts IS NOT NEW.date_ts OR "
+            "OLD.views IS NOT NEW.views OR OLD.forwards IS NOT NEW.forwards OR OLD.replies IS NOT NEW.replies"
+        )
+        triggers = {
+            'trg_posts_rollup_insert': ("AFTER INSERT ON posts", None,
+                                        self._post_rollup_sql('NEW', 1)),
+            'trg_posts_rollup_update': ("AFTER UPDATE ON posts", counters_changed,
+                                        self._post_rollup_sql('OLD', -1) + self._post_rollup_sql('NEW', 1)),
+            'trg_posts_rollup_delete': ("AFTER DELETE ON posts", None,
+                                        self._post_rollup_sql('OLD', -1)),
+            'trg_comments_rollup_insert': ("AFTER INSERT ON comments", None,
+                                           self._comment_rollup_sql('NEW', 1)),
+            'trg_comments_rollup_update': ("AFTER UPDATE OF post_id, date_ts ON comments",
+                                           "OLD.post_id IS NOT NEW.post_id OR OLD.date_ts IS NOT NEW.date_ts",
+                                           self._comment_rollup_sql('OLD', -1) + self._comment_rollup_sql('NEW', 1)),
+            'trg_comments_rollup_delete': ("AFTER DELETE ON comments", None,
+                                           self._comment_rollup_sql('OLD', -1))
+        }
+        for name, (event, condition, body) in triggers.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(
+                f"CREATE TRIGGER {name} {event} " + (f"WHEN {condition} " if condition else "") +
+                f"BEGIN {body} END"
+            )
+        
+        self._rebuild_rollups(cursor)
+    
+    @staticmethod
+    def _post_rollup_sql(row: str, sign: int) -> str:
+        """
+        Операторы триггера, прибавляющие пост к агрегатам канала
+        
+        Args:
+            row: Строка триггера (NEW или OLD)
+            sign: 1 для добавления поста, -1 для вычитания
+        """
+        values = (
+            f"{sign}, {sign} * COALESCE({row}.views, 0), {sign} * COALESCE({row}.forwards, 0), "
+            f"{sign} * COALESCE({row}.replies, 0)"
+        )
+        er = (
+            f"{sign} * CASE WHEN {row}.views > 0 THEN "
+            f"(COALESCE({row}.forwards, 0) + COALESCE({row}.replies, 0)) * 100.0 / {row}.views ELSE 0 END"
+        )
+        counters = "posts = posts + excluded.posts, views = views + excluded.views, " \
+                   "forwards = forwards + excluded.forwards, replies = replies + excluded.replies"
+        
+        # 1970-01-01 - четверг, поэтому день недели от понедельника равен (день + 3) % 7
+        return f'''
+        INSERT INTO channel_daily_stats (channel_id, day, posts, views, forwards, replies)
+        SELECT {row}.channel_id, {row}.date_ts / 86400, {values}
+        WHERE {row}.date_ts IS NOT NULL
+        ON CONFLICT (channel_id, day) DO UPDATE SET {counters};
+        INSERT INTO channel_hourly_stats (channel_id, weekday, hour, posts, views, forwards, replies, er_sum)
+        SELECT {row}.channel_id, ({row}.date_ts / 86400 + 3) % 7, {row}.date_ts % 86400 / 3600, {values}, {er}
+        WHERE {row}.date_ts IS NOT NULL
+        ON CONFLICT (channel_id, weekday, hour) DO UPDATE SET {counters}, er_sum = er_sum + excluded.er_sum;
+        '''
+    
+    @staticmethod
+    def _comment_rollup_sql(row: str, sign: int) -> str:
+        """
+        Оператор триггера, прибавляющий комментарий к дневному агрегату канала поста
+        
+        Args:
+            row: Строка триггера (NEW или OLD)
+            sign: 1 для добавления комментария, -1 для вычитания
+        """
+        return f'''
+        INSERT INTO channel_daily_stats (channel_id, day, comments)
+        SELECT p.channel_id, {row}.date_ts / 86400, {sign}
+        FROM posts p
+        WHERE p.id = {row}.post_id AND {row}.date_ts IS NOT NULL
+        ON CONFLICT (channel_id, day) DO UPDATE SET comments = comments + excluded.comments;
+        '''
+    
+    def _rebuild_rollups(self, cursor: sqlite3.Cursor, channel_id: Optional[int] = None):
+        """
+        Пересчет агрегатов каналов по сохраненным постам и комментариям
+        
+        Args:
+            cursor: Курсор открытой транзакции
+            channel_id: ID канала в базе данных (по умолчанию все каналы)
+        """
+        where = "WHERE channel_id = ?" if channel_id is not None else ""
+        params = (channel_id,) if channel_id is not None else ()
+        
+        cursor.execute(f"DELETE FROM channel_daily_stats {where}", params)
+        cursor.execute(f"DELETE FROM channel_hourly_stats {where}", params)
+        
+        post_filter = "AND channel_id = ?" if channel_id is not None else ""
+        cursor.execute(f'''
+        INSERT INTO channel_daily_stats (channel_id, day, posts, views, forwards, replies)
+        SELECT channel_id, date_ts / 86400, COUNT(*),
+               SUM(COALESCE(views, 0)), SUM(COALESCE(forwards, 0)), SUM(COALESCE(replies, 0))
+        FROM posts
+        WHERE date_ts IS NOT NULL {post_filter}
+        GROUP BY channel_id, date_ts / 86400
+        ''', params)
+        cursor.execute(f'''
+        INSERT INTO channel_hourly_stats (channel_id, weekday, hour, posts, views, forwards, replies, er_sum)
+        SELECT channel_id, (date_ts / 86400 + 3) % 7, date_ts % 86400 / 3600, COUNT(*),
+               SUM(COALESCE(views, 0)), SUM(COALESCE(forwards, 0)), SUM(COALESCE(replies, 0)),
+               SUM(CASE WHEN views > 0 THEN (COALESCE(forwards, 0) + COALESCE(replies, 0)) * 100.0 / views ELSE 0 END)
+        FROM posts
+        WHERE date_ts IS NOT NULL {post_filter}
+        GROUP BY channel_id, (date_ts / 86400 + 3) % 7, date_ts % 86400 / 3600
+        ''', params)
+        cursor.execute(f'''
+        INSERT INTO channel_daily_stats (channel_id, day, comments)
+        SELECT p.channel_id, c.date_ts / 86400, COUNT(*)
+        FROM comments c
+        JOIN posts p ON p.id = c.post_id
+        WHERE c.date_ts IS NOT NULL {post_filter.replace('channel_id', 'p.channel_id')}
+        GROUP BY p.channel_id, c.date_ts / 86400
+        ON CONFLICT (channel_id, day) DO UPDATE SET comments = excluded.comments
+        ''', params)
+    
+    def rebuild_rollups(self, channel_id: Optional[int] = None):
+        """
+        Пересчет агрегатов каналов (например, после изменения данных в обход триггеров)
+        
+        Args:
+            channel_id: ID канала в базе данных (по умолчанию все каналы)
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            self._rebuild_rollups(cursor, channel_id)
+            conn.commit()
+            
+        except Exception as e:
+            logger.error(f"Ошибка при пересчете агрегатов каналов: {str(e)}")
+            raise
+    
+    def _migrate_full_text_search(self, cursor: sqlite3.Cursor):
+        """
+        Таблицы FTS5 posts_fts и comments_fts с внешним содержимым (тексты хранятся
+        только в posts и comments), синхронизируемые триггерами
+        
+        Токенизатор unicode61 приводит к нижнему регистру кириллицу и латиницу и убирает
+        диакритику латинских букв, porter приводит английские слова к основе.
+        
+        Args:
+            cursor: Курсор открытой транзакции
+        """
+        for table in ('posts', 'comments'):
+            cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+                text,
+                content='{table}',
+                content_rowid='id',
+                tokenize='porter unicode61 remove_diacritics 2'
+            )
+            ''')
+            
+            triggers = {
+                f'trg_{table}_fts_insert': (
+                    f"AFTER INSERT ON {table}",
+                    f"INSERT INTO {table}_fts (rowid, text) VALUES (NEW.id, NEW.text);"
+                ),
+                f'trg_{table}_fts_update': (
+                    f"AFTER UPDATE OF text ON {table} WHEN OLD.text IS NOT NEW.text",
+                    f"INSERT INTO {table}_fts ({table}_fts, rowid, text) VALUES ('delete', OLD.id, OLD.text); "
+                    f"INSERT INTO {table}_fts (rowid, text) VALUES (NEW.id, NEW.text);"
+                ),
+                f'trg_{table}_fts_delete': (
+                    f"AFTER DELETE ON {table}",
+                    f"INSERT INTO {table}_fts ({table}_fts, rowid, text) VALUES ('delete', OLD.id, OLD.text);"
+                )
+            }
+            for name, (event, body) in triggers.items():
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(f"CREATE TRIGGER {name} {event} BEGIN {body} END")
+            
+            # Индексирование уже сохраненных текстов
+            cursor.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+    
+    def _migrate_post_sort_indexes(self, cursor: sqlite3.Cursor):
+        """
+        Вычисляемый столбец er и индексы для сортировки списка постов
+        
+        er - виртуальный столбец: значение не хранится в строке поста, а вычисляется
+        из счетчиков и записывается только в индекс. Индексы (channel_id, views)
+        и (channel_id, er) вместе с idx_posts_channel_date_ts позволяют читать страницы
+        списка постов в порядке даты, просмотров или ER без сортировки всех постов канала.
+        
+        Args:
+            cursor: Курсор открытой транзакции
+        """
+        # table_info не показывает вычисляемые столбцы
+        cursor.execute("PRAGMA table_xinfo(posts)")
+        if 'er' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE posts ADD COLUMN er REAL GENERATED ALWAYS AS ({POST_ER_SQL}) VIRTUAL")
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_channel_views ON posts (channel_id, views)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_channel_er ON posts (channel_id, er)")
+        cursor.execute("ANALYZE")
+    
+    def _migrate_report_bodies(self, cursor: sqlite3.Cursor):
+        """
+        Перенос промптов и ответов отчетов в таблицу report_bodies в сжатом виде
+        
+        В таблице reports остаются только метаданные, поэтому список отчетов не читает
+        тексты. Существующие тексты сжимаются кодеком report_codec, столбцы prompt
+        и response удаляются из reports.
+        
+        Args:
+            cursor: Курсор открытой транзакции
+        """
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_bodies (
+            report_id INTEGER PRIMARY KEY,
+            codec TEXT NOT NULL,
+            prompt BLOB,
+            response BLOB,
+            FOREIGN KEY (report_id) REFERENCES reports (id)
+        )
+        ''')
+        
+        cursor.execute("PRAGMA table_info(reports)")
+        if 'prompt' not in [row[1] for row in cursor.fetchall()]:
+            return
+        
+        # Отчеты читаются вторым курсором и сжимаются по одному
+        reader = cursor.connection.cursor()
+        reader.execute("SELECT id, prompt, response FROM reports")
+        cursor.executemany(
+            "INSERT OR REPLACE INTO report_bodies (report_id, codec, prompt, response) VALUES (?, ?, ?, ?)",
+            ((
+                row[0],
+                self.report_codec,
+                compress_text(row[1], self.report_codec),
+                compress_text(row[2], self.report_codec)
+            ) for row in reader)
+        )
+        
+        cursor.execute("ALTER TABLE reports DROP COLUMN prompt")
+        cursor.execute("ALTER TABLE reports DROP COLUMN response")
+    
     def _add_default_templates(self):
         """Добавление стандартных шаблонов промптов, если их нет в БД"""
         conn = self._get_connection()
@@ -315,13 +1086,14 @@ class Database:
             logger.error(f"Ошибка при сохранении информации о канале: {str(e)}")
             raise
     
-    def save_posts(self, posts: List[Dict[str, Any]], channel_id: int):
+    def save_posts(self, posts: List[Dict[str, Any]], channel_id: int, save_snapshots: bool = True):
         """
         Сохранение постов в базу данных
         
         Args:
             posts: Список постов
             channel_id: ID канала в базе данных
+            save_snapshots: Записать снимок текущих счетчиков постов
         """
         if not posts:
             return
@@ -330,179 +1102,362 @@ class Database:
             conn = self._get_connection()
             cursor = conn.cursor()
             
-            for post in posts:
-                # Проверка существования поста
-                cursor.execute(
-                    "SELECT id FROM posts WHERE telegram_id = ? AND channel_id = ?",
-                    (post.get('id'), channel_id)
-                )
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Обновление существующего поста
-                    cursor.execute('''
-                    UPDATE posts 
-                    SET date = ?, text = ?, views = ?, forwards = ?, replies = ?,
-                        has_media = ?, media_type = ?, is_pinned = ?
-                    WHERE telegram_id = ? AND channel_id = ?
-                    ''', (
-                        post.get('date'),
-                        post.get('text'),
-                        post.get('views'),
-                        post.get('forwards'),
-                        post.get('replies'),
-                        post.get('has_media', False),
-                        post.get('media_type'),
-                        post.get('is_pinned', False),
-                        post.get('id'),
-                        channel_id
-                    ))
-                else:
-                    # Добавление нового поста
-                    cursor.execute('''
-                    INSERT INTO posts
-                    (telegram_id, channel_id, date, text, views, forwards, replies, has_media, media_type, is_pinned)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        post.get('id'),
-                        channel_id,
-                        post.get('date'),
-                        post.get('text'),
-                        post.get('views'),
-                        post.get('forwards'),
-                        post.get('replies'),
-                        post.get('has_media', False),
-                        post.get('media_type'),
-                        post.get('is_pinned', False)
-                    ))
-            
+            # Один upsert на пакет вместо SELECT и UPDATE/INSERT для каждого поста
+            cursor.executemany('''
+            INSERT INTO posts
+            (telegram_id, channel_id, date, date_ts, text, views, forwards, replies, has_media, media_type, is_pinned)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (channel_id, telegram_id) DO UPDATE SET
+                date = excluded.date,
+                date_ts = excluded.date_ts,
+                text = excluded.text,
+                views = excluded.views,
+                forwards = excluded.forwards,
+                replies = excluded.replies,
+                has_media = excluded.has_media,
+                media_type = excluded.media_type,
+                is_pinned = excluded.is_pinned
+            ''', [(
+                post.get('id'),
+                channel_id,
+                post.get('date'),
+                to_epoch(post.get('date_ts', post.get('date'))),
+                post.get('text'),
+                post.get('views'),
+                post.get('forwards'),
+                post.get('replies'),
+                post.get('has_media', False),
+                post.get('media_type'),
+                post.get('is_pinned', False)
+            ) for post in posts])
+            
+            if save_snapshots:
+                self._save_metric_snapshots(cursor, channel_id, posts)
             conn.commit()
             
         except Exception as e:
             logger.error(f"Ошибка при сохранении постов: {str(e)}")
             raise
     
-    def save_comments(self, comments: List[Dict[str, Any]]):
+    def update_post_metrics(self, channel_id: int, metrics: List[Dict[str, Any]]):
         """
-        Сохранение комментариев в базу данных
+        Обновление только счетчиков постов (просмотры, репосты, ответы)
         
         Args:
-            comments: Список комментариев
+            channel_id: ID канала в базе данных
+            metrics: Список словарей с полями id (Telegram ID поста), views, forwards, replies
         """
-        if not comments:
+        if not metrics:
             return
             
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
             
-            for comment in comments:
-                # Получение внутреннего ID поста
-                cursor.execute(
-                    "SELECT id FROM posts WHERE telegram_id = ? AND channel_id = (SELECT id FROM channels WHERE telegram_id = ?)",
-                    (comment.get('post_id'), comment.get('channel_id'))
-                )
-                post = cursor.fetchone()
-                
-                if not post:
-                    # Пропускаем комментарии к несуществующим постам
-                    continue
-                
-                post_id = post['id']
-                
-                # Проверка существования комментария
-                cursor.execute(
-                    "SELECT id FROM comments WHERE telegram_id = ? AND post_id = ?",
-                    (comment.get('id'), post_id)
-                )
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Обновление существующего комментария
-                    cursor.execute('''
-                    UPDATE comments 
-                    SET user_id = ?, date = ?, text = ?, likes = ?, is_reply = ?
-                    WHERE telegram_id = ? AND post_id = ?
-                    ''', (
-                        comment.get('user_id'),
-                        comment.get('date'),
-                        comment.get('text'),
-                        comment.get('likes', 0),
-                        comment.get('is_reply', False),
-                        comment.get('id'),
-                        post_id
-                    ))
-                else:
-                    # Добавление нового комментария
-                    cursor.execute('''
-                    INSERT INTO comments
-                    (telegram_id, post_id, channel_id, user_id, date, text, likes, is_reply)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        comment.get('id'),
-                        post_id,
-                        comment.get('channel_id'),
-                        comment.get('user_id'),
-                        comment.get('date'),
-                        comment.get('text'),
-                        comment.get('likes', 0),
-                        comment.get('is_reply', False)
-                    ))
+            cursor.executemany('''
+            UPDATE posts
+            SET views = ?, forwards = ?, replies = ?
+            WHERE channel_id = ? AND telegram_id = ?
+            ''', [
+                (item.get('views'), item.get('forwards'), item.get('replies'), channel_id, item.get('id'))
+                for item in metrics
+            ])
             
+            self._save_metric_snapshots(cursor, channel_id, metrics)
             conn.commit()
             
         except Exception as e:
-            logger.error(f"Ошибка при сохранении комментариев: {str(e)}")
+            logger.error(f"Ошибка при обновлении счетчиков постов: {str(e)}")
             raise
     
-    def save_report(self, channel_id: int, file_path: str, prompt: Dict[str, Any], 
-                  response: str) -> int:
+    def _save_metric_snapshots(self, cursor: sqlite3.Cursor, channel_id: int, metrics: List[Dict[str, Any]]):
         """
-        Сохранение отчета в базу данных
+        Запись снимков счетчиков в рамках текущей транзакции
         
         Args:
-            channel_id: ID канала
-            file_path: Путь к файлу отчета
-            prompt: Промпт, использованный для генерации отчета
-            response: Ответ LLM
-            
-        Returns:
-            ID созданного отчета
+            cursor: Курсор открытой транзакции
+            channel_id: ID канала в базе данных
+            metrics: Список словарей с полями id (Telegram ID поста), views, forwards, replies
+                и необязательным captured_at (по умолчанию текущее время)
+        """
+        captured_at = int(time.time())
+        cursor.executemany('''
+        INSERT OR REPLACE INTO post_metric_snapshots (post_id, captured_at, views, forwards, replies)
+        SELECT id, ?, ?, ?, ? FROM posts WHERE channel_id = ? AND telegram_id = ?
+        ''', [
+            (item.get('captured_at') or captured_at, item.get('views'), item.get('forwards'),
+             item.get('replies'), channel_id, item.get('id'))
+            for item in metrics
+        ])
+    
+    def save_metric_snapshots(self, channel_id: int, snapshots: List[Dict[str, Any]]):
+        """
+        Сохранение ранее снятых снимков счетчиков постов (например, при импорте)
+        
+        Args:
+            channel_id: ID канала в базе данных
+            snapshots: Список словарей с полями id (Telegram ID поста), captured_at (Unix time),
+                views, forwards, replies
         """
+        if not snapshots:
+            return
+            
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
             
-            # Сериализация промпта в JSON
-            prompt_json = json.dumps(prompt, ensure_ascii=False)
-            
-            # Сохранение отчета
-            cursor.execute('''
-            INSERT INTO reports (channel_id, file_path, prompt, response)
-            VALUES (?, ?, ?, ?)
-            ''', (
-                channel_id,
-                file_path,
-                prompt_json,
-                response
-            ))
-            
+            self._save_metric_snapshots(cursor, channel_id, snapshots)
             conn.commit()
-            return cursor.lastrowid
             
         except Exception as e:
-            logger.error(f"Ошибка при сохранении отчета: {str(e)}")
+            logger.error(f"Ошибка при сохранении снимков счетчиков: {str(e)}")
             raise
     
-    def get_channel_info(self, channel_id: int) -> Dict[str, Any]:
+    def compact_snapshots(self, channel_id: Optional[int] = None, raw_days: Optional[int] = None,
+                          hourly_days: Optional[int] = None) -> int:
         """
-        Получение информации о канале
+        Прореживание старых снимков счетчиков
+        
+        Снимки моложе raw_days хранятся полностью, до hourly_days остается последний
+        снимок каждого часа, более старые сокращаются до последнего снимка за день.
         
         Args:
-            channel_id: ID канала в базе данных
+            channel_id: ID канала в базе данных (по умолчанию все каналы)
+            raw_days: Срок хранения всех снимков в днях (SNAPSHOT_RAW_DAYS, по умолчанию 7)
+            hourly_days: Срок хранения почасовых снимков в днях (SNAPSHOT_HOURLY_DAYS, по умолчанию 30)
             
         Returns:
-            Словарь с информацией о канале
+            Количество удаленных снимков
+        """
+        raw_days = raw_days if raw_days is not None else int(os.getenv('SNAPSHOT_RAW_DAYS', 7))
+        hourly_days = hourly_days if hourly_days is not None else int(os.getenv('SNAPSHOT_HOURLY_DAYS', 30))
+        now = int(time.time())
+        
+        channel_filter = "AND post_id IN (SELECT id FROM posts WHERE channel_id = ?)" if channel_id else ""
+        channel_params = (channel_id,) if channel_id else ()
+        
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            deleted = 0
+            
+            # Сначала дневные интервалы для самых старых снимков, затем часовые
+            for max_age_days, bucket in ((hourly_days, 86400), (raw_days, 3600)):
+                cutoff = now - max_age_days * 86400
+                cursor.execute(f'''
+                DELETE FROM post_metric_snapshots
+                WHERE captured_at < ? {channel_filter}
+                AND (post_id, captured_at) NOT IN (
+                    SELECT post_id, MAX(captured_at) FROM post_metric_snapshots
+                    WHERE captured_at < ? {channel_filter}
+                    GROUP BY post_id, captured_at / ?
+                )
+                ''', (cutoff, *channel_params, cutoff, *channel_params, bucket))
+                deleted += cursor.rowcount
+            
+            conn.commit()
+            
+            if deleted:
+                logger.info(f"Прорежено снимков счетчиков: {deleted}")
+            return deleted
+            
+        except Exception as e:
+            logger.error(f"Ошибка при прореживании снимков счетчиков: {str(e)}")
+            raise
+    
+    def save_comments(self, comments: List[Dict[str, Any]]):
+        """
+        Сохранение комментариев в базу данных
+        
+        Args:
+            comments: Список комментариев
+        """
+        if not comments:
+            return
+            
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            # Комментарии загружаются во временную таблицу, ID постов определяются одним соединением
+            cursor.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS comment_staging (
+                telegram_id INTEGER,
+                post_telegram_id INTEGER,
+                channel_telegram_id INTEGER,
+                user_id INTEGER,
+                date TEXT,
+                date_ts INTEGER,
+                text TEXT,
+                likes INTEGER,
+                is_reply BOOLEAN
+            )
+            ''')
+            cursor.execute("DELETE FROM comment_staging")
+            cursor.executemany(
+                "INSERT INTO comment_staging VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(
+                    comment.get('id'),
+                    comment.get('post_id'),
+                    comment.get('channel_id'),
+                    comment.get('user_id'),
+                    comment.get('date'),
+                    to_epoch(comment.get('date_ts', comment.get('date'))),
+                    comment.get('text'),
+                    comment.get('likes', 0),
+                    comment.get('is_reply', False)
+                ) for comment in comments]
+            )
+            
+            # Комментарии к несуществующим постам отбрасываются соединением.
+            # WHERE true нужен SQLite для разбора ON CONFLICT после SELECT с JOIN
+            cursor.execute('''
+            INSERT INTO comments
+            (telegram_id, post_id, channel_id, user_id, date, date_ts, text, likes, is_reply)
+            SELECT s.telegram_id, p.id, s.channel_telegram_id, s.user_id, s.date, s.date_ts, s.text, s.likes, s.is_reply
+            FROM comment_staging s
+            JOIN channels c ON c.telegram_id = s.channel_telegram_id
+            JOIN posts p ON p.channel_id = c.id AND p.telegram_id = s.post_telegram_id
+            WHERE true
+            ON CONFLICT (post_id, telegram_id) DO UPDATE SET
+                user_id = excluded.user_id,
+                date = excluded.date,
+                date_ts = excluded.date_ts,
+                text = excluded.text,
+                likes = excluded.likes,
+                is_reply = excluded.is_reply
+            ''')
+            cursor.execute("DELETE FROM comment_staging")
+            
+            conn.commit()
+            
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении комментариев: {str(e)}")
+            raise
+    
+    def get_comment_stats(self, channel_id: int, post_telegram_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """
+        Статистика сохраненных комментариев по постам канала
+        
+        Args:
+            channel_id: ID канала в базе данных
+            post_telegram_ids: Telegram ID постов
+            
+        Returns:
+            Словарь {telegram_id поста: {'count': количество комментариев,
+            'max_comment_id': наибольший Telegram ID комментария}} для постов,
+            у которых есть сохраненные комментарии
+        """
+        if not post_telegram_ids:
+            return {}
+            
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            # Формирование списка плейсхолдеров для SQL запроса
+            placeholders = ', '.join(['?'] * len(post_telegram_ids))
+            
+            cursor.execute(f'''
+            SELECT p.telegram_id AS post_telegram_id,
+                   COUNT(c.id) AS count,
+                   MAX(c.telegram_id) AS max_comment_id
+            FROM posts p
+            JOIN comments c ON c.post_id = p.id
+            WHERE p.channel_id = ? AND p.telegram_id IN ({placeholders})
+            GROUP BY p.telegram_id
+            ''', [channel_id] + list(post_telegram_ids))
+            
+            return {
+                row['post_telegram_id']: {
+                    'count': row['count'],
+                    'max_comment_id': row['max_comment_id']
+                }
+                for row in cursor.fetchall()
+            }
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении статистики комментариев: {str(e)}")
+            return {}
+    
+    @staticmethod
+    def _report_codec(codec: str) -> str:
+        """
+        Кодек сжатия текстов отчетов (REPORT_COMPRESSION)
+        
+        Args:
+            codec: 'zlib' или 'zstd'
+            
+        Returns:
+            'zstd', если он запрошен и библиотека zstandard установлена, иначе 'zlib'
+        """
+        if codec != 'zstd':
+            return 'zlib'
+        
+        try:
+            import zstandard
+            return 'zstd'
+        except ImportError:
+            logger.warning("Библиотека zstandard не установлена, отчеты сжимаются zlib")
+            return 'zlib'
+    
+    def save_report(self, channel_id: int, file_path: str, prompt: Dict[str, Any], 
+                  response: str) -> int:
+        """
+        Сохранение отчета в базу данных
+        
+        Метаданные отчета записываются в reports, промпт и ответ - в report_bodies
+        в сжатом виде.
+        
+        Args:
+            channel_id: ID канала
+            file_path: Путь к файлу отчета
+            prompt: Промпт, использованный для генерации отчета
+            response: Ответ LLM
+            
+        Returns:
+            ID созданного отчета
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            # Сериализация промпта в JSON
+            prompt_json = json.dumps(prompt, ensure_ascii=False)
+            
+            # Сохранение отчета
+            cursor.execute(
+                "INSERT INTO reports (channel_id, file_path) VALUES (?, ?)",
+                (channel_id, file_path)
+            )
+            report_id = cursor.lastrowid
+            
+            cursor.execute('''
+            INSERT INTO report_bodies (report_id, codec, prompt, response)
+            VALUES (?, ?, ?, ?)
+            ''', (
+                report_id,
+                self.report_codec,
+                compress_text(prompt_json, self.report_codec),
+                compress_text(response, self.report_codec)
+            ))
+            
+            conn.commit()
+            return report_id
+            
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении отчета: {str(e)}")
+            raise
+    
+    def get_channel_info(self, channel_id: int) -> Dict[str, Any]:
+        """
+        Получение информации о канале
+        
+        Args:
+            channel_id: ID канала в базе данных
+            
+        Returns:
+            Словарь с информацией о канале
         """
         try:
             conn = self._get_connection()
@@ -525,24 +1480,382 @@ class Database:
             logger.error(f"Ошибка при получении информации о канале: {str(e)}")
             return {}
     
-    def get_posts(self, channel_id: int) -> List[Dict[str, Any]]:
+    def _parse_channel_identifier(self, channel_identifier) -> Tuple[Optional[int], Optional[str]]:
         """
-        Получение всех постов канала
+        Разбор идентификатора канала
+        
+        Args:
+            channel_identifier: Username канала (с @ или без) или его ID
+            
+        Returns:
+            Кортеж (telegram_id, username): заполнен один из элементов,
+            username приводится к нижнему регистру
+        """
+        identifier = str(channel_identifier).strip()
+        
+        if identifier.lstrip('-').isdigit():
+            # Числовой ID может быть передан в формате -100XXXXXXXXXX
+            if identifier.startswith('-100'):
+                return int(identifier[4:]), None
+            return int(identifier.lstrip('-')), None
+        
+        return None, identifier.lstrip('@').lower()
+    
+    def find_channel_id(self, channel_identifier: str) -> Optional[int]:
+        """
+        Поиск канала в базе данных по username или Telegram ID
+        
+        Args:
+            channel_identifier: Username канала (с @ или без) или его ID
+            
+        Returns:
+            ID канала в базе данных или None, если канал еще не сохранялся
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            telegram_id, username = self._parse_channel_identifier(channel_identifier)
+            
+            if telegram_id is not None:
+                cursor.execute(
+                    "SELECT id FROM channels WHERE telegram_id = ?",
+                    (telegram_id,)
+                )
+            else:
+                cursor.execute(
+                    "SELECT id FROM channels WHERE lower(username) = ?",
+                    (username,)
+                )
+            
+            channel = cursor.fetchone()
+            return channel['id'] if channel else None
+            
+        except Exception as e:
+            logger.error(f"Ошибка при поиске канала: {str(e)}")
+            return None
+    
+    def get_cached_entity(self, channel_identifier, max_age: int) -> Dict[str, Any]:
+        """
+        Получение сущности канала из кэша
+        
+        Args:
+            channel_identifier: Username канала (с @ или без) или его ID
+            max_age: Максимальный возраст записи в секундах
+            
+        Returns:
+            Словарь с telegram_id, access_hash и username или пустой словарь
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            telegram_id, username = self._parse_channel_identifier(channel_identifier)
+            cache_key = f"id:{telegram_id}" if telegram_id is not None else f"username:{username}"
+            
+            cursor.execute(
+                "SELECT telegram_id, access_hash, username FROM entity_cache WHERE cache_key = ? AND updated_at >= ?",
+                (cache_key, int(time.time()) - max_age)
+            )
+            
+            entity = cursor.fetchone()
+            return dict(entity) if entity else {}
+            
+        except Exception as e:
+            logger.error(f"Ошибка при чтении кэша сущностей: {str(e)}")
+            return {}
+    
+    def save_cached_entity(self, telegram_id: int, access_hash: int, username: Optional[str] = None):
+        """
+        Сохранение сущности канала в кэш по ID и по username
+        
+        Args:
+            telegram_id: Telegram ID канала
+            access_hash: Access hash канала
+            username: Username канала
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cache_keys = [f"id:{telegram_id}"]
+            if username:
+                cache_keys.append(f"username:{username.lower()}")
+            
+            now = int(time.time())
+            cursor.executemany(
+                "INSERT OR REPLACE INTO entity_cache (cache_key, telegram_id, access_hash, username, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(cache_key, telegram_id, access_hash, username, now) for cache_key in cache_keys]
+            )
+            
+            conn.commit()
+            
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении кэша сущностей: {str(e)}")
+    
+    def invalidate_cached_entity(self, channel_identifier):
+        """
+        Удаление сущности канала из кэша
+        
+        Args:
+            channel_identifier: Username канала (с @ или без) или его ID
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            telegram_id, username = self._parse_channel_identifier(channel_identifier)
+            if telegram_id is not None:
+                cursor.execute("DELETE FROM entity_cache WHERE telegram_id = ?", (telegram_id,))
+            else:
+                cursor.execute(
+                    "DELETE FROM entity_cache WHERE telegram_id IN (SELECT telegram_id FROM entity_cache WHERE cache_key = ?)",
+                    (f"username:{username}",)
+                )
+            
+            conn.commit()
+            
+        except Exception as e:
+            logger.error(f"Ошибка при очистке кэша сущностей: {str(e)}")
+    
+    def get_sync_state(self, channel_id: int) -> Dict[str, Any]:
+        """
+        Получение состояния синхронизации канала
+        
+        Args:
+            channel_id: ID канала в базе данных
+            
+        Returns:
+            Словарь с last_message_id и last_sync_date или пустой словарь
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "SELECT * FROM channel_sync_state WHERE channel_id = ?",
+                (channel_id,)
+            )
+            
+            state = cursor.fetchone()
+            return dict(state) if state else {}
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении состояния синхронизации: {str(e)}")
+            return {}
+    
+    def update_sync_state(self, channel_id: int, last_message_id: int):
+        """
+        Обновление курсора синхронизации канала
+        
+        Курсор никогда не сдвигается назад: сохраняется максимальный из известных ID.
+        
+        Args:
+            channel_id: ID канала в базе данных
+            last_message_id: ID последнего сохраненного поста
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            INSERT INTO channel_sync_state (channel_id, last_message_id, last_sync_date)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(channel_id) DO UPDATE SET
+                last_message_id = MAX(COALESCE(last_message_id, 0), excluded.last_message_id),
+                last_sync_date = excluded.last_sync_date
+            ''', (channel_id, last_message_id))
+            
+            conn.commit()
+            
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении состояния синхронизации: {str(e)}")
+            raise
+    
+    def create_ingestion_job(self, channel_id: int, params: Dict[str, Any],
+                             last_message_id: Optional[int] = None) -> int:
+        """
+        Создание задания загрузки канала
+        
+        Незавершенные задания того же канала отменяются.
         
         Args:
             channel_id: ID канала в базе данных
+            params: Параметры загрузки (days, full_sync, rescan_hours)
+            last_message_id: Начальный курсор задания
             
         Returns:
-            Список постов
+            ID задания
         """
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
             
             cursor.execute(
-                "SELECT * FROM posts WHERE channel_id = ? ORDER BY date DESC",
+                "UPDATE ingestion_jobs SET status = 'cancelled', updated_date = CURRENT_TIMESTAMP "
+                "WHERE channel_id = ? AND status IN ('running', 'failed')",
                 (channel_id,)
             )
+            cursor.execute(
+                "INSERT INTO ingestion_jobs (channel_id, params, last_message_id) VALUES (?, ?, ?)",
+                (channel_id, json.dumps(params), last_message_id)
+            )
+            
+            conn.commit()
+            return cursor.lastrowid
+            
+        except Exception as e:
+            logger.error(f"Ошибка при создании задания загрузки: {str(e)}")
+            raise
+    
+    def get_unfinished_job(self, channel_id: int) -> Dict[str, Any]:
+        """
+        Получение последнего незавершенного задания загрузки канала
+        
+        Задание считается незавершенным, если оно завершилось ошибкой или было
+        прервано вместе с процессом (статус running).
+        
+        Args:
+            channel_id: ID канала в базе данных
+            
+        Returns:
+            Словарь с контрольной точкой задания или пустой словарь
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "SELECT * FROM ingestion_jobs WHERE channel_id = ? AND status IN ('running', 'failed') "
+                "ORDER BY id DESC LIMIT 1",
+                (channel_id,)
+            )
+            
+            job = cursor.fetchone()
+            if not job:
+                return {}
+            
+            job = dict(job)
+            job['params'] = json.loads(job['params']) if job['params'] else {}
+            return job
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении задания загрузки: {str(e)}")
+            return {}
+    
+    def save_job_checkpoint(self, job_id: int, phase: str, last_message_id: Optional[int],
+                            batch_first_id: Optional[int] = None, batch_last_id: Optional[int] = None,
+                            posts_count: int = 0, comments_count: int = 0):
+        """
+        Сохранение контрольной точки задания загрузки
+        
+        Args:
+            job_id: ID задания
+            phase: Этап обработки текущего пакета ('posts' или 'comments')
+            last_message_id: ID последнего полностью обработанного поста
+            batch_first_id: Первый ID пакета, ожидающего загрузки комментариев
+            batch_last_id: Последний ID пакета, ожидающего загрузки комментариев
+            posts_count: Общее количество сохраненных постов
+            comments_count: Общее количество сохраненных комментариев
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            UPDATE ingestion_jobs
+            SET phase = ?, last_message_id = ?, batch_first_id = ?, batch_last_id = ?,
+                posts_count = ?, comments_count = ?, status = 'running', updated_date = CURRENT_TIMESTAMP
+            WHERE id = ?
+            ''', (phase, last_message_id, batch_first_id, batch_last_id, posts_count, comments_count, job_id))
+            
+            conn.commit()
+            
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении контрольной точки: {str(e)}")
+            raise
+    
+    def finish_ingestion_job(self, job_id: int, status: str, error: Optional[str] = None):
+        """
+        Завершение задания загрузки
+        
+        Args:
+            job_id: ID задания
+            status: Итоговый статус ('completed' или 'failed')
+            error: Текст ошибки
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "UPDATE ingestion_jobs SET status = ?, error = ?, updated_date = CURRENT_TIMESTAMP WHERE id = ?",
+                (status, error, job_id)
+            )
+            
+            conn.commit()
+            
+        except Exception as e:
+            logger.error(f"Ошибка при завершении задания загрузки: {str(e)}")
+            raise
+    
+    def get_posts_for_comments(self, channel_id: int, first_id: int, last_id: int) -> List[Dict[str, Any]]:
+        """
+        Получение сохраненных постов диапазона в формате для загрузки комментариев
+        
+        Args:
+            channel_id: ID канала в базе данных
+            first_id: Первый Telegram ID диапазона
+            last_id: Последний Telegram ID диапазона
+            
+        Returns:
+            Список словарей с полями id и channel_id (Telegram ID) и replies
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT p.telegram_id AS id, c.telegram_id AS channel_id, p.replies
+            FROM posts p
+            JOIN channels c ON c.id = p.channel_id
+            WHERE p.channel_id = ? AND p.telegram_id BETWEEN ? AND ?
+            ORDER BY p.telegram_id
+            ''', (channel_id, first_id, last_id))
+            
+            return [dict(row) for row in cursor.fetchall()]
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении постов для загрузки комментариев: {str(e)}")
+            return []
+    
+    def get_posts(self, channel_id: int, since: Optional[int] = None,
+                  until: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Получение постов канала
+        
+        Args:
+            channel_id: ID канала в базе данных
+            since: Начало периода в Unix time (включительно)
+            until: Конец периода в Unix time (не включительно)
+            
+        Returns:
+            Список постов, начиная с самых новых
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            query = "SELECT * FROM posts WHERE channel_id = ?"
+            params = [channel_id]
+            if since is not None:
+                query += " AND date_ts >= ?"
+                params.append(since)
+            if until is not None:
+                query += " AND date_ts < ?"
+                params.append(until)
+            
+            cursor.execute(query + " ORDER BY date_ts DESC", params)
             
             posts = cursor.fetchall()
             
@@ -553,6 +1866,376 @@ class Database:
             logger.error(f"Ошибка при получении постов: {str(e)}")
             return []
     
+    def get_posts_page(self, channel_id: int, sort: str = 'date', descending: bool = True,
+                       after: Optional[Tuple[Any, int]] = None, limit: int = 50,
+                       preview_length: int = 200) -> Dict[str, Any]:
+        """
+        Страница списка постов канала с пагинацией по ключу (значение сортировки, ID)
+        
+        Страница читается из индекса (channel_id, столбец сортировки), начиная с ключа
+        последнего поста предыдущей страницы, поэтому время выборки не зависит от номера
+        страницы, а новые посты не сдвигают уже показанные. Посты без значения сортировки
+        (NULL) идут последними при убывании и первыми при возрастании, как в ORDER BY.
+        
+        Args:
+            channel_id: ID канала в базе данных
+            sort: Поле сортировки: 'date', 'views' или 'er'
+            descending: Сортировка по убыванию
+            after: Ключ последнего поста предыдущей страницы (decode_cursor)
+            limit: Количество постов на странице
+            preview_length: Количество первых символов текста поста
+            
+        Returns:
+            Словарь со списком posts (text - начало текста, text_truncated - текст длиннее
+            preview_length) и курсором следующей страницы next_cursor (None для последней)
+        """
+        column = POST_SORT_COLUMNS.get(sort)
+        if not column:
+            return {'posts': [], 'next_cursor': None}
+        
+        direction = 'DESC' if descending else 'ASC'
+        op = '<' if descending else '>'
+        
+        # Условия продолжения после ключа: сначала часть с тем же признаком NULL, что у ключа,
+        # затем, если страница не заполнена, оставшаяся часть в порядке ORDER BY
+        if after is None:
+            conditions = [("", [])]
+        elif after[0] is None:
+            conditions = [(f"AND {column} IS NULL AND id {op} ?", [after[1]])]
+            if not descending:
+                conditions.append((f"AND {column} IS NOT NULL", []))
+        else:
+            # Диапазон по столбцу сортировки задается отдельно от OR, чтобы SQLite искал начало в индексе
+            conditions = [(f"AND {column} {op}= ? AND ({column} {op} ? OR id {op} ?)", [after[0], after[0], after[1]])]
+            if descending:
+                conditions.append((f"AND {column} IS NULL", []))
+        
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            posts = []
+            for condition, params in conditions:
+                # Один лишний пост показывает, есть ли следующая страница
+                cursor.execute(f'''
+                SELECT id, telegram_id, date, date_ts, substr(text, 1, ?) AS text, length(text) > ? AS text_truncated,
+                       views, forwards, replies, er, has_media, media_type, is_pinned
+                FROM posts
+                WHERE channel_id = ? {condition}
+                ORDER BY {column} {direction}, id {direction}
+                LIMIT ?
+                ''', [preview_length, preview_length, channel_id, *params, limit + 1 - len(posts)])
+                posts.extend(dict(row) for row in cursor.fetchall())
+                if len(posts) > limit:
+                    break
+            
+            next_cursor = None
+            if len(posts) > limit:
+                posts = posts[:limit]
+                next_cursor = encode_cursor(posts[-1][column], posts[-1]['id'])
+            
+            for post in posts:
+                post['text_truncated'] = bool(post['text_truncated'])
+            
+            return {'posts': posts, 'next_cursor': next_cursor}
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении страницы постов: {str(e)}")
+            return {'posts': [], 'next_cursor': None}
+    
+    def get_posts_count(self, channel_id: int) -> int:
+        """
+        Количество постов канала
+        
+        Args:
+            channel_id: ID канала в базе данных
+            
+        Returns:
+            Количество постов
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT COUNT(*) FROM posts WHERE channel_id = ?", (channel_id,))
+            return cursor.fetchone()[0]
+            
+        except Exception as e:
+            logger.error(f"Ошибка при подсчете постов: {str(e)}")
+            return 0
+    
+    def get_channel_rollups(self, channel_id: int, since: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Получение агрегатов канала
+        
+        Args:
+            channel_id: ID канала в базе данных
+            since: Начало периода дневных агрегатов в Unix time
+            
+        Returns:
+            Словарь со списками daily (date, posts, views, forwards, replies, comments)
+            и weekday_hour (weekday от 0 - понедельник, hour, posts, views, forwards, replies, er_sum)
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT date(day * 86400, 'unixepoch') AS date, posts, views, forwards, replies, comments
+            FROM channel_daily_stats
+            WHERE channel_id = ? AND day >= ? AND (posts > 0 OR comments > 0)
+            ORDER BY day
+            ''', (channel_id, since // 86400 if since is not None else 0))
+            daily = [dict(row) for row in cursor.fetchall()]
+            
+            cursor.execute('''
+            SELECT weekday, hour, posts, views, forwards, replies, er_sum
+            FROM channel_hourly_stats
+            WHERE channel_id = ? AND posts > 0
+            ORDER BY weekday, hour
+            ''', (channel_id,))
+            weekday_hour = [dict(row) for row in cursor.fetchall()]
+            
+            return {'daily': daily, 'weekday_hour': weekday_hour}
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении агрегатов канала: {str(e)}")
+            return {}
+    
+    def search(self, query: str, channel_id: Optional[int] = None, kind: str = 'all',
+               limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        Полнотекстовый поиск по постам и комментариям
+        
+        Args:
+            query: Строка запроса (слова объединяются через AND)
+            channel_id: ID канала в базе данных (по умолчанию все каналы)
+            kind: Где искать: 'posts', 'comments' или 'all'
+            limit: Количество результатов на странице
+            offset: Количество пропускаемых результатов
+            
+        Returns:
+            Словарь с общим количеством найденных записей total и списком results,
+            отсортированным по релевантности (bm25). Каждый результат содержит type
+            ('post' или 'comment'), id, channel_id, telegram_id, post_id, date, date_ts,
+            views и snippet с найденными словами, выделенными **
+        """
+        match = fts_query(query)
+        if not match or kind not in ('posts', 'comments', 'all'):
+            return {'total': 0, 'results': []}
+        
+        channel_filter = "AND p.channel_id = ?" if channel_id is not None else ""
+        # Источники результатов: (столбцы результата, соединения и условие поиска)
+        sources = {
+            'posts': (
+                "'post' AS type, p.id, p.channel_id, p.telegram_id, NULL AS post_id, p.date, p.date_ts, p.views, "
+                "snippet(posts_fts, 0, '**', '**', '…', 16) AS snippet, posts_fts.rank AS rank",
+                f"posts_fts JOIN posts p ON p.id = posts_fts.rowid WHERE posts_fts MATCH ? {channel_filter}"
+            ),
+            'comments': (
+                "'comment' AS type, c.id, p.channel_id, c.telegram_id, c.post_id, c.date, c.date_ts, NULL AS views, "
+                "snippet(comments_fts, 0, '**', '**', '…', 16) AS snippet, comments_fts.rank AS rank",
+                "comments_fts JOIN comments c ON c.id = comments_fts.rowid JOIN posts p ON p.id = c.post_id "
+                f"WHERE comments_fts MATCH ? {channel_filter}"
+            )
+        }
+        selected = [sources[name] for name in (['posts', 'comments'] if kind == 'all' else [kind])]
+        params = [match, channel_id] if channel_id is not None else [match]
+        
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            total = 0
+            results = []
+            for columns, source in selected:
+                cursor.execute(f"SELECT COUNT(*) FROM {source}", params)
+                total += cursor.fetchone()[0]
+                
+                # Каждый источник сортируется отдельно: FTS5 вычисляет snippet только для
+                # первых limit + offset записей, после чего списки объединяются по рангу
+                cursor.execute(f"SELECT {columns} FROM {source} ORDER BY rank LIMIT ?", params + [limit + offset])
+                results.extend(dict(row) for row in cursor.fetchall())
+            
+            results.sort(key=lambda row: row['rank'])
+            return {'total': total, 'results': results[offset:offset + limit]}
+            
+        except Exception as e:
+            logger.error(f"Ошибка при полнотекстовом поиске: {str(e)}")
+            return {'total': 0, 'results': []}
+    
+    def _read_frame(self, query: str, params) -> pd.DataFrame:
+        """
+        Выполнение запроса с построением DataFrame по столбцам без промежуточных словарей
+        
+        Args:
+            query: SQL-запрос
+            params: Параметры запроса
+            
+        Returns:
+            DataFrame с типами столбцов из FRAME_DTYPES и столбцом datetime, если есть date_ts
+        """
+        cursor = self._get_connection().cursor()
+        cursor.row_factory = None  # Кортежи вместо sqlite3.Row
+        cursor.execute(query, params)
+        
+        names = [description[0] for description in cursor.description]
+        rows = cursor.fetchall()
+        columns = list(zip(*rows)) if rows else [()] * len(names)
+        
+        data = {}
+        for name, values in zip(names, columns):
+            dtype = FRAME_DTYPES.get(name)
+            if dtype == 'int64':
+                data[name] = np.fromiter((value or 0 for value in values), dtype=np.int64, count=len(values))
+            elif dtype == 'bool':
+                data[name] = np.fromiter((bool(value) for value in values), dtype=bool, count=len(values))
+            elif dtype is not None:
+                data[name] = pd.array(values, dtype=dtype)
+            else:
+                data[name] = pd.array(values, dtype=object)
+        
+        if 'date_ts' in data:
+            data['datetime'] = pd.to_datetime(np.array(columns[names.index('date_ts')], dtype=float), unit='s')
+        
+        return pd.DataFrame(data, columns=list(data))
+    
+    def get_posts_frame(self, channel_id: int, since: Optional[int] = None,
+                        until: Optional[int] = None) -> pd.DataFrame:
+        """
+        Получение постов канала в виде DataFrame для анализа
+        
+        Args:
+            channel_id: ID канала в базе данных
+            since: Начало периода в Unix time (включительно)
+            until: Конец периода в Unix time (не включительно)
+            
+        Returns:
+            DataFrame постов, начиная с самых новых (типы столбцов - FRAME_DTYPES)
+        """
+        query = "SELECT * FROM posts WHERE channel_id = ?"
+        params = [channel_id]
+        if since is not None:
+            query += " AND date_ts >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND date_ts < ?"
+            params.append(until)
+        
+        try:
+            return self._read_frame(query + " ORDER BY date_ts DESC", params)
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении постов: {str(e)}")
+            return pd.DataFrame()
+    
+    def get_comments_frame(self, channel_id: int, since: Optional[int] = None,
+                           until: Optional[int] = None) -> pd.DataFrame:
+        """
+        Получение комментариев к постам канала в виде DataFrame для анализа
+        
+        Args:
+            channel_id: ID канала в базе данных
+            since: Начало периода публикации постов в Unix time (включительно)
+            until: Конец периода публикации постов в Unix time (не включительно)
+            
+        Returns:
+            DataFrame комментариев в порядке времени (типы столбцов - FRAME_DTYPES)
+        """
+        query = "SELECT c.* FROM comments c JOIN posts p ON p.id = c.post_id WHERE p.channel_id = ?"
+        params = [channel_id]
+        if since is not None:
+            query += " AND p.date_ts >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND p.date_ts < ?"
+            params.append(until)
+        
+        try:
+            return self._read_frame(query + " ORDER BY c.date_ts", params)
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении комментариев: {str(e)}")
+            return pd.DataFrame()
+    
+    def get_recent_post_ids(self, channel_id: int, limit: int = 1000) -> List[int]:
+        """
+        Получение Telegram ID последних постов канала
+        
+        Args:
+            channel_id: ID канала в базе данных
+            limit: Максимальное количество постов
+            
+        Returns:
+            Список Telegram ID постов, начиная с самых новых
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "SELECT telegram_id FROM posts WHERE channel_id = ? ORDER BY telegram_id DESC LIMIT ?",
+                (channel_id, limit)
+            )
+            
+            return [row['telegram_id'] for row in cursor.fetchall()]
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении последних постов: {str(e)}")
+            return []
+    
+    def get_metric_snapshots(self, channel_id: int) -> List[Dict[str, Any]]:
+        """
+        Получение снимков счетчиков постов канала
+        
+        Args:
+            channel_id: ID канала в базе данных
+            
+        Returns:
+            Список снимков с полями post_id, captured_at (Unix time), views, forwards, replies
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT s.post_id, s.captured_at, s.views, s.forwards, s.replies
+            FROM post_metric_snapshots s
+            JOIN posts p ON p.id = s.post_id
+            WHERE p.channel_id = ?
+            ORDER BY s.post_id, s.captured_at
+            ''', (channel_id,))
+            
+            return [dict(row) for row in cursor.fetchall()]
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении снимков счетчиков: {str(e)}")
+            return []
+    
+    def get_metric_snapshots_frame(self, channel_id: int) -> pd.DataFrame:
+        """
+        Получение снимков счетчиков постов канала в виде DataFrame
+        
+        Args:
+            channel_id: ID канала в базе данных
+            
+        Returns:
+            DataFrame снимков с полями post_id, post_telegram_id, captured_at (Unix time),
+            views, forwards, replies
+        """
+        try:
+            return self._read_frame('''
+            SELECT s.post_id, p.telegram_id AS post_telegram_id, s.captured_at, s.views, s.forwards, s.replies
+            FROM post_metric_snapshots s
+            JOIN posts p ON p.id = s.post_id
+            WHERE p.channel_id = ?
+            ORDER BY s.post_id, s.captured_at
+            ''', (channel_id,))
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении снимков счетчиков: {str(e)}")
+            return pd.DataFrame()
+    
     def get_comments_for_posts(self, post_ids: List[int]) -> List[Dict[str, Any]]:
         """
         Получение комментариев для указанных постов
@@ -574,7 +2257,7 @@ class Database:
             placeholders = ', '.join(['?'] * len(post_ids))
             
             cursor.execute(
-                f"SELECT * FROM comments WHERE post_id IN ({placeholders}) ORDER BY date ASC",
+                f"SELECT * FROM comments WHERE post_id IN ({placeholders}) ORDER BY date_ts ASC",
                 post_ids
             )
             
@@ -595,17 +2278,20 @@ class Database:
             report_id: ID отчета
             
         Returns:
-            Словарь с данными отчета
+            Словарь с данными отчета, включая промпт (JSON) и ответ LLM
         """
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
             
-            # Получение отчета
-            cursor.execute(
-                "SELECT * FROM reports WHERE id = ?",
-                (report_id,)
-            )
+            # Получение отчета вместе со сжатыми текстами
+            cursor.execute('''
+            SELECT r.*, COALESCE(c.name, '') AS channel_name, b.codec, b.prompt, b.response
+            FROM reports r
+            LEFT JOIN channels c ON c.id = r.channel_id
+            LEFT JOIN report_bodies b ON b.report_id = r.id
+            WHERE r.id = ?
+            ''', (report_id,))
             
             report = cursor.fetchone()
             
@@ -615,9 +2301,10 @@ class Database:
             # Преобразование в словарь
             report_dict = dict(report)
             
-            # Получение информации о канале
-            channel = self.get_channel_info(report_dict['channel_id'])
-            report_dict['channel_name'] = channel.get('name', '')
+            # Распаковка промпта и ответа
+            codec = report_dict.pop('codec')
+            report_dict['prompt'] = decompress_text(report_dict['prompt'], codec)
+            report_dict['response'] = decompress_text(report_dict['response'], codec)
             
             return report_dict
             
@@ -630,14 +2317,15 @@ class Database:
         Получение всех сохраненных отчетов
         
         Returns:
-            Список отчетов
+            Список отчетов с метаданными (id, channel_id, date, file_path, channel_name)
+            без промпта и ответа LLM
         """
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
             
             cursor.execute("""
-            SELECT r.*, c.name as channel_name 
+            SELECT r.id, r.channel_id, r.date, r.file_path, c.name as channel_name 
             FROM reports r 
             JOIN channels c ON r.channel_id = c.id 
             ORDER BY r.date DESC
@@ -0,0 +1,455 @@
+import os
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+from telegram_client import TelegramClient
+from database import Database
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+class IngestionPipeline:
+    """Потоковая загрузка данных канала из Telegram в базу данных"""
+    
+    def __init__(self, telegram_client: TelegramClient, db: Database,
+                 batch_size: Optional[int] = None, queue_size: Optional[int] = None):
+        """
+        Инициализация конвейера загрузки
+        
+        Args:
+            telegram_client: Клиент Telegram API
+            db: База данных
+            batch_size: Количество постов, сохраняемых в одной транзакции
+            queue_size: Максимальное количество пакетов, ожидающих записи
+        """
+        self.telegram_client = telegram_client
+        self.db = db
+        self.batch_size = max(1, batch_size or int(os.getenv('INGEST_BATCH_SIZE', 200)))
+        self.queue_size = max(1, queue_size or int(os.getenv('INGEST_QUEUE_SIZE', 4)))
+    
+    def ingest_channel(self, channel_identifier: str, days: int = 180, full_sync: bool = False,
+                       rescan_hours: int = 0, resume: bool = True) -> Dict[str, Any]:
+        """
+        Загрузка постов и комментариев канала с записью в БД по мере получения
+        
+        Посты читаются из Telegram пакетами через ограниченную очередь, поэтому потребление
+        памяти не зависит от длины истории. Каждый пакет сохраняется вместе с комментариями,
+        после чего сдвигается курсор синхронизации, так что при сбое уже записанные
+        данные не теряются.
+        
+        Ход загрузки фиксируется в задании (ingestion_jobs): после сохранения постов пакета
+        записывается этап 'comments', после загрузки комментариев - этап 'posts' с ID
+        последнего обработанного поста. Если предыдущее задание канала прервалось
+        (FloodWait, обрыв сети, перезапуск процесса), загрузка продолжается с его
+        контрольной точки с исходными параметрами.
+        
+        Args:
+            channel_identifier: Username канала (с @ или без) или его ID
+            days: Количество дней для выборки постов
+            full_sync: Игнорировать курсор и загрузить весь период заново
+            rescan_hours: Окно повторной загрузки известных постов в часах
+            resume: Продолжить незавершенное задание канала, если оно есть
+        
+        Returns:
+            Словарь с ID канала и количеством сохраненных постов и комментариев
+        """
+        # Курсор инкрементальной синхронизации для уже известного канала
+        last_message_id = None
+        stream_min_id = None
+        job = {}
+        known_channel_id = self.db.find_channel_id(channel_identifier)
+        if known_channel_id and resume:
+            job = self.db.get_unfinished_job(known_channel_id)
+        
+        if job:
+            days = job['params'].get('days', days)
+            rescan_hours = job['params'].get('rescan_hours', rescan_hours)
+            last_message_id = job['last_message_id']
+            stream_min_id = last_message_id
+            # Посты прерванного пакета уже сохранены, повторно загружаются только их комментарии
+            if job['phase'] == 'comments' and job.get('batch_last_id') is not None:
+                stream_min_id = max(last_message_id or 0, job['batch_last_id'])
+            logger.info(
+                f"Возобновление задания {job['id']}: этап {job['phase']}, "
+                f"обработаны посты до ID {last_message_id or '-'}"
+            )
+        elif known_channel_id and not full_sync:
+            last_message_id = self.db.get_sync_state(known_channel_id).get('last_message_id')
+            stream_min_id = last_message_id
+            if last_message_id:
+                logger.info(f"Инкрементальная синхронизация: загрузка постов новее ID {last_message_id}")
+        
+        channel_info, batches = self.telegram_client.stream_channel_info_and_posts(
+            channel_identifier, days,
+            min_id=stream_min_id,
+            rescan_hours=rescan_hours,
+            batch_size=self.batch_size,
+            queue_size=self.queue_size
+        )
+        
+        try:
+            channel_id = self.db.save_channel_info(channel_info)
+            
+            if job:
+                job_id = job['id']
+            else:
+                job_id = self.db.create_ingestion_job(channel_id, {
+                    'days': days,
+                    'full_sync': full_sync,
+                    'rescan_hours': rescan_hours
+                }, last_message_id)
+        except Exception:
+            batches.close()
+            raise
+        
+        posts_count = 0
+        comments_count = 0
+        # Итоги задания с учетом предыдущих запусков
+        job_posts = job.get('posts_count') or 0
+        job_comments = job.get('comments_count') or 0
+        
+        try:
+            # Комментарии пакета, на котором прервалось задание
+            if job.get('phase') == 'comments' and job.get('batch_first_id') is not None:
+                pending = self.db.get_posts_for_comments(channel_id, job['batch_first_id'], job['batch_last_id'])
+                comments_count += self._ingest_comments(pending, channel_id)
+                last_message_id = max(last_message_id or 0, job['batch_last_id'])
+                self.db.update_sync_state(channel_id, last_message_id)
+                self.db.save_job_checkpoint(job_id, 'posts', last_message_id,
+                                            posts_count=job_posts, comments_count=job_comments + comments_count)
+            
+            for batch in batches:
+                batch_ids = [post['id'] for post in batch]
+                self.db.save_posts(batch, channel_id)
+                posts_count += len(batch)
+                self.db.save_job_checkpoint(
+                    job_id, 'comments', last_message_id, min(batch_ids), max(batch_ids),
+                    posts_count=job_posts + posts_count, comments_count=job_comments + comments_count
+                )
+                
+                # Страницы комментариев записываются по мере получения
+                comments_count += self._ingest_comments(batch, channel_id)
+                
+                last_message_id = max(last_message_id or 0, max(batch_ids))
+                self.db.update_sync_state(channel_id, last_message_id)
+                self.db.save_job_checkpoint(job_id, 'posts', last_message_id,
+                                            posts_count=job_posts + posts_count,
+                                            comments_count=job_comments + comments_count)
+                
+                logger.info(f"Сохранено постов: {posts_count}, комментариев: {comments_count}")
+        except Exception as e:
+            self.db.finish_ingestion_job(job_id, 'failed', str(e))
+            raise
+        finally:
+            batches.close()
+        
+        self.db.finish_ingestion_job(job_id, 'completed')
+        self.db.compact_snapshots(channel_id)
+        
+        return {
+            'channel_id': channel_id,
+            'job_id': job_id,
+            'resumed': bool(job),
+            'posts_count': posts_count,
+            'comments_count': comments_count
+        }
+    
+    def backfill_channel(self, channel_identifier: str, days: int = 180, shards: Optional[int] = None,
+                         concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Загрузка длинной истории канала параллельными шардами по диапазонам ID
+        
+        Шарды читаются одновременно, пакеты сохраняются по мере поступления. Запись
+        постов идемпотентна, поэтому повторный запуск после сбоя безопасен. Курсор
+        синхронизации сдвигается только после загрузки всех шардов.
+        
+        Args:
+            channel_identifier: Username канала (с @ или без) или его ID
+            days: Количество дней для выборки постов
+            shards: Количество шардов
+            concurrency: Максимальное количество одновременно загружаемых шардов
+            
+        Returns:
+            Словарь с ID канала, количеством сохраненных постов и комментариев
+            и прогрессом по каждому шарду
+        """
+        channel_info, id_shards, batches = self.telegram_client.stream_channel_backfill(
+            channel_identifier, days,
+            shards=shards,
+            concurrency=concurrency,
+            batch_size=self.batch_size,
+            queue_size=self.queue_size
+        )
+        
+        progress = [{
+            'shard': index + 1,
+            'min_id': min_id + 1,
+            'max_id': max_id,
+            'posts_count': 0,
+            'comments_count': 0,
+            'done': False
+        } for index, (min_id, max_id) in enumerate(id_shards)]
+        posts_count = 0
+        comments_count = 0
+        
+        try:
+            channel_id = self.db.save_channel_info(channel_info)
+            
+            for index, batch in batches:
+                shard = progress[index]
+                if batch is None:
+                    shard['done'] = True
+                    done = sum(1 for item in progress if item['done'])
+                    logger.info(
+                        f"Шард {shard['shard']} завершен: {shard['posts_count']} постов, "
+                        f"{shard['comments_count']} комментариев (готово шардов: {done}/{len(progress)})"
+                    )
+                    continue
+                
+                self.db.save_posts(batch, channel_id)
+                batch_comments = self._ingest_comments(batch, channel_id)
+                
+                shard['posts_count'] += len(batch)
+                shard['comments_count'] += batch_comments
+                posts_count += len(batch)
+                comments_count += batch_comments
+                logger.info(f"Сохранено постов: {posts_count}, комментариев: {comments_count}")
+        finally:
+            batches.close()
+        
+        if id_shards:
+            self.db.update_sync_state(channel_id, id_shards[-1][1])
+        self.db.compact_snapshots(channel_id)
+        
+        return {
+            'channel_id': channel_id,
+            'posts_count': posts_count,
+            'comments_count': comments_count,
+            'shards': progress
+        }
+    
+    def _ingest_comments(self, posts: List[Dict[str, Any]], channel_id: int) -> int:
+        """
+        Загрузка и сохранение комментариев к пакету постов
+        
+        Args:
+            posts: Пакет постов (Telegram ID поста и канала, счетчик replies)
+            channel_id: ID канала в базе данных
+            
+        Returns:
+            Количество сохраненных комментариев
+        """
+        comments_count = 0
+        comment_posts = self._plan_comment_fetch(posts, channel_id)
+        pages = self.telegram_client.stream_comments(comment_posts, queue_size=self.queue_size)
+        try:
+            for page in pages:
+                self.db.save_comments(page)
+                comments_count += len(page)
+        finally:
+            pages.close()
+        
+        return comments_count
+    
+    def ingest_batch(self, channel_identifiers: List[str], days: int = 180, full_sync: bool = False,
+                     rescan_hours: int = 0, concurrency: Optional[int] = None,
+                     resume: bool = True, backfill: bool = False) -> List[Dict[str, Any]]:
+        """
+        Параллельная загрузка нескольких каналов через общее соединение с Telegram
+        
+        Args:
+            channel_identifiers: Список username или ID каналов
+            days: Количество дней для выборки постов
+            full_sync: Игнорировать курсоры и загрузить весь период заново
+            rescan_hours: Окно повторной загрузки известных постов в часах
+            concurrency: Максимальное количество одновременно загружаемых каналов
+                (INGEST_CHANNEL_CONCURRENCY, по умолчанию 4)
+            resume: Продолжать незавершенные задания каналов
+            backfill: Загружать историю каждого канала параллельными шардами
+            
+        Returns:
+            Список результатов по каналам в порядке входного списка
+        """
+        concurrency = max(1, concurrency or int(os.getenv('INGEST_CHANNEL_CONCURRENCY', 4)))
+        logger.info(f"Пакетная загрузка {len(channel_identifiers)} каналов, одновременно до {concurrency}")
+        
+        def run(channel_identifier: str) -> Dict[str, Any]:
+            started = time.time()
+            try:
+                if backfill:
+                    result = self.backfill_channel(channel_identifier, days)
+                else:
+                    result = self.ingest_channel(
+                        channel_identifier, days,
+                        full_sync=full_sync,
+                        rescan_hours=rescan_hours,
+                        resume=resume
+                    )
+                result.update({'channel': channel_identifier, 'status': 'success'})
+            except Exception as e:
+                logger.error(f"Ошибка при загрузке канала {channel_identifier}: {str(e)}")
+                result = {'channel': channel_identifier, 'status': 'error', 'error': str(e)}
+            finally:
+                # Каждый поток работает со своим подключением Database, которое возвращается в пул
+                self.db.release_connection()
+            
+            result['duration'] = round(time.time() - started, 2)
+            return result
+        
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(run, channel_identifiers))
+        
+        succeeded = sum(1 for result in results if result['status'] == 'success')
+        logger.info(f"Пакетная загрузка завершена: успешно {succeeded} из {len(results)}")
+        return results
+    
+    def refresh_metrics(self, channel_id: int, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Обновление просмотров, репостов и ответов последних постов без повторной загрузки истории
+        
+        Args:
+            channel_id: ID канала в базе данных
+            limit: Количество последних постов для обновления
+                (METRICS_REFRESH_LIMIT, по умолчанию 1000)
+            
+        Returns:
+            Словарь с ID канала и количеством обновленных постов
+        """
+        limit = max(1, limit or int(os.getenv('METRICS_REFRESH_LIMIT', 1000)))
+        
+        channel_info = self.db.get_channel_info(channel_id)
+        if not channel_info:
+            raise ValueError(f"Канал с ID {channel_id} не найден")
+        
+        message_ids = self.db.get_recent_post_ids(channel_id, limit)
+        metrics = self.telegram_client.get_post_metrics(channel_info['telegram_id'], message_ids)
+        self.db.update_post_metrics(channel_id, metrics)
+        self.db.compact_snapshots(channel_id)
+        
+        logger.info(f"Обновлены счетчики {len(metrics)} постов канала {channel_info.get('name')}")
+        return {
+            'channel_id': channel_id,
+            'updated_count': len(metrics)
+        }
+    
+    def _plan_comment_fetch(self, posts: List[Dict[str, Any]], channel_id: int) -> List[Dict[str, Any]]:
+        """
+        Отбор постов, для которых нужно запрашивать комментарии
+        
+        Посты без ответов пропускаются. Если количество сохраненных комментариев уже
+        соответствует счетчику replies, пост тоже пропускается; для остальных известных
+        постов запрашиваются только комментарии новее последнего сохраненного.
+        
+        Args:
+            posts: Пакет постов из Telegram
+            channel_id: ID канала в базе данных
+            
+        Returns:
+            Список постов для загрузки комментариев (с полем comments_min_id для известных обсуждений)
+        """
+        cap = self.telegram_client.comments_per_post
+        stats = self.db.get_comment_stats(channel_id, [post['id'] for post in posts])
+        planned = []
+        
+        for post in posts:
+            replies = post.get('replies') or 0
+            if replies == 0:
+                continue
+            
+            stored = stats.get(post['id'])
+            if stored is None:
+                planned.append(post)
+                continue
+            
+            expected = min(replies, cap) if cap > 0 else replies
+            if stored['count'] >= expected:
+                continue
+            
+            planned.append(dict(post, comments_min_id=stored['max_comment_id']))
+        
+        logger.info(f"Комментарии будут запрошены для {len(planned)} из {len(posts)} постов")
+        return planned
+
+
+def main():
+    """Пакетная загрузка каналов из командной строки"""
+    from dotenv import load_dotenv
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(levelname)s] %(message)s'
+    )
+    load_dotenv()
+    
+    parser = argparse.ArgumentParser(description='Загрузка данных Telegram-каналов в базу данных')
+    parser.add_argument('channels', nargs='+', help='Username или ID каналов')
+    parser.add_argument('--days', type=int, default=180, help='Количество дней для выборки постов')
+    parser.add_argument('--full-sync', action='store_true', help='Игнорировать курсоры синхронизации')
+    parser.add_argument('--rescan-hours', type=int, default=int(os.getenv('SYNC_RESCAN_HOURS', 24)),
+                        help='Окно повторной загрузки известных постов в часах')
+    parser.add_argument('--concurrency', type=int, default=None, help='Количество одновременно загружаемых каналов')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='Не продолжать прерванные задания, начать загрузку заново')
+    parser.add_argument('--backfill', action='store_true',
+                        help='Загрузить историю параллельными шардами по диапазонам ID')
+    parser.add_argument('--refresh-metrics', action='store_true',
+                        help='Только обновить счетчики последних постов уже загруженных каналов')
+    parser.add_argument('--limit', type=int, default=None, help='Количество постов для обновления счетчиков')
+    args = parser.parse_args()
+    
+    db = Database()
+    db.init_db()
+    telegram_client = TelegramClient(entity_cache=db)
+    
+    if args.refresh_metrics:
+        pipeline = IngestionPipeline(telegram_client, db)
+        failed = False
+        try:
+            for channel in args.channels:
+                channel_id = db.find_channel_id(channel)
+                if not channel_id:
+                    logger.error(f"{channel}: канал не найден в базе данных")
+                    failed = True
+                    continue
+                try:
+                    result = pipeline.refresh_metrics(channel_id, args.limit)
+                    logger.info(f"{channel}: обновлены счетчики {result['updated_count']} постов")
+                except Exception as e:
+                    logger.error(f"{channel}: ошибка при обновлении счетчиков - {str(e)}")
+                    failed = True
+        finally:
+            telegram_client.close()
+        
+        if failed:
+            sys.exit(1)
+        return
+    
+    try:
+        results = IngestionPipeline(telegram_client, db).ingest_batch(
+            args.channels, args.days,
+            full_sync=args.full_sync,
+            rescan_hours=args.rescan_hours,
+            concurrency=args.concurrency,
+            resume=not args.no_resume,
+            backfill=args.backfill
+        )
+    finally:
+        telegram_client.close()
+    
+    for result in results:
+        if result['status'] == 'success':
+            logger.info(
+                f"{result['channel']}: {result['posts_count']} постов, "
+                f"{result['comments_count']} комментариев за {result['duration']} сек."
+            )
+        else:
+            logger.error(f"{result['channel']}: ошибка за {result['duration']} сек. - {result['error']}")
+    
+    if any(result['status'] != 'success' for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
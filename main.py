@@ -11,8 +11,9 @@ from data_processor import DataProcessor
 from prompt_manager import PromptManager
 from llm_interface import LLMInterface
 from report_generator import ReportGenerator
-from database import Database
+from database import Database, POST_SORT_COLUMNS, decode_cursor
 from telegram_auth import TelegramAuth
+from ingestion import IngestionPipeline
 from werkzeug.serving import WSGIRequestHandler
 
 # Увеличиваем размер очереди запросов
@@ -36,11 +37,17 @@ load_dotenv()
 app = Flask(__name__)
 app.config['TIMEOUT'] = 300  # Увеличиваем таймаут до 5 минут
 db = Database()
-telegram_client = TelegramClient()
+telegram_client = TelegramClient(entity_cache=db)
 data_processor = DataProcessor()
 prompt_manager = PromptManager()
 llm_interface = LLMInterface()
 report_generator = ReportGenerator()
+ingestion_pipeline = IngestionPipeline(telegram_client, db)
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Возврат подключения к БД потока запроса в пул"""
+    db.release_connection()
 
 # Функция для проверки авторизации Telegram
 async def check_telegram_auth():
@@ -97,6 +104,8 @@ def analyze():
     """Запуск процесса сбора и анализа данных"""
     channel = request.form.get('channel')
     days = int(request.form.get('days', 180))  # Увеличиваем до 180 по умолчанию
+    full_sync = request.form.get('full_sync') in ('1', 'true', 'on')
+    rescan_hours = int(request.form.get('rescan_hours', os.getenv('SYNC_RESCAN_HOURS', 24)))
     
     if not channel:
         return jsonify({'error': 'Канал не указан'}), 400
@@ -105,19 +114,10 @@ def analyze():
     try:
         logger.info(f"Начинается сбор данных для канала {channel} за {days} дней")
         
-        # Получение информации о канале и постов за один запрос
-        channel_info, posts = telegram_client.get_channel_info_and_posts(channel, days)
-        logger.info(f"Найдено {len(posts)} постов за указанный период")
-        
-        # Получение комментариев
-        comments = telegram_client.get_comments(posts)
-        logger.info(f"Обнаружено {len(comments)} комментариев")
-        
-        # Сохранение данных в БД
-        channel_id = db.save_channel_info(channel_info)
-        db.save_posts(posts, channel_id)
-        db.save_comments(comments)
-        logger.info("Данные успешно сохранены в базу")
+        # Посты и комментарии сохраняются в БД пакетами по мере загрузки
+        result = ingestion_pipeline.ingest_channel(channel, days, full_sync=full_sync, rescan_hours=rescan_hours)
+        channel_id = result['channel_id']
+        logger.info(f"Данные успешно сохранены в базу: {result['posts_count']} постов, {result['comments_count']} комментариев")
         
         return jsonify({'status': 'success', 'channel_id': channel_id})
     
@@ -125,17 +125,118 @@ def analyze():
         logger.error(f"Ошибка при сборе данных: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/analyze_batch', methods=['POST'])
+def analyze_batch():
+    """Пакетный сбор данных для нескольких каналов"""
+    params = request.get_json(silent=True) or request.form
+    channels = params.get('channels') or []
+    
+    # В форме каналы передаются одной строкой через запятую или перевод строки
+    if isinstance(channels, str):
+        channels = channels.replace(',', '\n').split('\n')
+    channels = [channel.strip() for channel in channels if channel and channel.strip()]
+    
+    if not channels:
+        return jsonify({'error': 'Каналы не указаны'}), 400
+    
+    try:
+        results = ingestion_pipeline.ingest_batch(
+            channels,
+            days=int(params.get('days', 180)),
+            full_sync=str(params.get('full_sync', '')).lower() in ('1', 'true', 'on'),
+            rescan_hours=int(params.get('rescan_hours', os.getenv('SYNC_RESCAN_HOURS', 24))),
+            concurrency=int(params['concurrency']) if params.get('concurrency') else None,
+            backfill=str(params.get('backfill', '')).lower() in ('1', 'true', 'on')
+        )
+        
+        return jsonify({'status': 'success', 'results': results})
+    
+    except Exception as e:
+        logger.error(f"Ошибка при пакетном сборе данных: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/channel/<int:channel_id>')
 def channel_data(channel_id):
-    """Страница с данными канала"""
+    """Страница с данными канала (посты подгружаются страницами через /api/channel/<id>/posts)"""
     channel_info = db.get_channel_info(channel_id)
-    posts = db.get_posts(channel_id)
     
     return render_template(
         'channel.html',
         channel=channel_info,
-        posts=posts
+        posts_count=db.get_posts_count(channel_id)
+    )
+
+@app.route('/api/channel/<int:channel_id>/posts')
+def channel_posts(channel_id):
+    """Страница списка постов канала с сортировкой по дате, просмотрам или ER"""
+    sort = request.args.get('sort', 'date')
+    if sort not in POST_SORT_COLUMNS:
+        return jsonify({'error': f"Неизвестное поле сортировки: {sort}"}), 400
+    
+    after = None
+    if request.args.get('cursor'):
+        after = decode_cursor(request.args['cursor'])
+        if after is None:
+            return jsonify({'error': 'Некорректный курсор страницы'}), 400
+    
+    page = db.get_posts_page(
+        channel_id,
+        sort=sort,
+        descending=request.args.get('order', 'desc') != 'asc',
+        after=after,
+        limit=min(200, max(1, request.args.get('limit', 50, type=int)))
+    )
+    
+    return jsonify(page)
+
+@app.route('/api/channel/<int:channel_id>/stats')
+def channel_stats(channel_id):
+    """Агрегаты канала для графиков: по дням и по дням недели и часам"""
+    days = request.args.get('days', type=int)
+    since = int(time.time()) - days * 86400 if days else None
+    
+    rollups = db.get_channel_rollups(channel_id, since=since)
+    if not rollups:
+        return jsonify({'error': 'Не удалось получить статистику канала'}), 500
+    
+    return jsonify(rollups)
+
+@app.route('/api/search')
+def search():
+    """Полнотекстовый поиск по постам и комментариям с постраничным выводом"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Не указан поисковый запрос'}), 400
+    
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(100, max(1, request.args.get('per_page', 20, type=int)))
+    
+    result = db.search(
+        query,
+        channel_id=request.args.get('channel_id', type=int),
+        kind=request.args.get('type', 'all'),
+        limit=per_page,
+        offset=(page - 1) * per_page
     )
+    
+    return jsonify({'query': query, 'page': page, 'per_page': per_page, **result})
+
+@app.route('/refresh_metrics/<int:channel_id>', methods=['POST'])
+def refresh_metrics(channel_id):
+    """Обновление счетчиков последних постов канала без полной синхронизации"""
+    params = request.get_json(silent=True) or request.form
+    
+    try:
+        result = ingestion_pipeline.refresh_metrics(
+            channel_id,
+            limit=int(params['limit']) if params.get('limit') else None
+        )
+        
+        return jsonify({'status': 'success', **result})
+    
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении счетчиков: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/run_analysis/<int:channel_id>', methods=['POST'])
 def run_analysis(channel_id):
@@ -143,13 +244,19 @@ def run_analysis(channel_id):
     try:
         logger.info("Начинается предобработка данных для анализа...")
         
-        # Получение данных из БД
+        # Получение данных из БД (за последние days дней, если период указан)
+        params = request.get_json(silent=True) or request.form
+        since = int(time.time()) - int(params['days']) * 86400 if params.get('days') else None
         channel_info = db.get_channel_info(channel_id)
-        posts = db.get_posts(channel_id)
-        comments = db.get_comments_for_posts([p['id'] for p in posts])
+        posts = db.get_posts_frame(channel_id, since=since)
+        comments = db.get_comments_frame(channel_id, since=since)
+        snapshots = db.get_metric_snapshots(channel_id)
+        
+        # Агрегаты по дню недели и часу накоплены за всю историю, поэтому используются только без периода
+        rollups = db.get_channel_rollups(channel_id) if since is None else None
         
         # Предобработка данных
-        processed_data = data_processor.process_data(channel_info, posts, comments)
+        processed_data = data_processor.process_data(channel_info, posts, comments, snapshots, rollups)
         logger.info("Предобработка завершена")
         
         # Формирование промпта
@@ -278,6 +385,11 @@ def check_auth_status():
             'error': str(e)
         }), 500
 
+@app.route('/telegram_health')
+def telegram_health():
+    """Состояние постоянного соединения с Telegram API"""
+    return jsonify({'status': 'success', 'health': telegram_client.get_health()})
+
 @app.route('/save_config', methods=['POST'])
 def save_config():
     """Сохранение конфигурации и API ключей"""
@@ -319,6 +431,9 @@ def init_telegram():
         if not phone:
             return jsonify({'error': 'Номер телефона не указан'}), 400
         
+        # Файл сессии используется авторизацией, поэтому постоянное соединение закрывается
+        telegram_client.close()
+        
         # Запускаем процесс отправки кода авторизации
         result = asyncio.run(TelegramAuth.start_auth(phone))
         
@@ -347,6 +462,8 @@ def verify_telegram_code():
         if not session_id or not code or not phone:
             return jsonify({'error': 'Не указан код, телефон или идентификатор сессии'}), 400
         
+        telegram_client.close()
+        
         # Проверяем код авторизации
         result = asyncio.run(TelegramAuth.verify_code(session_id, code, phone))
         
@@ -389,6 +506,8 @@ def verify_telegram_2fa():
         if not session_id or not password:
             return jsonify({'error': 'Не указан пароль или идентификатор сессии'}), 400
         
+        telegram_client.close()
+        
         # Проверяем пароль 2FA
         result = asyncio.run(TelegramAuth.verify_2fa(session_id, password))
         
@@ -408,6 +527,8 @@ def verify_telegram_2fa():
 def reset_telegram_session():
     """Сброс сессии Telegram"""
     try:
+        telegram_client.close()
+        
         result = asyncio.run(TelegramAuth.reset_session())
         
         if result.get('status') == 'success':
@@ -143,6 +143,9 @@ class PromptManager:
         
         АНАЛИЗ ВРЕМЕНИ ПУБЛИКАЦИИ:
         {time_analysis}
+        
+        ДИНАМИКА ПРОСМОТРОВ:
+        {view_dynamics}
         """
     
     def _fill_system_template(self) -> str:
@@ -226,12 +229,16 @@ class PromptManager:
         # Форматирование анализа времени публикации
         time_analysis = self._format_time_analysis(data.get('time_analysis', {}))
         
+        # Форматирование динамики просмотров
+        view_dynamics = self._format_view_dynamics(data.get('view_dynamics', {}))
+        
         data_section = self.data_template.format(
             channel_metrics=channel_metrics,
             post_metrics=post_metrics,
             comment_analysis=comment_analysis,
             content_analysis=content_analysis,
-            time_analysis=time_analysis
+            time_analysis=time_analysis,
+            view_dynamics=view_dynamics
         )
         
         return data_section.strip()
@@ -405,6 +412,30 @@ class PromptManager:
         
         return "\n".join(result)
     
+    def _format_view_dynamics(self, analysis: Dict[str, Any]) -> str:
+        """Форматирование динамики просмотров"""
+        if not analysis:
+            return "Недостаточно снимков счетчиков для анализа динамики"
+        
+        result = [f"Медианная скорость набора просмотров: {analysis.get('median_velocity', 0)} в час"]
+        
+        if analysis.get('decay_curve'):
+            result.append("Набор просмотров после публикации (медиана):")
+            for point in analysis['decay_curve']:
+                if point['posts']:
+                    result.append(
+                        f"  - через {point['hours']} ч.: {point['median_views']} просмотров "
+                        f"({point['share_of_final']}% от текущего значения, постов: {point['posts']})"
+                    )
+        
+        if analysis.get('fastest_posts'):
+            result.append("Посты с наибольшей текущей скоростью:")
+            for i, post in enumerate(analysis['fastest_posts'], 1):
+                result.append(f"  {i}. {post['text_preview']}")
+                result.append(f"     Скорость: {post['velocity']} просмотров в час, возраст: {post['age_hours']} ч.")
+        
+        return "\n".join(result)
+    
     def _compose_final_prompt(self, prompt: Dict[str, str]) -> str:
         """Компоновка финального промпта для отправки в LLM"""
         final_prompt = f"""
@@ -0,0 +1,297 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Optional
+from telethon import TelegramClient as TelethonClient
+from telethon.errors import FloodWaitError
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Скорость по умолчанию (запросов в секунду) и емкость корзины для классов методов Telegram API
+DEFAULT_RATES = {
+    'history': 3.0,     # messages.getHistory и другие выборки сообщений
+    'replies': 5.0,     # messages.getReplies
+    'views': 2.0,       # messages.getMessagesViews
+    'resolve': 0.5,     # contacts.resolveUsername, channels.getChannels
+    'channel': 2.0,     # channels.getFullChannel
+    'auth': 0.2,        # auth.sendCode, auth.signIn, auth.checkPassword
+    'default': 5.0
+}
+DEFAULT_BURST = 5
+
+# Соответствие имени запроса Telethon классу методов
+METHOD_CLASSES = {
+    'GetHistoryRequest': 'history',
+    'GetMessagesRequest': 'history',
+    'SearchRequest': 'history',
+    'GetRepliesRequest': 'replies',
+    'GetMessagesViewsRequest': 'views',
+    'ResolveUsernameRequest': 'resolve',
+    'GetChannelsRequest': 'resolve',
+    'GetFullChannelRequest': 'channel',
+    'SendCodeRequest': 'auth',
+    'SignInRequest': 'auth',
+    'CheckPasswordRequest': 'auth'
+}
+
+class TokenBucket:
+    """Корзина токенов для одного класса методов с адаптивной скоростью"""
+    
+    def __init__(self, rate: float, burst: int):
+        """
+        Инициализация корзины
+        
+        Args:
+            rate: Скорость пополнения (запросов в секунду)
+            burst: Максимальное количество токенов
+        """
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.flood_waits = 0
+    
+    def refill(self, now: float):
+        """
+        Пополнение корзины токенами за прошедшее время
+        
+        Args:
+            now: Текущее время (time.monotonic)
+        """
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+    
+    def reserve(self, now: float) -> float:
+        """
+        Резервирование токена
+        
+        Args:
+            now: Текущее время (time.monotonic)
+        
+        Returns:
+            Время ожидания в секундах до момента, когда запрос можно отправить
+        """
+        self.refill(now)
+        self.tokens -= 1
+        
+        # Отрицательный баланс означает очередь уже зарезервированных запросов
+        return (self.updated - now) + max(0.0, -self.tokens) / self.rate
+
+class RateLimiter:
+    """
+    Общий ограничитель частоты запросов к Telegram API
+    
+    Каждый класс методов имеет собственную корзину токенов. При FloodWaitError корзина
+    приостанавливается на указанное время, а ее скорость уменьшается вдвое; после серии
+    успешных запросов скорость постепенно возвращается к базовой.
+    """
+    
+    # Количество успешных запросов, после которого скорость увеличивается
+    RECOVERY_STEP = 50
+    
+    def __init__(self, rates: Optional[Dict[str, float]] = None, burst: Optional[int] = None):
+        """
+        Инициализация ограничителя
+        
+        Args:
+            rates: Скорости по классам методов. По умолчанию DEFAULT_RATES,
+                переопределяются переменной окружения TELEGRAM_RATE_LIMITS
+                в формате "replies=5,history=3"
+            burst: Емкость корзины (TELEGRAM_RATE_BURST)
+        """
+        self.rates = dict(DEFAULT_RATES)
+        self.rates.update(self._parse_rates(os.getenv('TELEGRAM_RATE_LIMITS', '')))
+        if rates:
+            self.rates.update(rates)
+        self.burst = max(1, burst or int(os.getenv('TELEGRAM_RATE_BURST', DEFAULT_BURST)))
+        
+        self._buckets = {}
+        self._successes = {}
+        # Ограничитель используется из разных потоков и циклов событий
+        self._lock = threading.Lock()
+    
+    def _parse_rates(self, value: str) -> Dict[str, float]:
+        """Разбор строки вида "replies=5,history=3" """
+        rates = {}
+        for item in value.split(','):
+            if '=' not in item:
+                continue
+            name, rate = item.split('=', 1)
+            try:
+                rates[name.strip()] = float(rate)
+            except ValueError:
+                logger.warning(f"Некорректное значение лимита для {name.strip()}: {rate}")
+        return rates
+    
+    def _get_bucket(self, method_class: str) -> TokenBucket:
+        """Получение корзины для класса методов (вызывается под блокировкой)"""
+        if method_class not in self._buckets:
+            rate = self.rates.get(method_class, self.rates['default'])
+            self._buckets[method_class] = TokenBucket(rate, self.burst)
+        return self._buckets[method_class]
+    
+    @staticmethod
+    def classify(request) -> str:
+        """
+        Определение класса метода по запросу Telethon
+        
+        Args:
+            request: Объект запроса или имя его класса
+        
+        Returns:
+            Имя класса методов
+        """
+        name = request if isinstance(request, str) else type(request).__name__
+        return METHOD_CLASSES.get(name, 'default')
+    
+    async def acquire(self, method_class: str = 'default'):
+        """
+        Ожидание разрешения на отправку запроса
+        
+        Args:
+            method_class: Класс методов
+        """
+        while True:
+            with self._lock:
+                bucket = self._get_bucket(method_class)
+                now = time.monotonic()
+                paused = bucket.paused_until > now
+                wait = bucket.paused_until - now if paused else bucket.reserve(now)
+            
+            if wait > 0:
+                await asyncio.sleep(wait)
+            
+            # Если за время ожидания класс был приостановлен из-за FloodWait, токен резервируется заново
+            with self._lock:
+                if not paused and bucket.paused_until <= time.monotonic():
+                    return
+    
+    def report_success(self, method_class: str = 'default'):
+        """
+        Учет успешного запроса для постепенного восстановления скорости
+        
+        Args:
+            method_class: Класс методов
+        """
+        with self._lock:
+            bucket = self._get_bucket(method_class)
+            if bucket.rate >= bucket.base_rate:
+                return
+            
+            self._successes[method_class] = self._successes.get(method_class, 0) + 1
+            if self._successes[method_class] >= self.RECOVERY_STEP:
+                self._successes[method_class] = 0
+                bucket.rate = min(bucket.base_rate, bucket.rate + bucket.base_rate * 0.1)
+                logger.info(f"Скорость запросов '{method_class}' увеличена до {bucket.rate:.2f}/с")
+    
+    def report_flood_wait(self, method_class: str, seconds: int):
+        """
+        Учет FloodWaitError: пауза для всех запросов класса и снижение скорости
+        
+        Args:
+            method_class: Класс методов
+            seconds: Время ожидания, запрошенное Telegram
+        """
+        with self._lock:
+            bucket = self._get_bucket(method_class)
+            now = time.monotonic()
+            bucket.refill(now)
+            bucket.paused_until = max(bucket.paused_until, now + seconds)
+            bucket.rate = max(bucket.base_rate / 32, bucket.rate / 2)
+            bucket.tokens = min(bucket.tokens, 0)
+            bucket.updated = max(bucket.updated, bucket.paused_until)
+            bucket.flood_waits += 1
+            self._successes[method_class] = 0
+        
+        logger.warning(
+            f"FLOOD WAIT {seconds} сек. для '{method_class}': "
+            f"запросы приостановлены, скорость снижена до {bucket.rate:.2f}/с"
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущее состояние корзин
+        
+        Returns:
+            Словарь со скоростью, паузой и количеством FloodWait по классам методов
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    'rate': round(bucket.rate, 3),
+                    'base_rate': bucket.base_rate,
+                    'paused_for': round(max(0.0, bucket.paused_until - now), 1),
+                    'flood_waits': bucket.flood_waits
+                }
+                for name, bucket in self._buckets.items()
+            }
+
+# Общий экземпляр для всех клиентов процесса
+rate_limiter = RateLimiter()
+
+class RateLimitedMixin:
+    """
+    Примесь для клиентов Telegram, пропускающая каждый RPC-запрос через общий RateLimiter
+    
+    FloodWaitError не длиннее max_flood_sleep секунд обрабатываются автоматически:
+    ограничитель приостанавливает соответствующий класс методов, и запрос повторяется.
+    Более длинные ожидания передаются вызывающему коду.
+    """
+    
+    def _init_rate_limit(self, limiter: Optional[RateLimiter] = None, max_flood_sleep: Optional[int] = None):
+        """
+        Настройка ограничения частоты
+        
+        Args:
+            limiter: Ограничитель частоты (по умолчанию общий rate_limiter)
+            max_flood_sleep: Максимальное время автоматического ожидания FloodWait
+                (TELEGRAM_MAX_FLOOD_SLEEP, по умолчанию 60 секунд)
+        """
+        self.limiter = limiter or rate_limiter
+        self.max_flood_sleep = max_flood_sleep if max_flood_sleep is not None \
+            else int(os.getenv('TELEGRAM_MAX_FLOOD_SLEEP', 60))
+    
+    async def __call__(self, request, ordered=False, flood_sleep_threshold=None):
+        """Отправка запроса с учетом ограничения частоты"""
+        # Пакет запросов классифицируется по первому запросу
+        first = request[0] if isinstance(request, (list, tuple)) and request else request
+        method_class = self.limiter.classify(first)
+        
+        while True:
+            await self.limiter.acquire(method_class)
+            try:
+                result = await super().__call__(request, ordered=ordered, flood_sleep_threshold=0)
+            except FloodWaitError as e:
+                self.limiter.report_flood_wait(method_class, e.seconds)
+                if e.seconds > self.max_flood_sleep:
+                    raise
+                continue
+            
+            self.limiter.report_success(method_class)
+            return result
+
+class RateLimitedTelethonClient(RateLimitedMixin, TelethonClient):
+    """Клиент Telethon с общим ограничением частоты запросов"""
+    
+    def __init__(self, *args, limiter: Optional[RateLimiter] = None,
+                 max_flood_sleep: Optional[int] = None, **kwargs):
+        """
+        Инициализация клиента
+        
+        Args:
+            *args, **kwargs: Аргументы TelegramClient из Telethon
+            limiter: Ограничитель частоты (по умолчанию общий rate_limiter)
+            max_flood_sleep: Максимальное время автоматического ожидания FloodWait
+                (TELEGRAM_MAX_FLOOD_SLEEP, по умолчанию 60 секунд)
+        """
+        # Встроенное ожидание Telethon отключается, чтобы все FloodWait проходили через ограничитель
+        kwargs['flood_sleep_threshold'] = 0
+        super().__init__(*args, **kwargs)
+        self._init_rate_limit(limiter, max_flood_sleep)
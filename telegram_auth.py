@@ -9,6 +9,7 @@ import shutil
 from telethon import TelegramClient
 from telethon.errors import SessionPasswordNeededError, AuthRestartError, PhoneCodeExpiredError, \
     PhoneCodeInvalidError, FloodWaitError
+from rate_limiter import RateLimitedTelethonClient
 
 # Настройка логирования
 logging.basicConfig(
@@ -54,7 +55,8 @@ class TelegramAuthHandler:
         async with self._session_lock:
             if self._client is None or not self._client.is_connected():
                 # Создаем клиент с указанным именем сессии
-                self._client = TelegramClient(
+                # Запросы авторизации учитываются общим ограничителем частоты
+                self._client = RateLimitedTelethonClient(
                     self.session_path, 
                     self.api_id, 
                     self.api_hash, 
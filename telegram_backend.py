@@ -0,0 +1,574 @@
+import os
+import json
+import random
+import asyncio
+import logging
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional
+from telethon.errors import FloodWaitError, MessageIdInvalidError, ChannelInvalidError
+from telethon.tl.functions.messages import GetHistoryRequest
+from rate_limiter import RateLimiter, RateLimitedMixin, RateLimitedTelethonClient
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Количество сообщений в одной странице истории (как у messages.getHistory)
+HISTORY_PAGE_SIZE = 100
+
+class FakeDataset:
+    """
+    Набор каналов, сообщений и комментариев для автономного бэкенда
+    
+    Формат (JSON):
+        {"channels": [{"id", "access_hash", "username", "title", "about",
+                       "participants_count", "date", "photo",
+                       "messages": [{"id", "date", "text", "views", "forwards", "replies",
+                                     "media", "pinned", "action"}],
+                       "replies": {"<id поста>": [{"id", "user_id", "date", "text", "reply_to_msg_id"}]}}]}
+    
+    Даты хранятся в Unix time. Поле replies сообщения равно null, если у поста нет обсуждения.
+    """
+    
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        """
+        Инициализация набора данных
+        
+        Args:
+            data: Данные в формате, описанном выше
+        """
+        self.channels = {}
+        for channel in (data or {}).get('channels', []):
+            self.add_channel(channel)
+    
+    def add_channel(self, channel: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Добавление канала или обновление метаданных существующего
+        
+        Args:
+            channel: Словарь с данными канала
+        
+        Returns:
+            Запись канала в наборе
+        """
+        stored = self.channels.get(channel['id'])
+        if stored is None:
+            stored = {'messages': {}, 'replies': {}}
+            self.channels[channel['id']] = stored
+        
+        for key, value in channel.items():
+            if key == 'messages':
+                for message in value:
+                    stored['messages'][message['id']] = message
+            elif key == 'replies':
+                for post_id, replies in value.items():
+                    thread = stored['replies'].setdefault(int(post_id), {})
+                    for reply in replies:
+                        thread[reply['id']] = reply
+            else:
+                stored[key] = value
+        
+        return stored
+    
+    def find_channel(self, identifier) -> Optional[Dict[str, Any]]:
+        """
+        Поиск канала по ID или username
+        
+        Args:
+            identifier: Числовой ID или username (с @ или без)
+        
+        Returns:
+            Запись канала или None
+        """
+        if isinstance(identifier, int):
+            return self.channels.get(identifier)
+        
+        username = str(identifier).lstrip('@').lower()
+        for channel in self.channels.values():
+            if (channel.get('username') or '').lower() == username:
+                return channel
+        return None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Преобразование в формат для сохранения в JSON"""
+        channels = []
+        for channel in self.channels.values():
+            item = {key: value for key, value in channel.items() if key not in ('messages', 'replies')}
+            item['messages'] = sorted(channel['messages'].values(), key=lambda message: message['id'])
+            item['replies'] = {
+                str(post_id): sorted(thread.values(), key=lambda reply: reply['id'])
+                for post_id, thread in channel['replies'].items()
+            }
+            channels.append(item)
+        return {'channels': channels}
+    
+    @classmethod
+    def load(cls, path: str) -> 'FakeDataset':
+        """Загрузка набора данных из JSON-файла"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+    
+    def save(self, path: str):
+        """Сохранение набора данных в JSON-файл"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+    
+    @classmethod
+    def synthetic(cls, channels: int = 1, messages: int = 1000, days: int = 180,
+                  max_replies: int = 50, seed: int = 0) -> 'FakeDataset':
+        """
+        Генерация синтетического набора данных
+        
+        Args:
+            channels: Количество каналов (username fake_channel_1, fake_channel_2, ...)
+            messages: Количество постов в каждом канале
+            days: Период, на который равномерно распределяются посты
+            max_replies: Максимальное количество комментариев к посту
+            seed: Зерно генератора случайных чисел
+        
+        Returns:
+            Набор данных
+        """
+        rnd = random.Random(seed)
+        now = int(datetime.now(timezone.utc).timestamp())
+        step = max(1, days * 86400 // max(1, messages))
+        dataset = cls()
+        
+        for index in range(1, channels + 1):
+            channel_id = 1000000000 + index
+            posts = []
+            replies = {}
+            reply_id = messages + 1
+            
+            for message_id in range(1, messages + 1):
+                date = now - (messages - message_id) * step
+                count = rnd.randint(0, max_replies) if rnd.random() < 0.7 else None
+                posts.append({
+                    'id': message_id,
+                    'date': date,
+                    'text': f"Пост {message_id} канала {index}",
+                    'views': rnd.randint(100, 10000),
+                    'forwards': rnd.randint(0, 100),
+                    'replies': count,
+                    'media': rnd.choice([None, None, 'Photo', 'Document', 'WebPage']),
+                    'pinned': False,
+                    'action': False
+                })
+                
+                if count:
+                    replies[str(message_id)] = [{
+                        'id': reply_id + k,
+                        'user_id': rnd.randint(1, 5000),
+                        'date': date + 60 * (k + 1),
+                        'text': f"Комментарий {k + 1} к посту {message_id}",
+                        'reply_to_msg_id': message_id
+                    } for k in range(count)]
+                    reply_id += count
+            
+            dataset.add_channel({
+                'id': channel_id,
+                'access_hash': rnd.getrandbits(62),
+                'username': f"fake_channel_{index}",
+                'title': f"Fake channel {index}",
+                'about': "Синтетический канал для нагрузочного тестирования",
+                'participants_count': rnd.randint(1000, 100000),
+                'date': now - (days + 30) * 86400,
+                'photo': False,
+                'messages': posts,
+                'replies': replies
+            })
+        
+        return dataset
+
+class FakeTelegramBackend:
+    """
+    Автономная замена клиента Telethon
+    
+    Реализует подмножество API клиента, которое использует TelegramClient: подключение,
+    get_entity, get_messages, iter_messages и вызов запросов GetFullChannelRequest,
+    GetHistoryRequest, GetRepliesRequest и GetMessagesViewsRequest. Каждый запрос
+    выполняется с заданной задержкой и с заданной вероятностью завершается FloodWaitError.
+    """
+    
+    def __init__(self, dataset: Optional[FakeDataset] = None, latency: float = 0.0, jitter: float = 0.0,
+                 flood_wait_rate: float = 0.0, flood_wait_seconds: int = 1, seed: int = 0):
+        """
+        Инициализация бэкенда
+        
+        Args:
+            dataset: Набор данных (по умолчанию синтетический)
+            latency: Задержка каждого запроса в секундах
+            jitter: Случайная добавка к задержке в секундах
+            flood_wait_rate: Вероятность FloodWaitError для каждого запроса
+            flood_wait_seconds: Время ожидания во внедряемых FloodWaitError
+            seed: Зерно генератора случайных чисел для воспроизводимости
+        """
+        self.dataset = dataset if dataset is not None else FakeDataset.synthetic()
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_wait_rate = flood_wait_rate
+        self.flood_wait_seconds = flood_wait_seconds
+        self._random = random.Random(seed)
+        self._connected = False
+        self.stats = {'requests': 0, 'flood_waits': 0}
+    
+    async def connect(self):
+        """Подключение (без сетевых операций)"""
+        self._connected = True
+    
+    def is_connected(self) -> bool:
+        """Состояние подключения"""
+        return self._connected
+    
+    async def disconnect(self):
+        """Отключение"""
+        self._connected = False
+    
+    async def is_user_authorized(self) -> bool:
+        """Автономный бэкенд всегда авторизован"""
+        return True
+    
+    async def __call__(self, request, ordered=False, flood_sleep_threshold=None):
+        """Выполнение запроса с имитацией задержки и FloodWait"""
+        self.stats['requests'] += 1
+        
+        delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        if self.flood_wait_rate and self._random.random() < self.flood_wait_rate:
+            self.stats['flood_waits'] += 1
+            raise FloodWaitError(request=request, capture=self.flood_wait_seconds)
+        
+        handler = getattr(self, '_handle_' + type(request).__name__, None)
+        if handler is None:
+            raise NotImplementedError(f"Запрос {type(request).__name__} не поддерживается автономным бэкендом")
+        return handler(request)
+    
+    def _get_channel(self, peer) -> Dict[str, Any]:
+        """Поиск канала по InputPeerChannel/InputChannel"""
+        channel = self.dataset.find_channel(getattr(peer, 'channel_id', peer))
+        if channel is None:
+            raise ChannelInvalidError(request=None)
+        return channel
+    
+    def _make_channel(self, channel: Dict[str, Any]) -> SimpleNamespace:
+        """Объект канала в форме telethon.tl.types.Channel"""
+        return SimpleNamespace(
+            id=channel['id'],
+            access_hash=channel.get('access_hash', 0),
+            username=channel.get('username'),
+            title=channel.get('title', ''),
+            date=datetime.fromtimestamp(channel.get('date', 0), timezone.utc),
+            photo=channel.get('photo') or None,
+            restricted=False
+        )
+    
+    def _make_message(self, message: Dict[str, Any]) -> SimpleNamespace:
+        """Объект сообщения в форме telethon.tl.custom.Message"""
+        media = None
+        if message.get('media'):
+            media = type('MessageMedia' + message['media'], (), {})()
+        
+        replies = None
+        if message.get('replies') is not None:
+            replies = SimpleNamespace(replies=message['replies'])
+        
+        return SimpleNamespace(
+            id=message['id'],
+            date=datetime.fromtimestamp(message['date'], timezone.utc),
+            text=message.get('text', ''),
+            message=message.get('text', ''),
+            views=message.get('views'),
+            forwards=message.get('forwards'),
+            replies=replies,
+            media=media,
+            pinned=message.get('pinned', False),
+            action=message.get('action') or None,
+            from_id=SimpleNamespace(user_id=message['user_id']) if message.get('user_id') else None,
+            reply_to_msg_id=message.get('reply_to_msg_id')
+        )
+    
+    def _handle_GetFullChannelRequest(self, request):
+        """channels.getFullChannel"""
+        channel = self._get_channel(request.channel)
+        return SimpleNamespace(
+            full_chat=SimpleNamespace(
+                id=channel['id'],
+                about=channel.get('about', ''),
+                participants_count=channel.get('participants_count', 0)
+            ),
+            chats=[self._make_channel(channel)],
+            users=[]
+        )
+    
+    def _handle_GetHistoryRequest(self, request):
+        """
+        messages.getHistory
+        
+        Упрощенная семантика: страница по возрастанию ID после offset_id
+        в пределах (min_id, max_id).
+        """
+        channel = self._get_channel(request.peer)
+        lower = max(request.min_id or 0, request.offset_id or 0)
+        upper = request.max_id or float('inf')
+        ids = sorted(message_id for message_id in channel['messages'] if lower < message_id < upper)
+        
+        messages = [self._make_message(channel['messages'][message_id]) for message_id in ids[:request.limit]]
+        return SimpleNamespace(messages=messages, chats=[self._make_channel(channel)], users=[])
+    
+    def _handle_GetRepliesRequest(self, request):
+        """messages.getReplies: комментарии от новых к старым, пагинация через offset_id"""
+        channel = self._get_channel(request.peer)
+        post = channel['messages'].get(request.msg_id)
+        if post is None or post.get('replies') is None:
+            raise MessageIdInvalidError(request=request)
+        
+        thread = channel['replies'].get(request.msg_id, {})
+        ids = sorted(
+            (reply_id for reply_id in thread
+             if reply_id > (request.min_id or 0) and (not request.offset_id or reply_id < request.offset_id)),
+            reverse=True
+        )
+        
+        messages = [self._make_message(thread[reply_id]) for reply_id in ids[:request.limit]]
+        return SimpleNamespace(messages=messages, chats=[self._make_channel(channel)], users=[])
+    
+    def _handle_GetMessagesViewsRequest(self, request):
+        """messages.getMessagesViews"""
+        channel = self._get_channel(request.peer)
+        views = []
+        for message_id in request.id:
+            message = channel['messages'].get(message_id, {})
+            replies = message.get('replies')
+            views.append(SimpleNamespace(
+                views=message.get('views'),
+                forwards=message.get('forwards'),
+                replies=SimpleNamespace(replies=replies) if replies is not None else None
+            ))
+        return SimpleNamespace(views=views, chats=[], users=[])
+    
+    async def get_entity(self, entity):
+        """Разрешение канала по username или PeerChannel"""
+        channel = self.dataset.find_channel(getattr(entity, 'channel_id', entity))
+        if channel is None:
+            raise ValueError(f'Cannot find any entity corresponding to "{entity}"')
+        return self._make_channel(channel)
+    
+    async def iter_messages(self, entity, limit=None, offset_date=None, min_id=0, max_id=0,
+                            reverse=False, wait_time=None, **kwargs):
+        """
+        Итерация по сообщениям канала страницами GetHistoryRequest
+        
+        Поддерживаются параметры, которые использует TelegramClient: limit, offset_date,
+        min_id, max_id и reverse.
+        """
+        channel = self._get_channel(entity)
+        messages = channel['messages']
+        
+        # Границы по дате переводятся в границы по ID
+        if offset_date is not None:
+            timestamp = offset_date.timestamp()
+            if reverse:
+                min_id = max(min_id or 0, max(
+                    (message_id for message_id, message in messages.items() if message['date'] < timestamp),
+                    default=0
+                ))
+            else:
+                max_id = min(max_id or float('inf'), min(
+                    (message_id for message_id, message in messages.items() if message['date'] >= timestamp),
+                    default=float('inf')
+                ))
+        
+        if not reverse:
+            # Новые сообщения первыми: одна выборка без постраничной загрузки
+            ids = sorted(
+                (message_id for message_id in messages
+                 if message_id > (min_id or 0) and (not max_id or message_id < max_id)),
+                reverse=True
+            )
+            if limit is not None:
+                ids = ids[:limit]
+            if ids:
+                await self(GetHistoryRequest(entity, 0, None, 0, len(ids), 0, 0, 0))
+            for message_id in ids:
+                yield self._make_message(messages[message_id])
+            return
+        
+        offset_id = 0
+        returned = 0
+        while limit is None or returned < limit:
+            page_size = HISTORY_PAGE_SIZE if limit is None else min(HISTORY_PAGE_SIZE, limit - returned)
+            page = await self(GetHistoryRequest(entity, offset_id, None, 0, page_size, max_id or 0, min_id or 0, 0))
+            
+            for message in page.messages:
+                yield message
+            
+            returned += len(page.messages)
+            if len(page.messages) < page_size:
+                break
+            offset_id = page.messages[-1].id
+    
+    async def get_messages(self, entity, limit=None, **kwargs) -> List[SimpleNamespace]:
+        """Получение списка сообщений (см. iter_messages)"""
+        return [message async for message in self.iter_messages(entity, limit=limit, **kwargs)]
+
+class RateLimitedFakeBackend(RateLimitedMixin, FakeTelegramBackend):
+    """Автономный бэкенд с тем же ограничением частоты, что и у клиента Telethon"""
+    
+    def __init__(self, *args, limiter: Optional[RateLimiter] = None,
+                 max_flood_sleep: Optional[int] = None, **kwargs):
+        """
+        Инициализация бэкенда
+        
+        Args:
+            *args, **kwargs: Аргументы FakeTelegramBackend
+            limiter: Ограничитель частоты (по умолчанию общий rate_limiter)
+            max_flood_sleep: Максимальное время автоматического ожидания FloodWait
+        """
+        super().__init__(*args, **kwargs)
+        self._init_rate_limit(limiter, max_flood_sleep)
+
+class RecordingTelethonClient(RateLimitedTelethonClient):
+    """
+    Клиент Telethon, записывающий ответы Telegram в набор данных для автономного бэкенда
+    
+    Записываются каналы, сообщения из любых выборок истории и комментарии из
+    GetRepliesRequest. Набор сохраняется при отключении и дополняется при повторной записи.
+    """
+    
+    def __init__(self, record_path: str, *args, **kwargs):
+        """
+        Инициализация клиента
+        
+        Args:
+            record_path: Путь к JSON-файлу набора данных
+            *args, **kwargs: Аргументы RateLimitedTelethonClient
+        """
+        super().__init__(*args, **kwargs)
+        self.record_path = record_path
+        self.recording = FakeDataset.load(record_path) if os.path.exists(record_path) else FakeDataset()
+    
+    async def __call__(self, request, ordered=False, flood_sleep_threshold=None):
+        """Выполнение запроса с записью ответа"""
+        result = await super().__call__(request, ordered=ordered, flood_sleep_threshold=flood_sleep_threshold)
+        
+        try:
+            self._record(request, result)
+        except Exception as e:
+            logger.warning(f"Не удалось записать ответ {type(request).__name__}: {str(e)}")
+        
+        return result
+    
+    def _record(self, request, result):
+        """Преобразование ответа Telegram в записи набора данных"""
+        request_name = type(request).__name__
+        
+        for chat in getattr(result, 'chats', None) or []:
+            if getattr(chat, 'broadcast', True) and getattr(chat, 'access_hash', None) is not None:
+                self.recording.add_channel({
+                    'id': chat.id,
+                    'access_hash': chat.access_hash,
+                    'username': getattr(chat, 'username', None),
+                    'title': getattr(chat, 'title', ''),
+                    'date': int(chat.date.timestamp()) if getattr(chat, 'date', None) else 0,
+                    'photo': bool(getattr(chat, 'photo', None))
+                })
+        
+        if request_name == 'GetFullChannelRequest':
+            self.recording.add_channel({
+                'id': result.full_chat.id,
+                'about': result.full_chat.about,
+                'participants_count': result.full_chat.participants_count
+            })
+            return
+        
+        messages = getattr(result, 'messages', None)
+        if not messages:
+            return
+        
+        if request_name == 'GetRepliesRequest':
+            channel_id = request.peer.channel_id
+            self.recording.add_channel({
+                'id': channel_id,
+                'replies': {str(request.msg_id): [self._record_message(message) for message in messages]}
+            })
+            return
+        
+        # Выборки истории канала (GetHistoryRequest, GetMessagesRequest и т.п.)
+        by_channel = {}
+        for message in messages:
+            channel_id = getattr(getattr(message, 'peer_id', None), 'channel_id', None)
+            if channel_id is not None:
+                by_channel.setdefault(channel_id, []).append(self._record_message(message))
+        
+        for channel_id, records in by_channel.items():
+            self.recording.add_channel({'id': channel_id, 'messages': records})
+    
+    @staticmethod
+    def _record_message(message) -> Dict[str, Any]:
+        """Сериализация сообщения Telethon"""
+        media = getattr(message, 'media', None)
+        replies = getattr(message, 'replies', None)
+        reply_to = getattr(message, 'reply_to', None)
+        
+        return {
+            'id': message.id,
+            'date': int(message.date.timestamp()) if getattr(message, 'date', None) else 0,
+            'text': getattr(message, 'message', None) or '',
+            'views': getattr(message, 'views', None),
+            'forwards': getattr(message, 'forwards', None),
+            'replies': replies.replies if replies is not None else None,
+            'media': type(media).__name__.replace('MessageMedia', '') if media else None,
+            'pinned': bool(getattr(message, 'pinned', False)),
+            'action': getattr(message, 'action', None) is not None,
+            'user_id': getattr(getattr(message, 'from_id', None), 'user_id', None),
+            'reply_to_msg_id': getattr(reply_to, 'reply_to_msg_id', None)
+        }
+    
+    def save(self):
+        """Сохранение записанного набора данных"""
+        self.recording.save(self.record_path)
+        logger.info(f"Записанные ответы Telegram сохранены в {self.record_path}")
+    
+    def disconnect(self):
+        """Сохранение записи и отключение от Telegram"""
+        self.save()
+        return super().disconnect()
+
+def create_backend(session: str, api_id: int, api_hash: str, name: Optional[str] = None,
+                   dataset_path: Optional[str] = None):
+    """
+    Создание клиента Telegram в соответствии с выбранным бэкендом
+    
+    Args:
+        session: Путь к файлу сессии Telethon
+        api_id: API ID приложения Telegram
+        api_hash: API Hash приложения Telegram
+        name: Бэкенд: telethon (по умолчанию), fake или record (TELEGRAM_BACKEND)
+        dataset_path: JSON-файл набора данных для fake и record (TELEGRAM_BACKEND_DATASET)
+    
+    Returns:
+        Клиент с API Telethon
+    """
+    name = name or os.getenv('TELEGRAM_BACKEND', 'telethon')
+    dataset_path = dataset_path or os.getenv('TELEGRAM_BACKEND_DATASET')
+    
+    if name == 'fake':
+        dataset = FakeDataset.load(dataset_path) if dataset_path else FakeDataset.synthetic()
+        logger.info(f"Используется автономный бэкенд Telegram ({dataset_path or 'синтетические данные'})")
+        return RateLimitedFakeBackend(
+            dataset,
+            latency=float(os.getenv('TELEGRAM_FAKE_LATENCY', 0.05)),
+            flood_wait_rate=float(os.getenv('TELEGRAM_FAKE_FLOOD_RATE', 0))
+        )
+    
+    if name == 'record':
+        record_path = dataset_path or os.path.join('data', 'telegram_recording.json')
+        logger.info(f"Ответы Telegram записываются в {record_path}")
+        return RecordingTelethonClient(record_path, session, api_id, api_hash, device_model="Analytics Tool")
+    
+    return RateLimitedTelethonClient(session, api_id, api_hash, device_model="Analytics Tool")
@@ -1,11 +1,15 @@
 import os
 import logging
-import time
 import asyncio
-from telethon import TelegramClient as TelethonClient
+import threading
 from telethon.errors import FloodWaitError, ChatAdminRequiredError, MessageIdInvalidError
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Callable
+from telethon.tl.types import InputPeerChannel, PeerChannel
+from telethon.errors import ChannelInvalidError
+from rate_limiter import rate_limiter
+from telegram_backend import create_backend
+from database import Database
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
@@ -14,160 +18,523 @@ logger = logging.getLogger(__name__)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SESSION_FILE = os.path.join(BASE_DIR, 'telegram_analytics_bot')
 
+# Максимальное количество комментариев, возвращаемое одним запросом GetRepliesRequest
+COMMENTS_PAGE_SIZE = 100
+
+# Максимальное количество постов в одном запросе GetMessagesViewsRequest
+METRICS_BATCH_SIZE = 100
+
 class TelegramClient:
     """Класс для работы с Telegram API через Telethon"""
     
-    def __init__(self):
-        """Инициализация клиента Telegram API"""
+    def __init__(self, comments_concurrency: Optional[int] = None, comments_per_post: Optional[int] = None,
+                 entity_cache: Optional[Database] = None, backend: Optional[Callable[[], Any]] = None):
+        """
+        Инициализация клиента Telegram API
+        
+        Args:
+            comments_concurrency: Максимальное количество одновременных запросов комментариев
+            comments_per_post: Максимальное количество комментариев к одному посту (0 - без ограничения)
+            entity_cache: База данных для кэша сущностей каналов (по умолчанию отдельный экземпляр)
+            backend: Фабрика клиента с API Telethon. По умолчанию клиент создается по
+                переменной окружения TELEGRAM_BACKEND (telethon, fake или record)
+        """
         self.api_id = int(os.getenv('TELEGRAM_API_ID', 0))
         self.api_hash = os.getenv('TELEGRAM_API_HASH', '')
+        self.comments_concurrency = max(1, comments_concurrency or int(os.getenv('TELEGRAM_COMMENTS_CONCURRENCY', 5)))
+        self.comments_per_post = comments_per_post if comments_per_post is not None \
+            else int(os.getenv('TELEGRAM_COMMENTS_PER_POST', 1000))
+        self.entity_cache = entity_cache if entity_cache is not None else Database()
+        self.entity_cache_ttl = int(os.getenv('TELEGRAM_ENTITY_CACHE_TTL', 7 * 24 * 3600))
+        self.backend = backend
         self.client = None
         self.SESSION_FILE = SESSION_FILE  # Сделать SESSION_FILE доступным как свойство класса
+        
+        # Постоянное соединение обслуживается отдельным потоком с собственным циклом событий
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.RLock()
+        self._connect_lock = None
+        self.health = {
+            'authorized': None,
+            'connected_since': None,
+            'reconnects': 0,
+            'last_error': None,
+            'last_error_date': None
+        }
         logger.info(f"Используется файл сессии: {SESSION_FILE}")
     
-    def _run_async(self, coro):
-        """Запускает корутину в синхронном контексте, создавая новый цикл событий при необходимости"""
-        try:
-            # Попытка получить текущий цикл событий
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            # Если цикла нет, создаем новый
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """
+        Запуск фонового потока с циклом событий, в котором живет постоянное соединение
+        
+        Returns:
+            Цикл событий клиента
+        """
+        with self._loop_lock:
+            if self._loop is None or self._loop_thread is None or not self._loop_thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name='telegram-client-loop',
+                    daemon=True
+                )
+                self._loop_thread.start()
+                logger.info("Запущен фоновый цикл событий Telegram клиента")
         
-        return loop.run_until_complete(coro)
+        return self._loop
+    
+    def _run_async(self, coro):
+        """Выполняет корутину в фоновом цикле событий клиента и ожидает результат"""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
     
     async def _connect(self):
-        """Подключение к Telegram API"""
-        if self.client is None or not self.client.is_connected():
+        """Подключение к Telegram API (повторно используется между вызовами)"""
+        # Блокировка создается внутри цикла событий клиента
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        
+        async with self._connect_lock:
+            if self.client is not None and self.client.is_connected():
+                return
+            
             logger.info("Установка соединения с Telegram API...")
             
             # Создание клиента с именем сессии 'telegram_analytics_bot' и device_model
-            self.client = TelethonClient(SESSION_FILE, self.api_id, self.api_hash, device_model="Analytics Tool")
+            # Все запросы клиента проходят через общий ограничитель частоты
+            if self.backend is not None:
+                self.client = self.backend()
+            else:
+                self.client = create_backend(SESSION_FILE, self.api_id, self.api_hash)
             
             # Подключение к Telegram API
             await self.client.connect()
             
             # Проверка авторизации
             if not await self.client.is_user_authorized():
+                await self.client.disconnect()
+                self.client = None
+                self.health['authorized'] = False
                 logger.error("Телефон не авторизован. Требуется авторизация через веб-интерфейс или phone_login.py")
                 raise Exception("Не удалось авторизоваться в Telegram API. Перейдите на страницу /initialize для авторизации")
-                
+            
+            self.health['authorized'] = True
+            self.health['connected_since'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             logger.info("Соединение установлено успешно")
     
     async def _disconnect(self):
         """Отключение от Telegram API"""
         if self.client and self.client.is_connected():
             await self.client.disconnect()
-            self.client = None
+        self.client = None
+        self.health['connected_since'] = None
     
-    async def _get_channel_info_and_posts_async(self, channel_identifier: str, days: int = 180) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    async def _with_reconnect(self, func, *args, **kwargs):
         """
-        Получение информации о канале и его постах за один раз
+        Выполнение операции поверх постоянного соединения
+        
+        При обрыве связи соединение пересоздается и операция повторяется один раз.
         
         Args:
-            channel_identifier: Username канала (с @ или без) или его ID
-            days: Количество дней для выборки постов
+            func: Асинхронная функция, выполняющая запросы к Telegram API
+            *args, **kwargs: Аргументы функции
             
         Returns:
-            Кортеж (channel_info, posts)
+            Результат функции
         """
-        try:
-            await self._connect()
-            
-            # Получение информации о канале
-            logger.info(f"Получение информации о канале {channel_identifier}...")
-            entity = await self.client.get_entity(channel_identifier)
-            
-            # Получение полной информации
-            full_entity = await self.client(GetFullChannelRequest(entity))
-            
-            # Формирование структуры данных о канале
-            channel_info = {
-                'id': entity.id,
-                'name': entity.title,
-                'username': entity.username,
-                'description': full_entity.full_chat.about,
-                'subscribers': full_entity.full_chat.participants_count,
-                'date_created': entity.date.strftime('%Y-%m-%d'),
-                'photo_url': None,
-                'is_private': getattr(entity, 'restricted', False)
-            }
-            
-            # Получение URL фото канала, если есть
-            if hasattr(entity, 'photo') and entity.photo:
-                channel_info['photo_url'] = f"https://t.me/{entity.username}"
-            
-            # Вычисление даты начала периода
-            start_date = datetime.now() - timedelta(days=days)
-            
-            # Получение постов
-            posts = []
-            post_count = 0
-            total_posts = 1  # Начальное значение
+        for attempt in range(2):
+            try:
+                await self._connect()
+                return await func(*args, **kwargs)
+            except (ConnectionError, OSError, asyncio.TimeoutError) as e:
+                self.health['last_error'] = str(e)
+                self.health['last_error_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                await self._disconnect()
+                
+                if attempt > 0:
+                    raise
+                
+                self.health['reconnects'] += 1
+                logger.warning(f"Соединение с Telegram API потеряно ({str(e)}), переподключение...")
+    
+    def get_health(self) -> Dict[str, Any]:
+        """
+        Состояние постоянного соединения с Telegram API
+        
+        Returns:
+            Словарь с информацией о соединении
+        """
+        health = dict(self.health)
+        health['connected'] = self.client is not None and self.client.is_connected()
+        health['loop_running'] = self._loop_thread is not None and self._loop_thread.is_alive()
+        health['rate_limits'] = rate_limiter.get_stats()
+        return health
+    
+    def close(self):
+        """Закрытие постоянного соединения и остановка фонового цикла событий"""
+        with self._loop_lock:
+            if self._loop is None or self._loop_thread is None or not self._loop_thread.is_alive():
+                return
+            
+            try:
+                asyncio.run_coroutine_threadsafe(self._disconnect(), self._loop).result(timeout=10)
+            except Exception as e:
+                logger.warning(f"Ошибка при отключении от Telegram API: {str(e)}")
+            
+            # Подключение кэша сущностей принадлежит потоку цикла событий и возвращается в пул из него же
+            self._loop.call_soon_threadsafe(self.entity_cache.release_connection)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout=10)
+            self._loop = None
+            self._loop_thread = None
+            self._connect_lock = None
+            logger.info("Соединение с Telegram API закрыто")
+    
+    async def _iter_channel_posts(self, entity, days: int = 180, min_id: Optional[int] = None,
+                                  rescan_hours: int = 0):
+        """
+        Асинхронный генератор постов канала за период с учетом курсора синхронизации
+        
+        Args:
+            entity: Сущность канала
+            days: Количество дней для выборки постов
+            min_id: ID последнего уже сохраненного поста. Если указан, загружаются
+                только более новые посты (инкрементальная синхронизация)
+            rescan_hours: Окно (в часах) повторной загрузки уже известных постов
+                для обновления счетчиков. Используется только вместе с min_id
             
+        Yields:
+            Словари с информацией о постах
+        """
+        # Вычисление даты начала периода
+        start_date = datetime.now() - timedelta(days=days)
+        
+        if min_id:
+            if rescan_hours > 0:
+                # Повторная загрузка недавних известных постов для обновления просмотров и реакций
+                rescan_start = max(start_date, datetime.now() - timedelta(hours=rescan_hours))
+                logger.info(f"Обновление постов за последние {rescan_hours} ч. (до ID {min_id})...")
+                async for post in self._iter_posts(entity, offset_date=rescan_start, max_id=min_id + 1):
+                    yield post
+            
+            logger.info(f"Получение постов новее ID {min_id}...")
+            async for post in self._iter_posts(entity, offset_date=start_date, min_id=min_id):
+                yield post
+        else:
             logger.info(f"Получение постов за последние {days} дней...")
+            async for post in self._iter_posts(entity, offset_date=start_date):
+                yield post
+    
+    async def _produce_post_batches(self, emit, entity, days: int, min_id: Optional[int],
+                                    rescan_hours: int, batch_size: int):
+        """
+        Производитель для потоковой загрузки: собирает посты в пакеты и передает их потребителю
+        
+        Args:
+            emit: Корутина, передающая пакет в очередь потребителя
+            entity: Сущность канала
+            days: Количество дней для выборки постов
+            min_id: ID последнего уже сохраненного поста
+            rescan_hours: Окно повторной загрузки известных постов в часах
+            batch_size: Размер пакета постов
+        """
+        batch = []
+        total = 0
+        
+        async for post in self._iter_channel_posts(entity, days, min_id, rescan_hours):
+            batch.append(post)
+            if len(batch) >= batch_size:
+                total += len(batch)
+                await emit(batch)
+                batch = []
+        
+        if batch:
+            total += len(batch)
+            await emit(batch)
+        
+        logger.info(f"Загружено {total} постов")
+    
+    def _stream(self, producer, *args, queue_size: int = 4):
+        """
+        Синхронный генератор поверх асинхронного производителя
+        
+        Производитель выполняется в фоновом цикле событий и складывает элементы в
+        ограниченную очередь, поэтому объем данных в памяти не зависит от их общего количества.
+        
+        Args:
+            producer: Асинхронная функция вида producer(emit, *args)
+            *args: Аргументы производителя
+            queue_size: Максимальное количество элементов в очереди
             
-            async for message in self.client.iter_messages(entity, offset_date=start_date, reverse=True):
-                if post_count == 0:
-                    # Примерная оценка количества постов
-                    try:
-                        total_posts = message.id
-                    except:
-                        total_posts = 100  # Примерная оценка, если не удалось получить ID
-                
-                # Пропуск служебных сообщений
-                if message.action:
-                    continue
-                
-                # Добавление поста в список
-                post = {
-                    'id': message.id,
-                    'channel_id': entity.id,
-                    'date': message.date.strftime('%Y-%m-%d %H:%m:%С'),
-                    'text': message.text or '',
-                    'views': getattr(message, 'views', 0),
-                    'forwards': getattr(message, 'forwards', 0),
-                    'replies': message.replies.replies if hasattr(message, 'replies') and message.replies else 0,
-                    'has_media': bool(message.media),
-                    'media_type': self._get_media_type(message),
-                    'is_pinned': message.pinned
-                }
-                
-                posts.append(post)
-                post_count += 1
-                
-                # Логирование прогресса
-                if post_count % 10 == 0 or post_count == 1:
-                    progress = (post_count / max(total_posts, 1) * 100)
-                    logger.info(f"Загрузка постов: {post_count}/{total_posts} ({int(progress)}%)")
-                
-                # Задержка для избежания ограничений API (менее частая)
-                if post_count % 200 == 0:
-                    time.sleep(1)
+        Yields:
+            Элементы, переданные производителем через emit
+        """
+        loop = self._ensure_loop()
+        queue = self._run_async(self._create_queue(queue_size))
+        end_of_stream = object()
+        
+        async def run():
+            try:
+                await self._connect()
+                await producer(queue.put, *args)
+                await queue.put(end_of_stream)
+            except Exception as e:
+                await queue.put(e)
+        
+        future = asyncio.run_coroutine_threadsafe(run(), loop)
+        try:
+            while True:
+                item = self._run_async(queue.get())
+                if item is end_of_stream:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Остановка производителя, если потребитель прервал чтение
+            future.cancel()
+    
+    async def _create_queue(self, maxsize: int) -> asyncio.Queue:
+        """Создание очереди внутри цикла событий клиента"""
+        return asyncio.Queue(maxsize=maxsize)
+    
+    def stream_channel_info_and_posts(self, channel_identifier: str, days: int = 180,
+                                      min_id: Optional[int] = None, rescan_hours: int = 0,
+                                      batch_size: int = 200, queue_size: int = 4) -> Tuple[Dict[str, Any], Iterator[List[Dict[str, Any]]]]:
+        """
+        Потоковое получение постов канала пакетами
+        
+        Загрузка следующих пакетов продолжается, пока потребитель обрабатывает текущий.
+        
+        Args:
+            channel_identifier: Username канала (с @ или без) или его ID
+            days: Количество дней для выборки постов
+            min_id: ID последнего уже сохраненного поста (для инкрементальной синхронизации)
+            rescan_hours: Окно повторной загрузки известных постов в часах
+            batch_size: Количество постов в пакете
+            queue_size: Максимальное количество пакетов, ожидающих обработки
             
-            logger.info(f"Загружено {len(posts)} постов")
+        Returns:
+            Кортеж (channel_info, итератор пакетов постов)
+        """
+        entity, channel_info = self._run_async(
+            self._with_reconnect(self._resolve_channel_async, channel_identifier)
+        )
+        batches = self._stream(
+            self._produce_post_batches, entity, days, min_id, rescan_hours, batch_size,
+            queue_size=queue_size
+        )
+        return channel_info, batches
+    
+    def get_channel_info_and_posts(self, channel_identifier: str, days: int = 180,
+                                   min_id: Optional[int] = None,
+                                   rescan_hours: int = 0) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Синхронная обертка для получения информации о канале и его постах за один запрос
+        
+        Args:
+            channel_identifier: Username канала (с @ или без) или его ID
+            days: Количество дней для выборки постов
+            min_id: ID последнего уже сохраненного поста (для инкрементальной синхронизации)
+            rescan_hours: Окно повторной загрузки известных постов в часах
+            
+        Returns:
+            Кортеж (channel_info, posts)
+        """
+        try:
+            channel_info, batches = self.stream_channel_info_and_posts(channel_identifier, days, min_id, rescan_hours)
+            posts = [post for batch in batches for post in batch]
             return channel_info, posts
             
         except Exception as e:
             logger.error(f"Ошибка при получении данных канала: {str(e)}")
             raise
+    
+    async def _get_id_range_async(self, entity, days: int) -> Tuple[int, int]:
+        """
+        Определение диапазона ID сообщений канала за период
+        
+        Args:
+            entity: Сущность канала
+            days: Количество дней
             
-        finally:
-            await self._disconnect()
+        Returns:
+            Кортеж (ID последнего сообщения до начала периода, ID последнего сообщения канала).
+            Если за период нет сообщений, границы совпадают
+        """
+        start_date = datetime.now() - timedelta(days=days)
+        
+        latest = await self.client.get_messages(entity, limit=1)
+        if not latest:
+            return 0, 0
+        
+        # Первое сообщение после начала периода
+        first = await self.client.get_messages(entity, limit=1, offset_date=start_date, reverse=True)
+        if not first:
+            return latest[0].id, latest[0].id
+        
+        return first[0].id - 1, latest[0].id
     
-    def get_channel_info_and_posts(self, channel_identifier: str, days: int = 180) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    @staticmethod
+    def _split_id_range(low: int, high: int, shards: int, min_size: int = 1) -> List[Tuple[int, int]]:
         """
-        Синхронная обертка для получения информации о канале и его постах за один запрос
+        Разбиение диапазона ID на шарды примерно одинакового размера
+        
+        ID сообщений канала последовательны, поэтому равные по ширине диапазоны
+        содержат примерно одинаковое количество постов.
+        
+        Args:
+            low: Нижняя граница (не включается)
+            high: Верхняя граница (включается)
+            shards: Желаемое количество шардов
+            min_size: Минимальная ширина шарда
+            
+        Returns:
+            Список пар (min_id, max_id): min_id не включается, max_id включается
+        """
+        span = high - low
+        if span <= 0:
+            return []
+        
+        shards = max(1, min(shards, span // max(1, min_size)))
+        bounds = [low + span * i // shards for i in range(shards + 1)]
+        return [(bounds[i], bounds[i + 1]) for i in range(shards)]
+    
+    async def _prepare_backfill_async(self, channel_identifier, days: int, shards: int,
+                                      min_shard_size: int):
+        """
+        Разрешение канала и разбиение периода на шарды для параллельной загрузки
+        
+        Returns:
+            Кортеж (сущность канала, channel_info, список шардов)
+        """
+        entity, channel_info = await self._resolve_channel_async(channel_identifier)
+        low, high = await self._get_id_range_async(entity, days)
+        id_shards = self._split_id_range(low, high, shards, min_shard_size)
+        
+        logger.info(f"Диапазон ID {low + 1}-{high} разбит на {len(id_shards)} шардов")
+        return entity, channel_info, id_shards
+    
+    async def _produce_shard_batches(self, emit, entity, id_shards: List[Tuple[int, int]],
+                                     batch_size: int, concurrency: int):
+        """
+        Производитель для параллельной загрузки: каждый шард читается собственным итератором
+        
+        Args:
+            emit: Корутина, передающая элемент в очередь потребителя
+            entity: Сущность канала
+            id_shards: Список диапазонов ID (min_id не включается, max_id включается)
+            batch_size: Размер пакета постов
+            concurrency: Максимальное количество одновременно загружаемых шардов
+            
+        Элементы очереди - пары (номер шарда, пакет постов); пакет None означает,
+        что шард загружен полностью.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run(index: int, min_id: int, max_id: int):
+            async with semaphore:
+                batch = []
+                total = 0
+                
+                async for post in self._iter_posts(entity, min_id=min_id, max_id=max_id + 1):
+                    batch.append(post)
+                    if len(batch) >= batch_size:
+                        total += len(batch)
+                        await emit((index, batch))
+                        batch = []
+                        logger.info(f"Шард {index + 1}/{len(id_shards)} (ID {min_id + 1}-{max_id}): {total} постов")
+                
+                if batch:
+                    total += len(batch)
+                    await emit((index, batch))
+                
+                logger.info(f"Шард {index + 1}/{len(id_shards)} (ID {min_id + 1}-{max_id}) загружен: {total} постов")
+                await emit((index, None))
+        
+        await asyncio.gather(*(run(index, min_id, max_id) for index, (min_id, max_id) in enumerate(id_shards)))
+    
+    def stream_channel_backfill(self, channel_identifier: str, days: int = 180,
+                                shards: Optional[int] = None, concurrency: Optional[int] = None,
+                                batch_size: int = 200, queue_size: int = 4):
+        """
+        Параллельная загрузка истории канала по диапазонам ID сообщений
+        
+        Период разбивается на шарды, которые читаются одновременно в пределах лимитов
+        общего ограничителя частоты. Пакеты разных шардов приходят вперемешку.
         
         Args:
             channel_identifier: Username канала (с @ или без) или его ID
             days: Количество дней для выборки постов
+            shards: Количество шардов (по умолчанию вдвое больше concurrency)
+            concurrency: Максимальное количество одновременно загружаемых шардов
+                (TELEGRAM_BACKFILL_CONCURRENCY, по умолчанию 4)
+            batch_size: Количество постов в пакете
+            queue_size: Максимальное количество пакетов, ожидающих обработки
             
         Returns:
-            Кортеж (channel_info, posts)
+            Кортеж (channel_info, список шардов (min_id, max_id), итератор пар (номер шарда, пакет))
         """
-        return self._run_async(self._get_channel_info_and_posts_async(channel_identifier, days))
+        concurrency = max(1, concurrency or int(os.getenv('TELEGRAM_BACKFILL_CONCURRENCY', 4)))
+        shards = max(1, shards or concurrency * 2)
+        
+        entity, channel_info, id_shards = self._run_async(
+            self._with_reconnect(self._prepare_backfill_async, channel_identifier, days, shards, batch_size)
+        )
+        batches = self._stream(
+            self._produce_shard_batches, entity, id_shards, batch_size, concurrency,
+            queue_size=queue_size
+        )
+        return channel_info, id_shards, batches
+    
+    async def _iter_posts(self, entity, **iter_kwargs):
+        """
+        Асинхронный генератор постов канала в хронологическом порядке
+        
+        Args:
+            entity: Сущность канала
+            **iter_kwargs: Дополнительные параметры для iter_messages (offset_date, min_id, max_id)
+            
+        Yields:
+            Словари с информацией о постах
+        """
+        post_count = 0
+        total_posts = 1  # Начальное значение
+        
+        # Паузы между запросами истории обеспечивает ограничитель частоты, а не iter_messages
+        async for message in self.client.iter_messages(entity, reverse=True, wait_time=0, **iter_kwargs):
+            if post_count == 0:
+                # Примерная оценка количества постов
+                try:
+                    total_posts = message.id
+                except:
+                    total_posts = 100  # Примерная оценка, если не удалось получить ID
+            
+            # Пропуск служебных сообщений
+            if message.action:
+                continue
+            
+            yield {
+                'id': message.id,
+                'channel_id': entity.channel_id,
+                'date': message.date.strftime('%Y-%m-%d %H:%M:%S'),
+                'date_ts': int(message.date.timestamp()),
+                'text': message.text or '',
+                'views': getattr(message, 'views', 0),
+                'forwards': getattr(message, 'forwards', 0),
+                'replies': message.replies.replies if hasattr(message, 'replies') and message.replies else 0,
+                'has_media': bool(message.media),
+                'media_type': self._get_media_type(message),
+                'is_pinned': message.pinned
+            }
+            post_count += 1
+            
+            # Логирование прогресса
+            if post_count % 10 == 0 or post_count == 1:
+                progress = (post_count / max(total_posts, 1) * 100)
+                logger.info(f"Загрузка постов: {post_count}/{total_posts} ({int(progress)}%)")
+
     
     def _get_media_type(self, message) -> Optional[str]:
         """Определение типа медиа в сообщении"""
@@ -177,6 +544,75 @@ class TelegramClient:
         media_type = type(message.media).__name__
         return media_type.replace('MessageMedia', '').lower()
     
+    async def _get_input_entity(self, channel_identifier, use_cache: bool = True) -> InputPeerChannel:
+        """
+        Получение InputPeerChannel канала с использованием кэша сущностей
+        
+        Известные каналы разрешаются из кэша без запросов к Telegram API
+        (ResolveUsername имеет жесткие ограничения частоты).
+        
+        Args:
+            channel_identifier: Username канала (с @ или без) или его ID
+            use_cache: Использовать ли кэш
+            
+        Returns:
+            InputPeerChannel канала
+        """
+        if use_cache:
+            cached = self.entity_cache.get_cached_entity(channel_identifier, self.entity_cache_ttl)
+            if cached:
+                return InputPeerChannel(cached['telegram_id'], cached['access_hash'])
+        
+        # Числовые ID из БД относятся к каналам, а не к пользователям
+        lookup = PeerChannel(channel_identifier) if isinstance(channel_identifier, int) else channel_identifier
+        entity = await self.client.get_entity(lookup)
+        
+        self.entity_cache.save_cached_entity(entity.id, entity.access_hash, getattr(entity, 'username', None))
+        return InputPeerChannel(entity.id, entity.access_hash)
+    
+    async def _resolve_channel_async(self, channel_identifier: str) -> Tuple[InputPeerChannel, Dict[str, Any]]:
+        """
+        Получение сущности канала и информации о нем
+        
+        Args:
+            channel_identifier: Username канала (с @ или без) или его ID
+            
+        Returns:
+            Кортеж (entity, channel_info)
+        """
+        # Получение информации о канале
+        logger.info(f"Получение информации о канале {channel_identifier}...")
+        entity = await self._get_input_entity(channel_identifier)
+        
+        # Получение полной информации
+        try:
+            full_entity = await self.client(GetFullChannelRequest(entity))
+        except ChannelInvalidError:
+            # Устаревшая запись кэша: канал разрешается заново
+            self.entity_cache.invalidate_cached_entity(channel_identifier)
+            entity = await self._get_input_entity(channel_identifier, use_cache=False)
+            full_entity = await self.client(GetFullChannelRequest(entity))
+        
+        channel = next(chat for chat in full_entity.chats if chat.id == full_entity.full_chat.id)
+        
+        # Формирование структуры данных
+        channel_info = {
+            'id': channel.id,
+            'name': channel.title,
+            'username': channel.username,
+            'description': full_entity.full_chat.about,
+            'subscribers': full_entity.full_chat.participants_count,
+            'date_created': channel.date.strftime('%Y-%m-%d'),
+            'photo_url': None,
+            'is_private': getattr(channel, 'restricted', False)
+        }
+        
+        # Получение URL фото канала, если есть
+        if hasattr(channel, 'photo') and channel.photo:
+            channel_info['photo_url'] = f"https://t.me/{channel.username}"
+        
+        return entity, channel_info
+    
     async def _get_channel_info_async(self, channel_identifier: str) -> Dict[str, Any]:
         """
         Асинхронная версия получения информации о канале
@@ -188,39 +624,12 @@ class TelegramClient:
             Словарь с информацией о канале
         """
         try:
-            await self._connect()
-            
-            # Получение информации о канале
-            logger.info(f"Получение информации о канале {channel_identifier}...")
-            entity = await self.client.get_entity(channel_identifier)
-            
-            # Получение полной информации
-            full_entity = await self.client(GetFullChannelRequest(entity))
-            
-            # Формирование структуры данных
-            channel_info = {
-                'id': entity.id,
-                'name': entity.title,
-                'username': entity.username,
-                'description': full_entity.full_chat.about,
-                'subscribers': full_entity.full_chat.participants_count,
-                'date_created': entity.date.strftime('%Y-%m-%d'),
-                'photo_url': None,
-                'is_private': getattr(entity, 'restricted', False)
-            }
-            
-            # Получение URL фото канала, если есть
-            if hasattr(entity, 'photo') and entity.photo:
-                channel_info['photo_url'] = f"https://t.me/{entity.username}"
-                
+            _, channel_info = await self._resolve_channel_async(channel_identifier)
             return channel_info
             
         except Exception as e:
             logger.error(f"Ошибка при получении информации о канале: {str(e)}")
             raise
-            
-        finally:
-            await self._disconnect()
     
     def get_channel_info(self, channel_identifier: str) -> Dict[str, Any]:
         """
@@ -232,7 +641,7 @@ class TelegramClient:
         Returns:
             Словарь с информацией о канале
         """
-        return self._run_async(self._get_channel_info_async(channel_identifier))
+        return self._run_async(self._with_reconnect(self._get_channel_info_async, channel_identifier))
     
     async def _get_posts_async(self, channel_identifier: str, days: int = 180) -> List[Dict[str, Any]]:
         """
@@ -246,58 +655,15 @@ class TelegramClient:
             Список словарей с информацией о постах
         """
         try:
-            await self._connect()
-            
             # Вычисление даты начала периода
             start_date = datetime.now() - timedelta(days=days)
             
             # Получение сущности канала
-            entity = await self.client.get_entity(channel_identifier)
-            
-            # Получение постов
-            posts = []
-            post_count = 0
-            total_posts = 1  # Начальное значение
+            entity = await self._get_input_entity(channel_identifier)
             
             logger.info(f"Получение постов за последние {days} дней...")
             
-            async for message in self.client.iter_messages(entity, offset_date=start_date, reverse=True):
-                if post_count == 0:
-                    # Примерная оценка количества постов
-                    try:
-                        total_posts = message.id
-                    except:
-                        total_posts = 100  # Примерная оценка, если не удалось получить ID
-                
-                # Пропуск служебных сообщений
-                if message.action:
-                    continue
-                
-                # Добавление поста в список
-                post = {
-                    'id': message.id,
-                    'channel_id': entity.id,
-                    'date': message.date.strftime('%Y-%m-%d %H:%m:%С'),
-                    'text': message.text or '',
-                    'views': getattr(message, 'views', 0),
-                    'forwards': getattr(message, 'forwards', 0),
-                    'replies': message.replies.replies if hasattr(message, 'replies') and message.replies else 0,
-                    'has_media': bool(message.media),
-                    'media_type': self._get_media_type(message),
-                    'is_pinned': message.pinned
-                }
-                
-                posts.append(post)
-                post_count += 1
-                
-                # Логирование прогресса
-                if post_count % 10 == 0 or post_count == 1:
-                    progress = (post_count / max(total_posts, 1) * 100)
-                    logger.info(f"Загрузка постов: {post_count}/{total_posts} ({int(progress)}%)")
-                
-                # Задержка для избежания ограничений API
-                if post_count % 200 == 0:
-                    time.sleep(1)
+            posts = [post async for post in self._iter_posts(entity, offset_date=start_date)]
             
             logger.info(f"Загружено {len(posts)} постов")
             return posts
@@ -310,9 +676,6 @@ class TelegramClient:
         except Exception as e:
             logger.error(f"Ошибка при получении постов: {str(e)}")
             raise
-            
-        finally:
-            await self._disconnect()
     
     def get_posts(self, channel_identifier: str, days: int = 180) -> List[Dict[str, Any]]:
         """
@@ -325,65 +688,157 @@ class TelegramClient:
         Returns:
             Список словарей с информацией о постах
         """
-        return self._run_async(self._get_posts_async(channel_identifier, days))
+        return self._run_async(self._with_reconnect(self._get_posts_async, channel_identifier, days))
     
-    async def _get_comments_async(self, posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def _get_comments_async(self, posts: List[Dict[str, Any]], on_page=None) -> List[Dict[str, Any]]:
         """
         Асинхронная версия получения комментариев к постам
+        
+        Запросы выполняются параллельно, но не более comments_concurrency одновременно.
+        При FloodWaitError все воркеры приостанавливаются на требуемое время,
+        после чего загрузка поста продолжается с последней полученной страницы.
+        
+        Args:
+            posts: Список постов, для которых нужно получить комментарии
+            on_page: Корутина, получающая каждую страницу комментариев. Если указана,
+                комментарии не накапливаются в памяти и возвращается пустой список
+            
+        Returns:
+            Список словарей с информацией о комментариях в порядке постов
         """
         try:
-            await self._connect()
+            if not posts:
+                return []
             
-            comments = []
-            channel_entity = await self.client.get_entity(posts[0]['channel_id'])  # Получаем сущность канала
+            channel_entity = await self._get_input_entity(posts[0]['channel_id'])  # Получаем сущность канала
             
-            for idx, post in enumerate(posts):
-                try:
-                    result = await self.client(GetRepliesRequest(
-                        peer=channel_entity,
-                        msg_id=post['id'],
-                        offset_id=0,
-                        offset_date=None,
-                        add_offset=0,
-                        limit=50,  # Ограничение на количество комментариев на пост
-                        max_id=0,
-                        min_id=0,
-                        hash=0
-                    ))
-
-                    for comment in result.messages:
-                        comments.append({
-                            'id': comment.id,
-                            'post_id': post['id'],
-                            'channel_id': post['channel_id'],
-                            'user_id': getattr(comment.from_id, 'user_id', None),
-                            'date': comment.date.strftime('%Y-%m-%d %H:%m:%С'),
-                            'text': comment.text or '',
-                            'likes': 0,
-                            'is_reply': bool(comment.reply_to_msg_id)
-                        })
-                    logger.info(f"[✅] Пост {post['id']}: получено {len(result.messages)} комментариев")
-
-                except MessageIdInvalidError:
-                    logger.warning(f"[⚠️] Пост {post['id']}: комментарии отключены или нет обсуждения.")
-                    continue
-                except FloodWaitError as e:
-                    logger.warning(f"[⏳] FLOOD WAIT {e.seconds} сек... Ждём.")
-                    await asyncio.sleep(e.seconds)
-                    continue
-                except Exception as e:
-                    logger.error(f"[❌] Ошибка при посте {post['id']}: {e}")
-                    continue
+            semaphore = asyncio.Semaphore(self.comments_concurrency)
+            # Пока флаг сброшен, новые запросы не отправляются (пауза из-за FloodWait)
+            flood_gate = asyncio.Event()
+            flood_gate.set()
+            
+            # Объем работы оценивается заранее по счетчику ответов поста
+            targets = [self._comments_target(post) for post in posts]
+            known = [target for target in targets if target != float('inf')]
+            logger.info(f"Загрузка комментариев к {len(posts)} постам (ожидается не менее {sum(known)})")
+            
+            results = [[] for _ in posts]
+            totals = [0] * len(posts)
+            
+            async def fetch(idx: int):
+                post = posts[idx]
+                # Позиция пагинации сохраняется между повторами после FloodWait
+                state = {'offset_id': 0, 'fetched': 0}
+                
+                async def emit(page: List[Dict[str, Any]]):
+                    totals[idx] += len(page)
+                    if on_page is not None:
+                        await on_page(page)
+                    else:
+                        results[idx].extend(page)
+                
+                async with semaphore:
+                    while True:
+                        await flood_gate.wait()
+                        try:
+                            await self._fetch_post_comments(channel_entity, post, targets[idx], state, emit)
+                            return
+                        except MessageIdInvalidError:
+                            logger.warning(f"[⚠️] Пост {post['id']}: комментарии отключены или нет обсуждения.")
+                            return
+                        except FloodWaitError as e:
+                            if flood_gate.is_set():
+                                logger.warning(f"[⏳] FLOOD WAIT {e.seconds} сек... Приостанавливаем все запросы.")
+                                flood_gate.clear()
+                                await asyncio.sleep(e.seconds)
+                                flood_gate.set()
+                            continue
+                        except Exception as e:
+                            logger.error(f"[❌] Ошибка при посте {post['id']}: {e}")
+                            return
+            
+            # Самые крупные обсуждения запускаются первыми, чтобы не затягивать окончание загрузки;
+            # результаты при этом остаются в порядке постов
+            order = sorted(range(len(posts)), key=lambda idx: targets[idx], reverse=True)
+            await asyncio.gather(*(fetch(idx) for idx in order))
+            comments = [comment for post_comments in results for comment in post_comments]
 
-            logger.info(f"[✅] Всего загружено комментариев: {len(comments)}")
+            logger.info(f"[✅] Всего загружено комментариев: {sum(totals)}")
             return comments
 
         except Exception as e:
             logger.error(f"Ошибка при получении комментариев: {str(e)}")
             raise
-
-        finally:
-            await self._disconnect()
+    
+    def _comments_target(self, post: Dict[str, Any]) -> float:
+        """
+        Количество комментариев, которое нужно загрузить для поста
+        
+        Args:
+            post: Пост со счетчиком ответов
+            
+        Returns:
+            Значение счетчика replies, ограниченное comments_per_post,
+            или бесконечность, если ни счетчик, ни ограничение не заданы
+        """
+        cap = self.comments_per_post if self.comments_per_post > 0 else float('inf')
+        replies = post.get('replies') or 0
+        
+        # Нулевой счетчик может означать отсутствие данных, поэтому загружается до ограничения
+        return min(replies, cap) if replies > 0 else cap
+    
+    async def _fetch_post_comments(self, channel_entity, post: Dict[str, Any], target: float,
+                                   state: Dict[str, int], emit):
+        """
+        Постраничная загрузка комментариев к одному посту
+        
+        Args:
+            channel_entity: Сущность канала
+            post: Пост, для которого нужно получить комментарии. Необязательное поле
+                comments_min_id ограничивает выборку комментариями новее указанного ID
+            target: Максимальное количество комментариев
+            state: Позиция пагинации (offset_id и количество уже полученных комментариев)
+            emit: Корутина, получающая каждую страницу комментариев
+        """
+        while state['fetched'] < target:
+            limit = int(min(COMMENTS_PAGE_SIZE, target - state['fetched']))
+            
+            result = await self.client(GetRepliesRequest(
+                peer=channel_entity,
+                msg_id=post['id'],
+                offset_id=state['offset_id'],
+                offset_date=None,
+                add_offset=0,
+                limit=limit,
+                max_id=0,
+                # Для уже загруженных обсуждений запрашиваются только новые комментарии
+                min_id=post.get('comments_min_id') or 0,
+                hash=0
+            ))
+            
+            page = [{
+                'id': comment.id,
+                'post_id': post['id'],
+                'channel_id': post['channel_id'],
+                'user_id': getattr(comment.from_id, 'user_id', None),
+                'date': comment.date.strftime('%Y-%m-%d %H:%M:%S'),
+                'date_ts': int(comment.date.timestamp()),
+                'text': comment.text or '',
+                'likes': 0,
+                'is_reply': bool(comment.reply_to_msg_id)
+            } for comment in result.messages]
+            
+            if page:
+                await emit(page)
+            
+            state['fetched'] += len(page)
+            
+            # Комментарии возвращаются от новых к старым: следующая страница начинается с самого старого
+            if len(result.messages) < limit:
+                break
+            state['offset_id'] = result.messages[-1].id
+        
+        logger.info(f"[✅] Пост {post['id']}: получено {state['fetched']} комментариев")
     
     def get_comments(self, posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -395,10 +850,80 @@ class TelegramClient:
         Returns:
             Список словарей с информацией о комментариях
         """
-        return self._run_async(self._get_comments_async(posts))
+        return self._run_async(self._with_reconnect(self._get_comments_async, posts))
+    
+    async def _produce_comment_pages(self, emit, posts: List[Dict[str, Any]]):
+        """Производитель для потоковой загрузки комментариев"""
+        await self._get_comments_async(posts, on_page=emit)
+    
+    def stream_comments(self, posts: List[Dict[str, Any]], queue_size: int = 4) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Потоковое получение комментариев к постам постранично
+        
+        Args:
+            posts: Список постов, для которых нужно получить комментарии
+            queue_size: Максимальное количество страниц, ожидающих обработки
+            
+        Returns:
+            Итератор страниц комментариев (порядок между постами не гарантируется)
+        """
+        return self._stream(self._produce_comment_pages, posts, queue_size=queue_size)
+
+    async def _get_post_metrics_async(self, channel_identifier, message_ids: List[int],
+                                      batch_size: int = METRICS_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """
+        Асинхронная версия получения счетчиков постов без загрузки текста и медиа
+        
+        Args:
+            channel_identifier: Username канала, его ID или Telegram ID из БД
+            message_ids: Telegram ID постов
+            batch_size: Количество постов в одном запросе GetMessagesViewsRequest
+            
+        Returns:
+            Список словарей с полями id, views, forwards, replies
+        """
+        try:
+            entity = await self._get_input_entity(channel_identifier)
+            metrics = []
+            
+            for start in range(0, len(message_ids), batch_size):
+                chunk = message_ids[start:start + batch_size]
+                result = await self.client(GetMessagesViewsRequest(peer=entity, id=chunk, increment=False))
+                
+                # Счетчики возвращаются в том же порядке, что и запрошенные ID
+                for message_id, views in zip(chunk, result.views):
+                    metrics.append({
+                        'id': message_id,
+                        'views': views.views or 0,
+                        'forwards': views.forwards or 0,
+                        'replies': views.replies.replies if views.replies else 0
+                    })
+                
+                logger.info(f"Обновление счетчиков: {len(metrics)}/{len(message_ids)}")
+            
+            return metrics
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении счетчиков постов: {str(e)}")
+            raise
+    
+    def get_post_metrics(self, channel_identifier, message_ids: List[int],
+                         batch_size: int = METRICS_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """
+        Синхронная обертка для получения счетчиков просмотров, репостов и ответов
+        
+        Args:
+            channel_identifier: Username канала, его ID или Telegram ID из БД
+            message_ids: Telegram ID постов
+            batch_size: Количество постов в одном запросе
+            
+        Returns:
+            Список словарей с полями id, views, forwards, replies
+        """
+        return self._run_async(self._with_reconnect(self._get_post_metrics_async, channel_identifier, message_ids, batch_size))
 
 # Импорт необходимых классов Telethon для полного доступа к каналу
 from telethon.tl.functions.channels import GetFullChannelRequest
 from telethon.errors import MessageIdInvalidError, FloodWaitError
-from telethon.tl.functions.messages import GetRepliesRequest
+from telethon.tl.functions.messages import GetRepliesRequest, GetMessagesViewsRequest
 import asyncio
\ No newline at end of file